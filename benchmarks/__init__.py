@@ -0,0 +1,6 @@
+"""
+Benchmarks for the GetSmarter API clients.
+
+These are not run as part of the test suite; run individual modules with
+``python -m benchmarks.<module>`` from the repository root.
+"""
@@ -0,0 +1,67 @@
+"""
+Measure the per-request authentication overhead of OAuthApiClient.
+
+Compares the memoized path used by the client's ``BearerAuth`` against the
+uncached path that looks the token up in TieredCache on every request.
+
+Usage::
+
+    python -m benchmarks.auth_overhead [--iterations N]
+"""
+import argparse
+import datetime
+import timeit
+
+import pytz
+import requests
+from edx_django_utils.cache import TieredCache
+
+from benchmarks.utils import configure_django
+from getsmarter_api_clients.oauth import OAuthApiClient
+
+
+def make_client():
+    """
+    Return a client whose token is already present in TieredCache.
+    """
+    client = OAuthApiClient('bench-client', 'secret', 'http://provider.invalid', 'http://api.invalid')
+    TieredCache.set_all_tiers(
+        client.access_token_cache_key,
+        {
+            'access_token': 'token',
+            'expires_in': 3600,
+            'expires_at': datetime.datetime.now(pytz.utc).timestamp() + 3600,
+        },
+        3600,
+    )
+    return client
+
+
+def main():
+    """
+    Run the benchmark and print the mean cost per call of each path.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    configure_django()
+
+    client = make_client()
+    request = requests.Request('GET', client.api_url).prepare()
+
+    def uncached():
+        client._token_memo = None  # pylint: disable=protected-access
+        client.auth(request)
+
+    def memoized():
+        client.auth(request)
+
+    for name, fn in (('uncached', uncached), ('memoized', memoized)):
+        fn()
+        best = min(timeit.repeat(fn, number=args.iterations, repeat=5))
+        print(f'{name:>10}: {best / args.iterations * 1e6:.2f} us per request')
+
+
+if __name__ == '__main__':
+    main()
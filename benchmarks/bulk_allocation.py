@@ -0,0 +1,52 @@
+"""
+Measure bulk enterprise allocation throughput.
+
+Requests go to the local stand-in server.
+
+Compares a serial loop over ``create_enterprise_allocation`` with
+``create_enterprise_allocations`` at several concurrency levels.
+
+Usage::
+
+    python -m benchmarks.bulk_allocation [--count N] [--latency SECONDS]
+"""
+import argparse
+import time
+
+from benchmarks.utils import configure_django, enterprise_allocations
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from test_utils.stand_in import StandInServer
+
+
+def main():
+    """
+    Run the benchmark and print allocations per second for each mode.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.02, help='stand-in server latency in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    configure_django()
+
+    with StandInServer(latency=args.latency) as server:
+        client = GetSmarterEnterpriseApiClient('bench-client', 'secret', server.url, server.url)
+        client.get_terms_and_policies()  # warm up the token and a connection
+
+        start = time.perf_counter()
+        for allocation in enterprise_allocations(args.count):
+            client.create_enterprise_allocation(**allocation)
+        elapsed = time.perf_counter() - start
+        print(f'{"serial loop":>14}: {args.count / elapsed:8.1f} allocations/s')
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            results = client.create_enterprise_allocations(enterprise_allocations(args.count), max_workers=workers)
+            elapsed = time.perf_counter() - start
+            failures = sum(not result.succeeded for result in results)
+            print(f'{f"bulk x{workers}":>14}: {args.count / elapsed:8.1f} allocations/s ({failures} failures)')
+
+
+if __name__ == '__main__':
+    main()
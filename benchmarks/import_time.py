@@ -0,0 +1,61 @@
+"""
+Measure the time taken to import the GEAG client in a fresh interpreter.
+
+Each run starts a new Python process, so nothing is already imported. The
+output also records whether the import pulled in Django.
+
+Usage::
+
+    python -m benchmarks.import_time [--runs N] [--module NAME]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MEASURE = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, any(name.split('.')[0] == 'django' for name in sys.modules))
+'''
+
+
+def measure(module):
+    """
+    Import module in a new interpreter.
+
+    Returns (seconds to import module, whether Django was imported).
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(module=module)], check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return float(output[0]), output[1] == 'True'
+
+
+def main():
+    """
+    Run the benchmark and print the import time statistics as JSON.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--module', default='getsmarter_api_clients.geag')
+    args = parser.parse_args()
+
+    measure(args.module)  # warm the filesystem and bytecode caches
+    results = [measure(args.module) for _ in range(args.runs)]
+    timings = sorted(elapsed for elapsed, _ in results)
+    print(json.dumps({
+        'module': args.module,
+        'runs': args.runs,
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'min_ms': round(timings[0] * 1000, 2),
+        'max_ms': round(timings[-1] * 1000, 2),
+        'imports_django': any(imports_django for _, imports_django in results),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
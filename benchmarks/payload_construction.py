@@ -0,0 +1,121 @@
+"""
+Measure the cost of building enterprise allocation payloads.
+
+The payloads are built at bulk-import volumes.
+
+Compares the request models against the previous approach of a dict
+literal, a comprehension dropping the None values and a second dict built
+for logging.
+
+Usage::
+
+    python -m benchmarks.payload_construction [--count N]
+"""
+import argparse
+import timeit
+
+from benchmarks.utils import enterprise_allocations
+from getsmarter_api_clients.models import EnterpriseAllocationRequest
+
+LOG_FIELDS = ['paymentReference', 'enterpriseCustomerUuid', 'orgId', 'orderItems']
+
+
+def dict_literal_payload(
+    payment_reference,
+    enterprise_customer_uuid,
+    first_name,
+    last_name,
+    email,
+    date_of_birth,
+    terms_accepted_at,
+    data_share_consent,
+    currency,
+    order_items,
+    address_line1=None,
+    address_line2=None,
+    city=None,
+    postal_code=None,
+    state=None,
+    state_code=None,
+    country=None,
+    country_code=None,
+    mobile_phone=None,
+    work_experience=None,
+    education_highest_level=None,
+    org_id=None
+):
+    """
+    Build the payload and its logged fields the old way.
+
+    This is how create_enterprise_allocation used to build them.
+    """
+    payload = {
+        'paymentReference': payment_reference,
+        'enterpriseCustomerUuid': enterprise_customer_uuid,
+        'firstName': first_name,
+        'lastName': last_name,
+        'email': email,
+        'dateOfBirth': date_of_birth,
+        'termsAcceptedAt': terms_accepted_at,
+        'dataShareConsent': data_share_consent,
+        'currency': currency,
+        'orderItems': order_items,
+        'addressLine1': address_line1,
+        'addressLine2': address_line2,
+        'city': city,
+        'postalCode': postal_code,
+        'state': state,
+        'stateCode': state_code,
+        'country': country,
+        'countryCode': country_code,
+        'mobilePhone': mobile_phone,
+        'workExperience': work_experience,
+        'educationHighestLevel': education_highest_level,
+        'orgId': org_id,
+    }
+    payload = {k: v for k, v in payload.items() if v is not None}
+    payload_for_logging = {field: payload.get(field) for field in LOG_FIELDS}
+    return payload, payload_for_logging
+
+
+def build_with_dict_literals(allocations):
+    """
+    Build every payload and its logged fields the old way.
+
+    This is how create_enterprise_allocation used to build them.
+    """
+    for allocation in allocations:
+        dict_literal_payload(**allocation)
+
+
+def build_with_models(allocations):
+    """
+    Build every payload and its logged fields with EnterpriseAllocationRequest.
+    """
+    for allocation in allocations:
+        allocation_request = EnterpriseAllocationRequest(**allocation)
+        allocation_request.to_payload()
+        allocation_request.payload_for_logging()
+
+
+def main():
+    """
+    Run the benchmark and print the payloads built per second by each approach.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    allocations = list(enterprise_allocations(args.count))
+    allocation_request = EnterpriseAllocationRequest(**allocations[0])
+    assert dict_literal_payload(**allocations[0]) == (
+        allocation_request.to_payload(), allocation_request.payload_for_logging()
+    )
+
+    for name, build in (('dict literal', build_with_dict_literals), ('model', build_with_models)):
+        best = min(timeit.repeat(lambda build=build: build(allocations), number=1, repeat=5))
+        print(f'{name:>12}: {args.count / best:,.0f} payloads/s ({best / args.count * 1e6:.2f} us each)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Measure client throughput and latency against the local stand-in server.
+
+Each scenario calls one GEAG endpoint from a number of threads sharing a
+single client, at several concurrency levels, over real sockets. For every
+run the suite reports requests per second, p50 and p99 latency, and how many
+allocations were made per access token fetched from the provider.
+
+Results are written as JSON, to stdout or to the ``--output`` file, with a
+human-readable summary on stderr.
+
+Usage::
+
+    python -m benchmarks.throughput [--requests N] [--concurrency N [N ...]]
+        [--scenarios NAME [NAME ...]] [--latency SECONDS]
+        [--token-lifetime SECONDS] [--output PATH]
+"""
+import argparse
+import datetime
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from edx_django_utils.cache import TieredCache
+
+from benchmarks.utils import allocations, configure_django, enterprise_allocations
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from test_utils.stand_in import StandInServer
+
+SCENARIOS = ('terms', 'allocations', 'enterprise_allocations', 'cancel')
+ALLOCATION_PATHS = ('/allocations', '/enterprise_allocations')
+
+
+def percentile(sorted_values, fraction):
+    """
+    Return the nearest-rank percentile of a sorted list.
+
+    For example fraction=0.99 gives p99.
+    """
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def _make_calls(scenario, count):
+    """
+    Return count callables that each make one request for the scenario.
+
+    Each callable takes the client to make the request with.
+    """
+    if scenario == 'terms':
+        return [lambda client: client.get_terms_and_policies()] * count
+    if scenario == 'allocations':
+        return [lambda client, kwargs=kwargs: client.create_allocation(**kwargs) for kwargs in allocations(count)]
+    if scenario == 'enterprise_allocations':
+        return [
+            lambda client, kwargs=kwargs: client.create_enterprise_allocation(**kwargs)
+            for kwargs in enterprise_allocations(count)
+        ]
+    if scenario == 'cancel':
+        return [
+            lambda client, order_uuid=order_uuid: client.cancel_enterprise_allocation(order_uuid)
+            for order_uuid in (uuid.uuid4() for _ in range(count))
+        ]
+    raise ValueError(f'Unknown scenario {scenario!r}')
+
+
+def run(server, scenario, concurrency, count):
+    """
+    Make count requests for a scenario from concurrency threads.
+
+    Returns the run's results.
+
+    Every run starts with an empty token cache and a new client, so its
+    token fetches and connections are counted from scratch.
+    """
+    TieredCache.dangerous_clear_all_tiers()
+    calls = _make_calls(scenario, count)
+    client = GetSmarterEnterpriseApiClient(
+        'bench-client', 'secret', server.url, server.url, pool_maxsize=max(concurrency, 10)
+    )
+    server.reset_counts()
+
+    def timed(call):
+        start = time.perf_counter()
+        try:
+            call(client)
+            failed = False
+        except Exception:  # pylint: disable=broad-except
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, calls))
+    elapsed = time.perf_counter() - start
+    client.close()
+
+    latencies = sorted(duration for duration, _ in outcomes)
+    token_fetches = server.counts['/oauth2/token']
+    allocations_made = sum(server.counts[path] for path in ALLOCATION_PATHS)
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': count,
+        'errors': sum(failed for _, failed in outcomes),
+        'duration_s': round(elapsed, 4),
+        'requests_per_second': round(count / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies) * 1000, 3),
+            'p50': round(percentile(latencies, 0.5) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3),
+        },
+        'token_fetches': token_fetches,
+        'allocations_per_token_fetch': (
+            round(allocations_made / token_fetches, 1) if allocations_made and token_fetches else None
+        ),
+    }
+
+
+def main():
+    """
+    Run every scenario at every concurrency level and write the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500, help='requests per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.005, help='stand-in server latency in seconds')
+    parser.add_argument(
+        '--token-lifetime', type=int, default=3600, help='expires_in of the tokens issued by the stand-in',
+    )
+    parser.add_argument('--output', help='file to write the JSON results to; stdout by default')
+    args = parser.parse_args()
+
+    configure_django()
+    results = []
+    with StandInServer(latency=args.latency, token_lifetime=args.token_lifetime) as server:
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                result = run(server, scenario, concurrency, args.requests)
+                results.append(result)
+                print(
+                    f'{scenario:>22} x{concurrency:<3}: {result["requests_per_second"]:8.1f} req/s, '
+                    f'p50 {result["latency_ms"]["p50"]:7.2f}ms, p99 {result["latency_ms"]["p99"]:7.2f}ms, '
+                    f'{result["errors"]} errors',
+                    file=sys.stderr,
+                )
+
+    report = {
+        'benchmark': 'throughput',
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'requests': args.requests,
+            'latency_s': args.latency,
+            'token_lifetime_s': args.token_lifetime,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Shared helpers for the benchmarks.
+"""
+import os
+
+from getsmarter_api_clients import standalone
+
+ENTERPRISE_ALLOCATION = {
+    'enterprise_customer_uuid': '01234567-1234-1234-1234-0123456789ab',
+    'first_name': 'John',
+    'last_name': 'Smith',
+    'email': 'johnsmith@example.com',
+    'date_of_birth': '2000-01-01',
+    'terms_accepted_at': '2022-07-25T10:29:56Z',
+    'data_share_consent': True,
+    'currency': 'USD',
+    'order_items': [
+        {
+            'productId': '87c24e19-b82c-4acd-ab90-714af629f11a',
+            'quantity': 1,
+            'normalPrice': 1000,
+            'discount': 1000,
+            'finalPrice': 0,
+        },
+    ],
+    'country': 'United States',
+    'country_code': 'US',
+    'work_experience': 'None',
+}
+
+ALLOCATION = dict(
+    {
+        key: value for key, value in ENTERPRISE_ALLOCATION.items()
+        if key not in ('enterprise_customer_uuid', 'data_share_consent')
+    },
+    address_line1='10 Lovely Street',
+    city='Herndon',
+    postal_code='35005',
+    state='Alabama',
+    state_code='AL',
+)
+
+
+def configure_django():
+    """
+    Configure the minimal Django settings TieredCache needs, if unset.
+
+    Also lets oauthlib fetch tokens over plain HTTP, since the local stand-in
+    server does not serve TLS.
+    """
+    os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')
+    standalone.configure_django()
+
+
+def enterprise_allocations(count):
+    """
+    Yield keyword arguments for count distinct enterprise allocations.
+    """
+    for index in range(count):
+        yield dict(ENTERPRISE_ALLOCATION, payment_reference=f'BENCH-{index}')
+
+
+def allocations(count):
+    """
+    Yield keyword arguments for count distinct allocations.
+    """
+    for index in range(count):
+        yield dict(ALLOCATION, payment_reference=f'BENCH-{index}')
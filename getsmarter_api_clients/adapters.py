@@ -0,0 +1,203 @@
+"""
+HTTP adapter with a configurable connection pool that counts its connections.
+"""
+import threading
+import time
+
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import PoolManager
+
+from getsmarter_api_clients.metrics import current_timer, time_phase
+
+
+class PoolStats:
+    """
+    Thread-safe counters of connections created, reused and discarded.
+    """
+
+    def __init__(self):
+        """
+        Initialize all counters to zero.
+        """
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def increment(self, counter):
+        """
+        Add one to the named counter.
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        """
+        Return the current counters as a dict.
+        """
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+            }
+
+
+class TimedConnectionMixin:
+    """
+    Record the time spent opening a connection on the current request's timer.
+    """
+
+    def connect(self):
+        """
+        Open the connection, timing it as the request's connect phase.
+        """
+        with time_phase('connect'):
+            super().connect()
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class CountingConnectionPoolMixin:
+    """
+    Record connection pool activity on the pool's ``pool_stats``.
+
+    The activity is also recorded on the current request's timer when one is
+    being timed.
+    """
+
+    pool_stats = None
+
+    def _get_conn(self, timeout=None):
+        """
+        Take a connection from the pool, counting whether it is new or reused.
+        """
+        with time_phase('pool_acquire'):
+            conn = super()._get_conn(timeout=timeout)
+        # Fresh connections, and pooled ones the server closed, have no socket
+        # yet and will open a new connection for this request.
+        state = 'reused' if conn.sock is not None else 'created'
+        if self.pool_stats is not None:
+            self.pool_stats.increment(state)
+        timer = current_timer()
+        if timer is not None:
+            timer.connections.append(state)
+        return conn
+
+    def _put_conn(self, conn):
+        """
+        Return a connection to the pool, counting it if the pool is full.
+
+        The count is approximate under contention, which is good enough for
+        sizing the pool.
+        """
+        if self.pool_stats is not None and conn is not None and self.pool is not None and self.pool.full():
+            self.pool_stats.increment('discarded')
+        super()._put_conn(conn)
+
+
+class CountingHTTPConnectionPool(CountingConnectionPoolMixin, HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class CountingHTTPSConnectionPool(CountingConnectionPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class CountingPoolManager(PoolManager):
+    """
+    PoolManager whose connection pools report to a shared PoolStats.
+    """
+
+    def __init__(self, pool_stats, **kwargs):
+        """
+        Initialize the pool manager with the PoolStats its pools report to.
+        """
+        super().__init__(**kwargs)
+        self.pool_stats = pool_stats
+        self.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.pool_stats = self.pool_stats
+        return pool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools count their connections.
+
+    Connections are counted as created, reused or discarded.
+
+    Takes the same pool arguments as HTTPAdapter: ``pool_connections`` (the
+    number of hosts to keep pools for), ``pool_maxsize`` (the connections
+    kept per host) and ``pool_block`` (whether to wait for a free connection
+    instead of opening one that is discarded afterwards).
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOLSIZE, pool_maxsize=DEFAULT_POOLSIZE, pool_block=DEFAULT_POOLBLOCK,
+                 **kwargs):
+        """
+        Initialize the adapter and its PoolStats.
+        """
+        self.pool_stats = PoolStats()
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK, **pool_kwargs):
+        """
+        Initialize a CountingPoolManager.
+        """
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = CountingPoolManager(
+            self.pool_stats,
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            **pool_kwargs,
+        )
+
+    def send(self, request, *args, **kwargs):
+        """
+        Send the request, recording its time to first byte.
+
+        The time is recorded on the current request's timer, if there is one.
+
+        The time to first byte is the time HTTPAdapter.send takes, which ends
+        once the response headers are read, less the time spent acquiring
+        and opening the connection.
+        """
+        timer = current_timer()
+        if timer is None:
+            return super().send(request, *args, **kwargs)
+
+        connection_time = timer.phases.get('pool_acquire', 0.0) + timer.phases.get('connect', 0.0)
+        start = time.perf_counter()
+        try:
+            return super().send(request, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            timer.last_send_duration = duration
+            connection_time = (
+                timer.phases.get('pool_acquire', 0.0) + timer.phases.get('connect', 0.0) - connection_time
+            )
+            timer.add('ttfb', duration - connection_time)
+
+    def __setstate__(self, state):
+        """
+        Restore the pool with fresh PoolStats, which are not pickled.
+        """
+        self.pool_stats = PoolStats()
+        super().__setstate__(state)
@@ -0,0 +1,465 @@
+"""
+Asyncio clients for the GetSmarter API Gateway.
+
+These require the optional ``httpx`` dependency, installable with
+``pip install getsmarter-api-clients[async]``.
+
+They raise the same exceptions as the sync clients: error responses raise
+``requests.exceptions.HTTPError`` (only for 4xx and 5xx statuses), and
+httpx transport errors are re-raised as the matching ``requests``
+exception, such as ``ConnectionError`` or ``Timeout``, with the httpx
+exception as their ``__cause__``. Token cache reads and writes, which may
+reach a remote cache, run in a worker thread so they do not block the
+event loop.
+"""
+import asyncio
+import logging
+import time
+import weakref
+
+import requests
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.logging_utils import DEFAULT_MAX_LOGGED_BODY_LENGTH, LazyText, lazy_response_body
+from getsmarter_api_clients.models import AllocationRequest, EnterpriseAllocationRequest
+from getsmarter_api_clients.oauth import DEFAULT_TOKEN_EXPIRY_MARGIN, AccessTokenCacheMixin
+from getsmarter_api_clients.token_cache import TieredTokenCache
+from getsmarter_api_clients.validation import ALLOCATION_VALIDATOR, ENTERPRISE_ALLOCATION_VALIDATOR
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+def _raise_for_status(response):
+    """
+    Raise a requests HTTPError for a 4xx or 5xx response, as requests does.
+    """
+    if 400 <= response.status_code < 500:
+        kind = 'Client Error'
+    elif 500 <= response.status_code < 600:
+        kind = 'Server Error'
+    else:
+        return
+    raise HTTPError(
+        f'{response.status_code} {kind}: {response.reason_phrase} for url: {response.url}',
+        response=response,
+    )
+
+
+def _to_requests_exception(error):
+    """
+    Return the requests exception matching an httpx request error.
+    """
+    if isinstance(error, httpx.ConnectTimeout):
+        exception_class = requests.exceptions.ConnectTimeout
+    elif isinstance(error, httpx.TimeoutException):
+        exception_class = requests.exceptions.ReadTimeout
+    elif isinstance(error, httpx.TooManyRedirects):
+        exception_class = requests.exceptions.TooManyRedirects
+    elif isinstance(error, (httpx.NetworkError, httpx.ProxyError, httpx.RemoteProtocolError)):
+        exception_class = requests.exceptions.ConnectionError
+    else:
+        exception_class = requests.exceptions.RequestException
+    return exception_class(str(error), request=None)
+
+
+class AsyncOAuthApiClient(AccessTokenCacheMixin):
+    """
+    Async API client that authenticates using the provided client credentials.
+
+    Requests go through a single pooled ``httpx.AsyncClient``, which may be
+    passed in to share one connection pool between several clients. Tokens
+    are cached in the same cache tiers, under the same key, as the sync
+    OAuthApiClient, and concurrent coroutines share a single token fetch.
+    """
+
+    def __init__(
+        self,
+        client_id,
+        client_secret,
+        provider_url,
+        api_url,
+        token_expiry_margin=DEFAULT_TOKEN_EXPIRY_MARGIN,
+        http_client=None,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        timeout=None,
+        token_cache=None,
+    ):
+        """
+        Initialize an instance of the AsyncOAuthApiClient.
+
+        Args:
+            client_id: The OAuth client id.
+            client_secret: The OAuth client secret.
+            provider_url: Base URL of the OAuth provider.
+            api_url: Base URL of the API.
+            token_expiry_margin: Seconds before the provider's expiry at
+                which a token is no longer used.
+            http_client: Optional ``httpx.AsyncClient`` to send requests
+                through. When omitted, the client creates and owns one.
+            max_connections: Size of the connection pool of the owned client.
+            max_keepalive_connections: Number of idle connections the owned
+                client keeps alive.
+            timeout: Request timeout in seconds for the owned client.
+            token_cache: Optional TokenCache backend to store the access
+                token in; see OAuthApiClient.
+        """
+        if httpx is None:
+            raise ImportError('The async clients require httpx: pip install getsmarter-api-clients[async]')
+
+        self.oauth_client_id = client_id
+        self.oauth_client_secret = client_secret
+        self.oauth_provider_url = provider_url
+        self.api_url = api_url
+        self.refresh_ahead_fraction = None
+        self.token_expiry_margin = token_expiry_margin
+        self.token_cache = token_cache if token_cache is not None else TieredTokenCache()
+        self._token_memo = None
+        # One lock per event loop, created on first use, so the client is not
+        # bound to the loop it was created under.
+        self._token_locks = weakref.WeakKeyDictionary()
+
+        self._owns_http_client = http_client is None
+        if http_client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                ),
+                timeout=timeout,
+            )
+        self.http_client = http_client
+
+    async def __aenter__(self):
+        """
+        Enter the async context manager.
+        """
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """
+        Close the client on leaving the async context manager.
+        """
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Close the underlying HTTP client if this client created it.
+        """
+        if self._owns_http_client:
+            await self.http_client.aclose()
+
+    def _get_cached_access_token(self):
+        """
+        Return the cached access token if it is not expired.
+        """
+        token_response = self._get_cached_token_response()
+        if token_response is None or self._is_expired(token_response):
+            return None
+        self._remember_token(token_response)
+        return token_response['access_token']
+
+    async def _get_access_token(self):
+        """
+        Return the access token required for making calls.
+        """
+        access_token = self._get_memoized_access_token() or await asyncio.to_thread(self._get_cached_access_token)
+        if access_token:
+            return access_token
+
+        loop = asyncio.get_running_loop()
+        token_lock = self._token_locks.get(loop)
+        if token_lock is None:
+            token_lock = self._token_locks[loop] = asyncio.Lock()
+        async with token_lock:
+            # Another coroutine may have fetched a token while we waited.
+            access_token = (
+                self._get_memoized_access_token() or await asyncio.to_thread(self._get_cached_access_token)
+            )
+            if access_token:
+                return access_token
+            return await self._request_access_token()
+
+    async def _request_access_token(self):
+        """
+        Request a new access token from the provider and cache it.
+        """
+        try:
+            response = await self.http_client.post(
+                f'{self.oauth_provider_url}/oauth2/token',
+                data={'grant_type': 'client_credentials'},
+                auth=(self.oauth_client_id, self.oauth_client_secret),
+            )
+            response.raise_for_status()
+            token_response = response.json()
+            token_response['expires_at'] = time.time() + int(token_response['expires_in'])
+            await asyncio.to_thread(
+                self.token_cache.set, self.access_token_cache_key, token_response, token_response['expires_in']
+            )
+            self._remember_token(token_response)
+            return token_response['access_token']
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.exception(ex)
+            return None
+
+    async def request(self, method, url, headers=None, **kwargs):
+        """
+        Send an authenticated request through the pooled HTTP client.
+
+        httpx request errors are raised as the matching requests exception.
+        """
+        request_headers = {
+            'User-Agent': 'Mozilla/5.0',  # GetSmarter blocks the python-requests user agent for certain requests
+            'Authorization': 'Bearer ' + await self._get_access_token(),
+        }
+        if headers:
+            request_headers.update(headers)
+        try:
+            return await self.http_client.request(method, url, headers=request_headers, **kwargs)
+        except httpx.RequestError as ex:
+            raise _to_requests_exception(ex) from ex
+
+    async def get(self, url, **kwargs):
+        """
+        Send an authenticated GET request.
+        """
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """
+        Send an authenticated POST request.
+        """
+        return await self.request('POST', url, **kwargs)
+
+
+class AsyncGetSmarterEnterpriseApiClient(AsyncOAuthApiClient):
+    """
+    Async client to interface with the GetSmarter API Gateway (GEAG).
+
+    Mirrors GetSmarterEnterpriseApiClient: payloads are built the same way
+    and failed calls raise ``requests.exceptions.HTTPError``, whose
+    ``response`` is the ``httpx.Response``, or the requests exception
+    matching the httpx transport error.
+    """
+
+    def __init__(
+        self,
+        *args,
+        validate_allocations=False,
+        max_logged_body_length=DEFAULT_MAX_LOGGED_BODY_LENGTH,
+        **kwargs
+    ):
+        """
+        Initialize an instance of AsyncGetSmarterEnterpriseApiClient.
+
+        Args:
+            validate_allocations: Whether to check allocations before sending
+                them (disabled by default); see GetSmarterEnterpriseApiClient.
+            max_logged_body_length: Maximum number of characters of a GEAG
+                error response included in error logs, or None for all.
+        """
+        super().__init__(*args, **kwargs)
+        self.validate_allocations = validate_allocations
+        self.max_logged_body_length = max_logged_body_length
+
+    async def get_terms_and_policies(self):
+        """
+        Fetch and return the terms and policies from GEAG.
+
+        See GetSmarterEnterpriseApiClient.get_terms_and_policies.
+        """
+        response = await self.get(f'{self.api_url}/terms')
+        _raise_for_status(response)
+        return response.json()
+
+    async def create_allocation(
+        self,
+        payment_reference,
+        address_line1,
+        city,
+        postal_code,
+        country,
+        country_code,
+        first_name,
+        last_name,
+        email,
+        date_of_birth,
+        terms_accepted_at,
+        currency,
+        order_items,
+        address_line2=None,
+        state=None,
+        state_code=None,
+        mobile_phone=None,
+        work_experience=None,
+        education_highest_level=None
+    ):
+        """
+        Create an allocation (enrollment) through GEAG.
+
+        Takes the same parameters as
+        GetSmarterEnterpriseApiClient.create_allocation.
+        """
+        url = f'{self.api_url}/allocations'
+        allocation_request = AllocationRequest(
+            payment_reference=payment_reference,
+            address_line1=address_line1,
+            city=city,
+            postal_code=postal_code,
+            country=country,
+            country_code=country_code,
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            date_of_birth=date_of_birth,
+            terms_accepted_at=terms_accepted_at,
+            currency=currency,
+            order_items=order_items,
+            address_line2=address_line2,
+            state=state,
+            state_code=state_code,
+            mobile_phone=mobile_phone,
+            work_experience=work_experience,
+            education_highest_level=education_highest_level,
+        )
+        if self.validate_allocations:
+            ALLOCATION_VALIDATOR.check(allocation_request)
+        payload = allocation_request.to_payload()
+
+        logger.info(
+            '[create_allocation] Attempting allocation for order %s with payload: %s',
+            payment_reference,
+            LazyText(allocation_request.payload_for_logging),
+            extra={'payment_reference': payment_reference},
+        )
+
+        response = await self.post(url, json=payload)
+        try:
+            _raise_for_status(response)
+        except HTTPError:
+            logger.error(
+                'Allocation failed to be created for order %s with reasons: %s, with payload: %s',
+                payment_reference,
+                lazy_response_body(response, self.max_logged_body_length),
+                payload,
+                extra={'payment_reference': payment_reference, 'status_code': response.status_code},
+            )
+            raise
+        return response
+
+    async def create_enterprise_allocation(
+        self,
+        payment_reference,
+        enterprise_customer_uuid,
+        first_name,
+        last_name,
+        email,
+        date_of_birth,
+        terms_accepted_at,
+        data_share_consent,
+        currency,
+        order_items,
+        address_line1=None,
+        address_line2=None,
+        city=None,
+        postal_code=None,
+        state=None,
+        state_code=None,
+        country=None,
+        country_code=None,
+        mobile_phone=None,
+        work_experience=None,
+        education_highest_level=None,
+        org_id=None,
+        should_raise=True,
+    ):
+        """
+        Create an enterprise_allocation (enrollment) through GEAG.
+
+        Takes the same parameters as
+        GetSmarterEnterpriseApiClient.create_enterprise_allocation.
+        """
+        url = f'{self.api_url}/enterprise_allocations'
+        allocation_request = EnterpriseAllocationRequest(
+            payment_reference=payment_reference,
+            enterprise_customer_uuid=enterprise_customer_uuid,
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            date_of_birth=date_of_birth,
+            terms_accepted_at=terms_accepted_at,
+            data_share_consent=data_share_consent,
+            currency=currency,
+            order_items=order_items,
+            address_line1=address_line1,
+            address_line2=address_line2,
+            city=city,
+            postal_code=postal_code,
+            state=state,
+            state_code=state_code,
+            country=country,
+            country_code=country_code,
+            mobile_phone=mobile_phone,
+            work_experience=work_experience,
+            education_highest_level=education_highest_level,
+            org_id=org_id,
+        )
+        if self.validate_allocations:
+            ENTERPRISE_ALLOCATION_VALIDATOR.check(allocation_request)
+        payload = allocation_request.to_payload()
+
+        logger.info(
+            '[create_enterprise_allocation] Attempting allocation for order %s with payload: %s',
+            payment_reference,
+            LazyText(allocation_request.payload_for_logging),
+            extra={'payment_reference': payment_reference},
+        )
+
+        response = await self.post(url, json=payload)
+        try:
+            _raise_for_status(response)
+        except HTTPError:
+            logger.error(
+                'Enterprise allocation failed to be created for order %s with reasons: %s, with payload: %s',
+                payment_reference,
+                lazy_response_body(response, self.max_logged_body_length),
+                payload,
+                extra={'payment_reference': payment_reference, 'status_code': response.status_code},
+            )
+            if should_raise:
+                raise
+        return response
+
+    async def cancel_enterprise_allocation(self, order_uuid, should_raise=True):
+        """
+        Cancel an enterprise_allocation (enrollment) through GEAG.
+
+        See GetSmarterEnterpriseApiClient.cancel_enterprise_allocation.
+        """
+        url = f'{self.api_url}/enterprise_allocations/cancel'
+        payload = {
+            'orderUuid': str(order_uuid),
+        }
+
+        response = await self.post(url, json=payload)
+        try:
+            _raise_for_status(response)
+        except HTTPError:
+            logger.error(
+                'Allocation cancelation failed for %s with reasons: %s, with payload: %s',
+                order_uuid,
+                lazy_response_body(response, self.max_logged_body_length),
+                payload,
+                extra={'order_uuid': str(order_uuid), 'status_code': response.status_code},
+            )
+            if should_raise:
+                raise
+        return response
@@ -0,0 +1,172 @@
+"""
+Circuit breakers that stop sending requests to a degraded endpoint.
+"""
+import threading
+import time
+from collections import deque
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreakerOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of sending a request while the endpoint's breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Track recent call outcomes for one endpoint and fail fast while unhealthy.
+
+    The breaker starts closed. Once at least ``minimum_calls`` of the last
+    ``window_size`` calls have completed, it opens when the share of failed
+    calls reaches ``failure_rate_threshold`` or the share of calls slower
+    than ``slow_call_duration`` reaches ``slow_call_rate_threshold``. While
+    open, calls are rejected with CircuitBreakerOpenError. After
+    ``open_duration`` seconds it lets ``half_open_max_calls`` trial calls
+    through: if they all succeed it closes, and any failure reopens it.
+    Outcomes of calls reserved before the breaker last changed state (for
+    example calls still in flight when it opened) are ignored.
+
+    A breaker is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        failure_rate_threshold=0.5,
+        slow_call_rate_threshold=1.0,
+        slow_call_duration=None,
+        window_size=20,
+        minimum_calls=10,
+        open_duration=30,
+        half_open_max_calls=1,
+    ):
+        """
+        Initialize an instance of CircuitBreaker.
+        """
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.minimum_calls = minimum_calls
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        # (failed, slow) for the most recent calls
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        # Incremented on every state change, to recognise stale outcomes.
+        self._generation = 0
+
+    @property
+    def state(self):
+        """
+        Return the current state: 'closed', 'open' or 'half_open'.
+        """
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def _update_state(self):
+        """
+        Move an open breaker to half-open once open_duration has passed.
+        """
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+            self._generation += 1
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._generation += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self._generation += 1
+
+    def before_call(self):
+        """
+        Reserve a call, or raise CircuitBreakerOpenError if it is rejected.
+
+        Returns:
+            A ticket to pass to after_call with the call's outcome.
+        """
+        with self._lock:
+            self._update_state()
+            if self._state == OPEN:
+                raise CircuitBreakerOpenError('Circuit breaker is open.')
+            if self._state == HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitBreakerOpenError('Circuit breaker is half-open and awaiting trial calls.')
+                self._half_open_calls += 1
+            return self._generation
+
+    def after_call(self, failed, duration, ticket=None):
+        """
+        Record the outcome of a call reserved with before_call.
+
+        Args:
+            failed: Whether the call failed.
+            duration: How long the call took, in seconds.
+            ticket: The value before_call returned for the call. The outcome
+                is ignored if the breaker has changed state since then.
+        """
+        slow = self.slow_call_duration is not None and duration >= self.slow_call_duration
+        with self._lock:
+            if ticket is not None and ticket != self._generation:
+                return
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._half_open_successes += 1
+                    if self._half_open_successes >= self.half_open_max_calls:
+                        self._close()
+                return
+            if self._state == OPEN:
+                return
+
+            self._outcomes.append((failed, slow))
+            if len(self._outcomes) < self.minimum_calls:
+                return
+            failure_rate = sum(failed for failed, _ in self._outcomes) / len(self._outcomes)
+            slow_rate = sum(slow for _, slow in self._outcomes) / len(self._outcomes)
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._open()
+
+
+class CircuitBreakerRegistry:
+    """
+    Hand out one CircuitBreaker per endpoint, created with shared settings.
+
+    Share a registry between clients to share breaker state between every
+    thread in the process that calls the same endpoint.
+    """
+
+    def __init__(self, **breaker_kwargs):
+        """
+        Initialize the registry with each CircuitBreaker's keyword arguments.
+        """
+        self.breaker_kwargs = breaker_kwargs
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, endpoint):
+        """
+        Return the breaker for the given endpoint, creating it if needed.
+        """
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(**self.breaker_kwargs)
+            return breaker
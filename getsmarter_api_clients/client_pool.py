@@ -0,0 +1,105 @@
+"""
+Per-thread clients that share one token cache and one connection pool.
+
+Clients authenticate each request with a BearerAuth object instead of
+session headers, so one client can be shared between threads. Code that
+also changes session state (headers, cookies, mounted adapters) per
+thread can instead take its own client from a ClientPool:
+
+    pool = ClientPool(client_id=..., client_secret=..., provider_url=...,
+                      api_url=..., pool_maxsize=16)
+    pool.get().create_enterprise_allocation(...)
+
+Every client in the pool sends its requests through the same
+PooledHTTPAdapter and keeps its token in the same token cache, so threads
+reuse each other's connections and tokens. Concurrent token fetches for
+the same client id are coalesced process-wide, whether or not the clients
+come from the same pool.
+"""
+import threading
+
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
+
+from getsmarter_api_clients.adapters import PooledHTTPAdapter
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.token_cache import TieredTokenCache
+
+
+class ClientPool:
+    """
+    Thread-safe factory that gives each thread its own client.
+    """
+
+    def __init__(
+        self,
+        client_class=GetSmarterEnterpriseApiClient,
+        pool_connections=DEFAULT_POOLSIZE,
+        pool_maxsize=DEFAULT_POOLSIZE,
+        pool_block=DEFAULT_POOLBLOCK,
+        **client_kwargs
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            client_class: The OAuthApiClient subclass to create.
+            pool_connections: Number of hosts to keep connection pools for.
+            pool_maxsize: Maximum number of connections kept open per host.
+                Set it to at least the number of threads, or connections
+                will be discarded after use.
+            pool_block: Whether to wait for a free connection when all
+                pool_maxsize connections are busy.
+            client_kwargs: Keyword arguments for every client. Objects such
+                as a retry_policy, rate_limiter or metrics registry are
+                shared by all the clients.
+        """
+        client_kwargs.setdefault('token_cache', TieredTokenCache())
+        self.client_class = client_class
+        self.client_kwargs = client_kwargs
+        self.token_cache = client_kwargs['token_cache']
+        self.adapter = PooledHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self._local = threading.local()
+
+    def get(self):
+        """
+        Return the calling thread's client, creating it on first use.
+
+        A client is released with its thread. Close the pool, not the
+        clients, as closing a client closes the shared connection pool.
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.client_class(**self.client_kwargs, adapter=self.adapter)
+        return client
+
+    @property
+    def pool_stats(self):
+        """
+        Return the shared pool's created, reused and discarded connections.
+        """
+        return self.adapter.pool_stats.snapshot()
+
+    def close(self):
+        """
+        Close the shared connection pool.
+
+        Clients already handed out must not be used afterwards.
+        """
+        self.adapter.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        """
+        Return the pool itself.
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Close the pool.
+        """
+        self.close()
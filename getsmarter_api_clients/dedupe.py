@@ -0,0 +1,247 @@
+"""
+Deduplication of repeated allocation submissions.
+
+Double-clicks and retried tasks often submit the same allocation several
+times within seconds. A DedupeCache keyed on a fingerprint of the endpoint
+and payload makes those repeats cheap:
+
+* a duplicate that arrives while the first request is in flight waits for it
+  and receives the same response (or exception);
+* a duplicate that arrives within ``ttl`` seconds of a completed request
+  receives the cached response without a request being sent.
+
+Responses are cached in a bounded in-process LRU and, optionally, in a
+shared TokenCache backend (such as TieredTokenCache) so that duplicates
+handled by other processes are caught too. Only responses that GEAG would
+give again are cached: successes and the permanent client errors in
+CACHEABLE_CLIENT_ERROR_STATUSES. Other client errors (such as 401s and
+429s), server errors and exceptions are not.
+
+A response replayed from the shared tier is rebuilt from its status, reason,
+URL, headers and body. Its ``request`` is a bodiless PreparedRequest with the
+original method and URL, and its ``elapsed`` is zero.
+"""
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from getsmarter_api_clients.singleflight import SingleFlight
+
+DEFAULT_DEDUPE_TTL = 60
+DEFAULT_DEDUPE_MAX_ENTRIES = 1024
+
+# Client errors that GEAG returns again for the same payload.
+CACHEABLE_CLIENT_ERROR_STATUSES = frozenset({400, 422})
+
+
+def fingerprint(url, payload):
+    """
+    Return a stable fingerprint of a request to url with a JSON payload.
+    """
+    canonical = json.dumps([url, payload], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _is_cacheable(response):
+    """
+    Return True if a response would be given again for the same payload.
+    """
+    return 200 <= response.status_code < 300 or response.status_code in CACHEABLE_CLIENT_ERROR_STATUSES
+
+
+def _serialize_response(response):
+    """
+    Return a JSON-serializable dict of the replayed parts of a response.
+    """
+    return {
+        'method': response.request.method if response.request is not None else None,
+        'status_code': response.status_code,
+        'reason': response.reason,
+        'url': response.url,
+        'headers': dict(response.headers),
+        'content': response.text,
+    }
+
+
+def _deserialize_response(data):
+    """
+    Rebuild a response serialized with _serialize_response.
+    """
+    response = requests.Response()
+    response.status_code = data['status_code']
+    response.reason = data['reason']
+    response.url = data['url']
+    response.request = requests.Request(data.get('method'), data['url']).prepare()
+    response.elapsed = datetime.timedelta(0)
+    response.headers.update(data['headers'])
+    response._content = data['content'].encode('utf-8')  # pylint: disable=protected-access
+    response.encoding = 'utf-8'
+    return response
+
+
+class DedupeStats:
+    """
+    Thread-safe counters of how submissions were handled.
+
+    ``hits`` were answered from the in-process LRU, ``shared_hits`` from the
+    shared tier, ``joined`` waited for an identical in-flight request, and
+    ``misses`` were sent.
+    """
+
+    def __init__(self):
+        """
+        Initialize all counters to zero.
+        """
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.joined = 0
+        self.misses = 0
+
+    def increment(self, counter):
+        """
+        Add one to the named counter.
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        """
+        Return the current counters as a dict.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'joined': self.joined,
+                'misses': self.misses,
+            }
+
+
+class DedupeCache:
+    """
+    Join concurrent identical requests and replay recent outcomes.
+    """
+
+    def __init__(
+        self,
+        ttl=DEFAULT_DEDUPE_TTL,
+        max_entries=DEFAULT_DEDUPE_MAX_ENTRIES,
+        shared_cache=None,
+        key_prefix='get_smarter_api_client.dedupe',
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds a completed request's response is replayed to
+                duplicates.
+            max_entries: Maximum number of responses kept in the in-process
+                LRU.
+            shared_cache: Optional TokenCache backend, such as
+                TieredTokenCache, that also keeps responses so duplicates
+                sent by other processes are caught.
+            key_prefix: Prefix of the keys used in the shared cache.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared_cache = shared_cache
+        self.key_prefix = key_prefix
+        self.stats = DedupeStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = SingleFlight()
+
+    def _get_local(self, key):
+        """
+        Return the unexpired response cached in the LRU under key, or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if now >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _set_local(self, key, response):
+        """
+        Cache response in the LRU, evicting the least recently used entries.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _shared_key(self, key):
+        return f'{self.key_prefix}.{key}'
+
+    def _get_shared(self, key):
+        if self.shared_cache is None:
+            return None
+        data = self.shared_cache.get(self._shared_key(key))
+        return None if data is None else _deserialize_response(data)
+
+    def _store(self, key, response):
+        """
+        Cache response in every tier, if it would be given again.
+        """
+        if not _is_cacheable(response):
+            return
+        self._set_local(key, response)
+        if self.shared_cache is not None:
+            self.shared_cache.set(self._shared_key(key), _serialize_response(response), self.ttl)
+
+    def get_or_send(self, url, payload, send):
+        """
+        Return the response to a request, sending it only if needed.
+
+        The request is not sent if an identical request is in flight or was
+        sent in the last ``ttl`` seconds.
+
+        Args:
+            url: The URL the payload is sent to.
+            payload: The JSON payload of the request.
+            send: Function that sends the request and returns the response.
+        """
+        key = fingerprint(url, payload)
+        response = self._get_local(key)
+        if response is not None:
+            self.stats.increment('hits')
+            return response
+
+        response = self._get_shared(key)
+        if response is not None:
+            self.stats.increment('shared_hits')
+            self._set_local(key, response)
+            return response
+
+        sent = []
+
+        def send_and_store():
+            sent.append(True)
+            sent_response = send()
+            self._store(key, sent_response)
+            return sent_response
+
+        try:
+            return self._flights.do(key, send_and_store)
+        finally:
+            self.stats.increment('misses' if sent else 'joined')
+
+    def clear(self):
+        """
+        Forget every response kept in the in-process LRU.
+        """
+        with self._lock:
+            self._entries.clear()
@@ -2,13 +2,72 @@
 Client for GetSmarter API Gateway.
 """
 import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
-from requests.exceptions import HTTPError
+from requests.exceptions import HTTPError, RequestException
 
+from getsmarter_api_clients.logging_utils import DEFAULT_MAX_LOGGED_BODY_LENGTH, LazyText, lazy_response_body
+from getsmarter_api_clients.models import AllocationRequest, EnterpriseAllocationRequest
+from getsmarter_api_clients.monitoring import traced
 from getsmarter_api_clients.oauth import OAuthApiClient
+from getsmarter_api_clients.terms_cache import TermsCache
+from getsmarter_api_clients.validation import (
+    ALLOCATION_VALIDATOR,
+    ENTERPRISE_ALLOCATION_VALIDATOR,
+    AllocationValidationError,
+)
 
 logger = logging.getLogger(__name__)
 
+# Default number of concurrent requests for bulk operations. Keep this at or
+# below the size of the client's connection pool so connections are reused.
+DEFAULT_BULK_MAX_WORKERS = 8
+
+
+class BulkResult(namedtuple('BulkResult', ['item', 'response', 'error'])):
+    """
+    The outcome of one item of a bulk operation.
+
+    ``item`` is the input item, ``response`` the GEAG response (if one was
+    received) and ``error`` the exception raised for the item, if any.
+    """
+
+    __slots__ = ()
+
+    @property
+    def succeeded(self):
+        """
+        Return True if the item completed without an error.
+        """
+        return self.error is None
+
+
+class BulkCancellationError(RequestException):
+    """
+    Raised by cancel_enterprise_allocations if any cancellation failed.
+
+    It is raised once every cancellation has been attempted.
+
+    ``results`` is the dict of order UUID to BulkResult that would otherwise
+    have been returned, and ``failed`` lists the BulkResults of the failed
+    cancellations, in input order. ``response`` is the response to the first
+    failed cancellation, if one was received.
+    """
+
+    def __init__(self, results):
+        """
+        Initialize the error with the results of every cancellation.
+        """
+        self.results = results
+        self.failed = [result for result in results.values() if not result.succeeded]
+        super().__init__(
+            f'{len(self.failed)} of {len(results)} enterprise allocation cancellations failed: '
+            + ', '.join(result.item for result in self.failed),
+            response=self.failed[0].response,
+        )
+
 
 class GetSmarterEnterpriseApiClient(OAuthApiClient):
     """
@@ -17,6 +76,95 @@ class GetSmarterEnterpriseApiClient(OAuthApiClient):
     For full documentation, visit https://www.getsmarter.com/api-docs.
     """
 
+    def __init__(
+        self,
+        *args,
+        circuit_breakers=None,
+        terms_cache_ttl=None,
+        terms_stale_while_revalidate=0,
+        terms_stale_if_error=0,
+        validate_allocations=False,
+        max_logged_body_length=DEFAULT_MAX_LOGGED_BODY_LENGTH,
+        dedupe=None,
+        **kwargs
+    ):
+        """
+        Initialize an instance of the GetSmarterEnterpriseApiClient.
+
+        Args:
+            circuit_breakers: Optional CircuitBreakerRegistry. When given,
+                each GEAG endpoint gets its own circuit breaker, and calls to
+                an endpoint whose breaker is open raise
+                CircuitBreakerOpenError without being sent. Share one
+                registry between clients to share breaker state.
+            terms_cache_ttl: Optional number of seconds get_terms_and_policies
+                serves the terms from the token cache before revalidating them
+                with a conditional request. Disabled by default.
+            terms_stale_while_revalidate: Seconds after terms_cache_ttl during
+                which the cached terms are returned immediately while they are
+                revalidated in the background.
+            terms_stale_if_error: Seconds after terms_cache_ttl during which
+                the cached terms are returned if GEAG cannot be reached or
+                returns an error.
+            validate_allocations: Whether to check allocations against the
+                values GEAG accepts before sending them, raising
+                AllocationValidationError instead of making a request that
+                would be rejected. Disabled by default.
+            max_logged_body_length: Maximum number of characters of a GEAG
+                error response included in error logs, or None for all.
+            dedupe: Optional DedupeCache. When given, an allocation identical
+                to one in flight waits for its response, and one identical to
+                an allocation sent in the last ``dedupe.ttl`` seconds gets
+                the cached response without a request being made.
+        """
+        super().__init__(*args, **kwargs)
+        self.circuit_breakers = circuit_breakers
+        self.validate_allocations = validate_allocations
+        self.max_logged_body_length = max_logged_body_length
+        self.dedupe = dedupe
+        self.terms_cache = None
+        if terms_cache_ttl is not None:
+            self.terms_cache = TermsCache(
+                self,
+                terms_cache_ttl,
+                stale_while_revalidate=terms_stale_while_revalidate,
+                stale_if_error=terms_stale_if_error,
+            )
+
+    def _send_attempt(self, request, **kwargs):
+        """
+        Send each attempt through the endpoint's circuit breaker, if any.
+
+        The rate limiter has already been passed, so its waits and
+        RateLimitExceeded errors are not counted. Server errors (5xx), 429s
+        and exceptions count as failures; other error responses mean GEAG is
+        healthy and count as successes.
+        """
+        if self.circuit_breakers is None:
+            return super()._send_attempt(request, **kwargs)
+
+        breaker = self.circuit_breakers.get(self.get_endpoint(request.url))
+        ticket = breaker.before_call()
+        start = time.monotonic()
+        try:
+            response = super()._send_attempt(request, **kwargs)
+        except Exception:
+            breaker.after_call(failed=True, duration=time.monotonic() - start, ticket=ticket)
+            raise
+        failed = response.status_code >= 500 or response.status_code == 429
+        breaker.after_call(failed=failed, duration=time.monotonic() - start, ticket=ticket)
+        return response
+
+    def _post_allocation(self, url, payload, idempotency_key):
+        """
+        Post an allocation payload, through the client's dedupe cache if any.
+        """
+        if self.dedupe is None:
+            return self.post(url, json=payload, idempotency_key=idempotency_key)
+        return self.dedupe.get_or_send(
+            url, payload, lambda: self.post(url, json=payload, idempotency_key=idempotency_key)
+        )
+
     def get_terms_and_policies(self):
         """
         Fetch and return the terms and policies from GEAG.
@@ -25,32 +173,15 @@ class GetSmarterEnterpriseApiClient(OAuthApiClient):
             Dict containing the keys 'privacyPolicy', 'websiteTermsOfUse',
             'studentTermsAndConditions', and 'cookiePolicy'.
         """
+        if self.terms_cache is not None:
+            return self.terms_cache.get()
+
         url = f'{self.api_url}/terms'
         response = self.get(url)
         response.raise_for_status()
         return response.json()
 
-    def _get_allocation_payload_for_logging(self, allocation_payload, fields_to_log=None):
-        """
-        Get the allocation payload for logging.
-
-        The payload for logging should only include the fields
-        specified in fields_to_log.
-
-        Args:
-            allocation_payload: The allocation payload to log.
-            fields_to_log: List of fields to include in the log.
-
-        Returns:
-            A dictionary containing only the specified fields.
-        """
-        if not fields_to_log:
-            fields_to_log = []
-        return {
-            field: allocation_payload.get(field)
-            for field in fields_to_log
-        }
-
+    @traced('getsmarter_api_clients.create_allocation')
     def create_allocation(
         self,
         payment_reference,
@@ -128,56 +259,52 @@ class GetSmarterEnterpriseApiClient(OAuthApiClient):
         """
         url = f'{self.api_url}/allocations'
 
-        payload = {
-            'paymentReference': payment_reference,
-            'addressLine1': address_line1,
-            'city': city,
-            'postalCode': postal_code,
-            'country': country,
-            'countryCode': country_code,
-            'firstName': first_name,
-            'lastName': last_name,
-            'email': email,
-            'dateOfBirth': date_of_birth,
-            'termsAcceptedAt': terms_accepted_at,
-            'currency': currency,
-            'orderItems': order_items,
-            # optional fields
-            'addressLine2': address_line2,
-            'state': state,
-            'stateCode': state_code,
-            'mobilePhone': mobile_phone,
-            'workExperience': work_experience,
-            'educationHighestLevel': education_highest_level,
-        }
-        # remove keys with empty values
-        payload = {k: v for k, v in payload.items() if v is not None}
+        allocation_request = AllocationRequest(
+            payment_reference=payment_reference,
+            address_line1=address_line1,
+            city=city,
+            postal_code=postal_code,
+            country=country,
+            country_code=country_code,
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            date_of_birth=date_of_birth,
+            terms_accepted_at=terms_accepted_at,
+            currency=currency,
+            order_items=order_items,
+            address_line2=address_line2,
+            state=state,
+            state_code=state_code,
+            mobile_phone=mobile_phone,
+            work_experience=work_experience,
+            education_highest_level=education_highest_level,
+        )
+
+        if self.validate_allocations:
+            ALLOCATION_VALIDATOR.check(allocation_request)
+        payload = allocation_request.to_payload()
 
         # log the payload
-        payload_for_logging = self._get_allocation_payload_for_logging(
-            allocation_payload=payload,
-            fields_to_log=[
-                'paymentReference',
-                'orderItems',
-            ],
+        logger.info(
+            '[create_allocation] Attempting allocation for order %s with payload: %s',
+            payment_reference,
+            LazyText(allocation_request.payload_for_logging),
+            extra={'payment_reference': payment_reference},
         )
-        payload_message = (
-            f'[create_allocation] Attempting allocation for order {payment_reference} '
-            f'with payload: {payload_for_logging}'
-        )
-        logger.info(payload_message)
 
         # send the allocation
-        response = self.post(url, json=payload)
+        response = self._post_allocation(url, payload, payment_reference)
         try:
             response.raise_for_status()
         except HTTPError:
-            message = (
-              f'Allocation failed to be created for order {payment_reference} '
-              f'with reasons: {response.text}, '
-              f'with payload: {payload}'
+            logger.error(
+                'Allocation failed to be created for order %s with reasons: %s, with payload: %s',
+                payment_reference,
+                lazy_response_body(response, self.max_logged_body_length),
+                payload,
+                extra={'payment_reference': payment_reference, 'status_code': response.status_code},
             )
-            logger.error(message)
             raise
         return response
 
@@ -185,6 +312,7 @@ class GetSmarterEnterpriseApiClient(OAuthApiClient):
     # specific needs. The fields with a default of None are optional
     # fields. Notice this endpoint differs in the amount of optional
     # fields when compared against the other allocation endpoint.
+    @traced('getsmarter_api_clients.create_enterprise_allocation')
     def create_enterprise_allocation(
         self,
         payment_reference,
@@ -266,66 +394,70 @@ class GetSmarterEnterpriseApiClient(OAuthApiClient):
             "orgId": "12KJ2j9js0" }
 
         """
-        url = f'{self.api_url}/enterprise_allocations'
+        allocation_request = EnterpriseAllocationRequest(
+            payment_reference=payment_reference,
+            enterprise_customer_uuid=enterprise_customer_uuid,
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            date_of_birth=date_of_birth,
+            terms_accepted_at=terms_accepted_at,
+            data_share_consent=data_share_consent,
+            currency=currency,
+            order_items=order_items,
+            address_line1=address_line1,
+            address_line2=address_line2,
+            city=city,
+            postal_code=postal_code,
+            state=state,
+            state_code=state_code,
+            country=country,
+            country_code=country_code,
+            mobile_phone=mobile_phone,
+            work_experience=work_experience,
+            education_highest_level=education_highest_level,
+            org_id=org_id,
+        )
 
-        payload = {
-            'paymentReference': payment_reference,
-            'enterpriseCustomerUuid': enterprise_customer_uuid,
-            'firstName': first_name,
-            'lastName': last_name,
-            'email': email,
-            'dateOfBirth': date_of_birth,
-            'termsAcceptedAt': terms_accepted_at,
-            'dataShareConsent': data_share_consent,
-            'currency': currency,
-            'orderItems': order_items,
-            # optional fields
-            'addressLine1': address_line1,
-            'addressLine2': address_line2,
-            'city': city,
-            'postalCode': postal_code,
-            'state': state,
-            'stateCode': state_code,
-            'country': country,
-            'countryCode': country_code,
-            'mobilePhone': mobile_phone,
-            'workExperience': work_experience,
-            'educationHighestLevel': education_highest_level,
-            'orgId': org_id,
-        }
-        # remove keys with empty values
-        payload = {k: v for k, v in payload.items() if v is not None}
+        if self.validate_allocations:
+            ENTERPRISE_ALLOCATION_VALIDATOR.check(allocation_request)
+        return self._send_enterprise_allocation(allocation_request, should_raise)
+
+    def _send_enterprise_allocation(self, allocation_request, should_raise=True):
+        """
+        Send an EnterpriseAllocationRequest.
+
+        The request must already have been validated, if the client validates
+        allocations.
+        """
+        url = f'{self.api_url}/enterprise_allocations'
+        payment_reference = allocation_request.payment_reference
+        payload = allocation_request.to_payload()
 
         # log the payload
-        payload_for_logging = self._get_allocation_payload_for_logging(
-            allocation_payload=payload,
-            fields_to_log=[
-                'paymentReference',
-                'enterpriseCustomerUuid',
-                'orgId',
-                'orderItems',
-            ],
-        )
-        payload_message = (
-            f'[create_enterprise_allocation] Attempting allocation for order {payment_reference} '
-            f'with payload: {payload_for_logging}'
+        logger.info(
+            '[create_enterprise_allocation] Attempting allocation for order %s with payload: %s',
+            payment_reference,
+            LazyText(allocation_request.payload_for_logging),
+            extra={'payment_reference': payment_reference},
         )
-        logger.info(payload_message)
 
-        response = self.post(url, json=payload)
+        response = self._post_allocation(url, payload, payment_reference)
         try:
             response.raise_for_status()
         except HTTPError:
-            message = (
-              f'Enterprise allocation failed to be created for order {payment_reference} '
-              f'with reasons: {response.text}, '
-              f'with payload: {payload}'
+            logger.error(
+                'Enterprise allocation failed to be created for order %s with reasons: %s, with payload: %s',
+                payment_reference,
+                lazy_response_body(response, self.max_logged_body_length),
+                payload,
+                extra={'payment_reference': payment_reference, 'status_code': response.status_code},
             )
-            logger.error(message)
             if should_raise:
                 raise
         return response
 
+    @traced('getsmarter_api_clients.cancel_enterprise_allocation')
     def cancel_enterprise_allocation(
         self,
         order_uuid,
@@ -344,16 +476,126 @@ class GetSmarterEnterpriseApiClient(OAuthApiClient):
             'orderUuid': str(order_uuid),
         }
 
-        response = self.post(url, json=payload)
+        response = self.post(url, json=payload, idempotency_key=payload['orderUuid'])
         try:
             response.raise_for_status()
         except HTTPError:
-            message = (
-              f'Allocation cancelation failed for {order_uuid} '
-              f'with reasons: {response.text}, '
-              f'with payload: {payload}'
+            logger.error(
+                'Allocation cancelation failed for %s with reasons: %s, with payload: %s',
+                order_uuid,
+                lazy_response_body(response, self.max_logged_body_length),
+                payload,
+                extra={'order_uuid': str(order_uuid), 'status_code': response.status_code},
             )
-            logger.error(message)
             if should_raise:
                 raise
         return response
+
+    def _run_bulk(self, fn, items, max_workers):
+        """
+        Apply fn to every item with at most max_workers running at once.
+
+        Returns:
+            A list of BulkResult, in input order.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geag-bulk') as executor:
+            return list(executor.map(fn, items))
+
+    def _create_enterprise_allocation_result(self, allocation_and_request):
+        """
+        Send one built enterprise allocation and return its BulkResult.
+        """
+        allocation, allocation_request = allocation_and_request
+        try:
+            response = self._send_enterprise_allocation(allocation_request, should_raise=True)
+        except (RequestException, AllocationValidationError) as ex:
+            return BulkResult(allocation, getattr(ex, 'response', None), ex)
+        return BulkResult(allocation, response, None)
+
+    @traced('getsmarter_api_clients.create_enterprise_allocations')
+    def create_enterprise_allocations(self, allocations, max_workers=DEFAULT_BULK_MAX_WORKERS):
+        """
+        Create many enterprise allocations concurrently through GEAG.
+
+        A failed allocation does not stop the others; its error is returned
+        in its BulkResult instead of being raised. Every allocation is built,
+        and validated if the client validates allocations, before any is
+        sent; invalid allocations, and those whose arguments do not fit
+        `create_enterprise_allocation`, get an AllocationValidationError
+        without a request being made.
+
+        :Parameters:
+          - `allocations (iterable of dict)`: Keyword arguments for
+            `create_enterprise_allocation`, one dict per allocation
+          - `max_workers (int)`: Maximum number of allocations in flight
+
+        Returns:
+            A list of BulkResult, in the same order as `allocations`.
+
+        Only errors making the request (requests.RequestException) and
+        AllocationValidationErrors are captured in the results; any other
+        exception is raised.
+        """
+        allocations = list(allocations)
+        allocation_requests = ENTERPRISE_ALLOCATION_VALIDATOR.build_batch(allocations, self.validate_allocations)
+
+        to_send = [
+            (allocation, allocation_request)
+            for allocation, allocation_request in zip(allocations, allocation_requests)
+            if not isinstance(allocation_request, AllocationValidationError)
+        ]
+        sent_results = iter(self._run_bulk(self._create_enterprise_allocation_result, to_send, max_workers))
+        return [
+            BulkResult(allocation, None, allocation_request)
+            if isinstance(allocation_request, AllocationValidationError) else next(sent_results)
+            for allocation, allocation_request in zip(allocations, allocation_requests)
+        ]
+
+    def _cancel_enterprise_allocation_result(self, order_uuid):
+        """
+        Cancel one enterprise allocation and return its BulkResult.
+        """
+        try:
+            response = self.cancel_enterprise_allocation(order_uuid, should_raise=True)
+        except RequestException as ex:
+            return BulkResult(order_uuid, ex.response, ex)
+        return BulkResult(order_uuid, response, None)
+
+    @traced('getsmarter_api_clients.cancel_enterprise_allocations')
+    def cancel_enterprise_allocations(self, order_uuids, max_workers=DEFAULT_BULK_MAX_WORKERS, should_raise=True):
+        """
+        Cancel many enterprise allocations concurrently through GEAG.
+
+        Order UUIDs are deduplicated, so each allocation is cancelled once no
+        matter how often it appears. Every cancellation is attempted before
+        any error is raised.
+
+        :Parameters:
+          - `order_uuids (iterable of str or UUID)`: The order UUIDs of the
+            allocations to cancel
+          - `max_workers (int)`: Maximum number of cancellations in flight
+          - `should_raise` (boolean): Should a BulkCancellationError, with
+            the results of every cancellation, be raised once all
+            cancellations have been attempted if any failed
+
+        Returns:
+            A dict mapping each distinct order UUID (as a str) to its
+            BulkResult, in the order the UUIDs first appear.
+
+        Only errors making the request (requests.RequestException) are
+        captured in the results; any other exception is raised.
+        """
+        unique_order_uuids = list(dict.fromkeys(str(order_uuid) for order_uuid in order_uuids))
+        results = self._run_bulk(self._cancel_enterprise_allocation_result, unique_order_uuids, max_workers)
+        summary = {result.item: result for result in results}
+
+        failed = [result for result in results if not result.succeeded]
+        logger.info(
+            'Cancelled %d of %d enterprise allocations.',
+            len(results) - len(failed),
+            len(results),
+            extra={'cancelled': len(results) - len(failed), 'failed': len(failed)},
+        )
+        if failed and should_raise:
+            raise BulkCancellationError(summary)
+        return summary
@@ -0,0 +1,369 @@
+"""
+Stream enterprise allocations from a JSONL or CSV file into GEAG.
+
+Records are read lazily and sent with a bounded number of requests in
+flight, so memory use does not grow with the size of the file. Progress is
+written to a small checkpoint file every few records, and a re-run with the
+same checkpoint skips every record that was already sent. Records GEAG
+rejected as invalid are checkpointed as complete, but records that failed
+transiently (e.g. during an outage) are checkpointed for retry, so a re-run
+sends them again.
+
+Each record maps onto the parameters of
+``GetSmarterEnterpriseApiClient.create_enterprise_allocation``; columns may
+use either the parameter names (``payment_reference``) or the GEAG payload
+names (``paymentReference``). Unknown columns are ignored.
+"""
+import argparse
+import csv
+import inspect
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.geag import DEFAULT_BULK_MAX_WORKERS, GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.standalone import configure_django
+from getsmarter_api_clients.validation import AllocationValidationError
+
+logger = logging.getLogger(__name__)
+
+ALLOCATION_PARAMETERS = [
+    name for name in inspect.signature(GetSmarterEnterpriseApiClient.create_enterprise_allocation).parameters
+    if name not in ('self', 'should_raise')
+]
+
+
+def _camel_case(name):
+    return re.sub(r'_([a-z0-9])', lambda match: match.group(1).upper(), name)
+
+
+# Maps both snake_case parameter names and camelCase payload names to
+# parameter names.
+COLUMN_TO_PARAMETER = {
+    **{_camel_case(name): name for name in ALLOCATION_PARAMETERS},
+    **{name: name for name in ALLOCATION_PARAMETERS},
+}
+
+TRUE_VALUES = {'true', '1', 'yes', 'y'}
+
+# Statuses with which GEAG rejects an allocation that will never be
+# accepted as is.
+PERMANENT_FAILURE_STATUSES = frozenset({400, 422})
+
+DEFAULT_CHECKPOINT_SAVE_EVERY = 100
+DEFAULT_CHECKPOINT_SAVE_INTERVAL = 1.0
+
+
+def is_permanent_failure(error):
+    """
+    Return True if sending the allocation again cannot succeed.
+    """
+    if isinstance(error, AllocationValidationError):
+        return True
+    response = getattr(error, 'response', None)
+    return isinstance(error, HTTPError) and response is not None and response.status_code in PERMANENT_FAILURE_STATUSES
+
+
+def _parse_csv_value(parameter, value):
+    """
+    Convert a CSV cell into the value create_enterprise_allocation expects.
+    """
+    if value == '':
+        return None
+    if parameter == 'order_items':
+        return json.loads(value)
+    if parameter == 'data_share_consent':
+        return value.strip().lower() in TRUE_VALUES
+    return value
+
+
+def _iter_jsonl(path):
+    with open(path, encoding='utf-8') as records:
+        for line in records:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_csv(path):
+    with open(path, encoding='utf-8', newline='') as records:
+        for row in csv.DictReader(records):
+            yield {
+                column: _parse_csv_value(COLUMN_TO_PARAMETER.get(column), value)
+                for column, value in row.items()
+            }
+
+
+def read_allocation_records(path, file_format=None):
+    """
+    Lazily yield allocation keyword arguments from a JSONL or CSV file.
+
+    Args:
+        path: Path of the input file.
+        file_format: 'jsonl' or 'csv'; inferred from the file extension when
+            omitted.
+    """
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    if file_format not in ('jsonl', 'csv'):
+        raise ValueError(f'Unsupported allocation file format: {file_format}')
+
+    rows = _iter_csv(path) if file_format == 'csv' else _iter_jsonl(path)
+    for row in rows:
+        yield {
+            COLUMN_TO_PARAMETER[column]: value
+            for column, value in row.items()
+            if column in COLUMN_TO_PARAMETER and value is not None
+        }
+
+
+class Checkpoint:
+    """
+    Compact, crash-safe record of which input records have been sent.
+
+    Stores the number of leading records that are all finished (``offset``),
+    the payment references of completed records beyond it and the indices of
+    records that failed transiently (``retry``), which a later run sends
+    again. Transient failures do not hold the offset back, so the checkpoint
+    stays as small as the number of records in flight and failed.
+
+    The file is replaced atomically, at most every ``save_every`` records or
+    ``save_interval`` seconds, whichever comes first, and when the run ends.
+    After a hard crash, the records finished since the last save are sent
+    again.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        save_every=DEFAULT_CHECKPOINT_SAVE_EVERY,
+        save_interval=DEFAULT_CHECKPOINT_SAVE_INTERVAL,
+    ):
+        """
+        Initialize the checkpoint, loading any existing state from path.
+        """
+        self.path = path
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.offset = 0
+        self.completed = set()
+        self.retry = set()
+        # index -> payment reference of finished records beyond the offset
+        self._finished = {}
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as checkpoint_file:
+                state = json.load(checkpoint_file)
+            self.offset = state['offset']
+            self.completed = set(state['completed'])
+            self.retry = set(state.get('retry', ()))
+
+    def is_complete(self, index, payment_reference):
+        """
+        Return True if the record at index was already sent.
+        """
+        if index in self.retry:
+            return False
+        return index < self.offset or payment_reference in self.completed
+
+    def mark_complete(self, index, payment_reference):
+        """
+        Record the record at index as sent and checkpoint it.
+        """
+        self.retry.discard(index)
+        if index >= self.offset:
+            self.completed.add(payment_reference)
+            self._finished[index] = payment_reference
+        self.advance()
+
+    def mark_retry(self, index):
+        """
+        Record that the record at index failed transiently and checkpoint it.
+        """
+        self.retry.add(index)
+        if index >= self.offset:
+            self._finished[index] = None
+        self.advance()
+
+    def mark_skipped(self, index, payment_reference):
+        """
+        Record that the record at index was skipped as it is already complete.
+        """
+        if index >= self.offset:
+            self._finished[index] = payment_reference
+
+    def advance(self):
+        """
+        Move the offset past contiguous finished records.
+
+        References behind the offset are dropped, keeping the checkpoint small.
+        The checkpoint is saved once enough records or time have passed since
+        the last save.
+        """
+        while self.offset in self._finished:
+            self.completed.discard(self._finished.pop(self.offset))
+            self.offset += 1
+        self._unsaved += 1
+        if self._unsaved >= self.save_every or time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """
+        Atomically write the checkpoint to disk.
+        """
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        if not self.path:
+            return
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(
+                {'offset': self.offset, 'completed': sorted(self.completed), 'retry': sorted(self.retry)},
+                checkpoint_file,
+            )
+        os.replace(temp_path, self.path)
+
+
+class AllocationIngest:
+    """
+    Send a stream of enterprise allocations with backpressure and checkpoints.
+
+    Args:
+        client: A GetSmarterEnterpriseApiClient.
+        checkpoint_path: Optional path of the checkpoint file to resume from
+            and update.
+        failures_path: Optional path of a JSONL file that failed records are
+            appended to, in a form that can be fed back in as input.
+        max_in_flight: Maximum number of allocations being sent at once.
+    """
+
+    def __init__(self, client, checkpoint_path=None, failures_path=None, max_in_flight=DEFAULT_BULK_MAX_WORKERS):
+        """
+        Initialize an instance of AllocationIngest.
+        """
+        self.client = client
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.failures_path = failures_path
+        self.max_in_flight = max_in_flight
+        self.stats = {'sent': 0, 'succeeded': 0, 'failed': 0, 'retryable': 0, 'skipped': 0}
+
+    def _send(self, allocation):
+        """
+        Send one allocation, returning the error if it failed.
+        """
+        try:
+            self.client.create_enterprise_allocation(**allocation, should_raise=True)
+        except Exception as ex:  # pylint: disable=broad-except
+            return ex
+        return None
+
+    def _record_failure(self, allocation, error):
+        if not self.failures_path:
+            return
+        with open(self.failures_path, 'a', encoding='utf-8') as failures_file:
+            failures_file.write(json.dumps({**allocation, '_error': str(error)}) + '\n')
+
+    def _complete(self, index, allocation, error):
+        """
+        Count a record's outcome and checkpoint it unless it should be resent.
+        """
+        self.stats['sent'] += 1
+        if error is None:
+            self.stats['succeeded'] += 1
+        else:
+            self.stats['failed'] += 1
+            self._record_failure(allocation, error)
+            if not is_permanent_failure(error):
+                self.stats['retryable'] += 1
+                logger.warning(
+                    'Allocation %s failed transiently and will be sent again on resume: %s',
+                    allocation.get('payment_reference'),
+                    error,
+                    extra={'payment_reference': allocation.get('payment_reference')},
+                )
+                self.checkpoint.mark_retry(index)
+                return
+        self.checkpoint.mark_complete(index, allocation.get('payment_reference'))
+
+    def run(self, allocations):
+        """
+        Send every allocation that the checkpoint does not mark as complete.
+
+        Returns:
+            A dict with the number of records sent, succeeded, failed and
+            skipped. ``retryable`` counts the failed records that were not
+            checkpointed and will be sent again by a re-run.
+        """
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='geag-ingest') as executor:
+            try:
+                for index, allocation in enumerate(allocations):
+                    if self.checkpoint.is_complete(index, allocation.get('payment_reference')):
+                        self.stats['skipped'] += 1
+                        self.checkpoint.mark_skipped(index, allocation.get('payment_reference'))
+                        continue
+
+                    if len(in_flight) >= self.max_in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._complete(*in_flight.pop(future), future.result())
+
+                    in_flight[executor.submit(self._send, allocation)] = (index, allocation)
+            finally:
+                # Checkpoint whatever was already sent, even if reading the
+                # input failed.
+                for future in list(in_flight):
+                    self._complete(*in_flight.pop(future), future.result())
+                self.checkpoint.advance()
+                self.checkpoint.save()
+
+        return dict(self.stats)
+
+
+def main(argv=None):
+    """
+    Console entry point: stream allocations from a file into GEAG.
+    """
+    parser = argparse.ArgumentParser(description='Stream enterprise allocations from a JSONL or CSV file into GEAG.')
+    parser.add_argument('input', help='path of the JSONL or CSV file of allocations')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from the file extension)')
+    parser.add_argument('--checkpoint', help='checkpoint file to resume from and update')
+    parser.add_argument('--failures', help='JSONL file to append failed records to')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_BULK_MAX_WORKERS)
+    parser.add_argument('--client-id', default=os.environ.get('GETSMARTER_CLIENT_ID'))
+    parser.add_argument('--client-secret', default=os.environ.get('GETSMARTER_CLIENT_SECRET'))
+    parser.add_argument('--provider-url', default=os.environ.get('GETSMARTER_PROVIDER_URL'))
+    parser.add_argument('--api-url', default=os.environ.get('GETSMARTER_API_URL'))
+    args = parser.parse_args(argv)
+
+    for option in ('client_id', 'client_secret', 'provider_url', 'api_url'):
+        if not getattr(args, option):
+            parser.error(f'--{option.replace("_", "-")} is required')
+
+    logging.basicConfig(level=logging.WARNING)
+    configure_django()
+    client = GetSmarterEnterpriseApiClient(
+        client_id=args.client_id,
+        client_secret=args.client_secret,
+        provider_url=args.provider_url,
+        api_url=args.api_url,
+    )
+    ingest = AllocationIngest(
+        client,
+        checkpoint_path=args.checkpoint,
+        failures_path=args.failures,
+        max_in_flight=args.max_in_flight,
+    )
+    stats = ingest.run(read_allocation_records(args.input, args.format))
+    print(json.dumps(stats))
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+Replay an allocation workload through GEAG at a target arrival rate.
+
+Requests are scheduled open-loop: each one is due at a fixed point in time
+derived from the target rate, whether or not earlier requests have completed,
+and its latency is measured from that point. When the service (or the
+client) falls behind, requests queue and the queuing delay shows up in the
+reported latencies instead of silently lowering the offered rate.
+
+The workload is either synthetic or read from a JSONL or CSV file of
+enterprise allocations (see ``getsmarter_api_clients.ingest``). A fraction
+of the requests can be cancellations of allocations created earlier in the
+run.
+
+To capacity-plan before running it against a shared environment, point it
+at a local server standing in for the OAuth provider and GEAG (passing
+``--insecure-transport`` if it serves plain HTTP). The stand-in server used
+by this project's benchmarks is only available from a checkout of the
+source repository; it is not installed with the package.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.ingest import read_allocation_records
+from getsmarter_api_clients.metrics import Histogram
+from getsmarter_api_clients.standalone import configure_django
+
+DEFAULT_MAX_IN_FLIGHT = 64
+
+SYNTHETIC_ALLOCATION = {
+    'enterprise_customer_uuid': '01234567-1234-1234-1234-0123456789ab',
+    'first_name': 'Load',
+    'last_name': 'Test',
+    'date_of_birth': '2000-01-01',
+    'terms_accepted_at': '2022-07-25T10:29:56Z',
+    'data_share_consent': True,
+    'currency': 'USD',
+    'order_items': [
+        {
+            'productId': '87c24e19-b82c-4acd-ab90-714af629f11a',
+            'quantity': 1,
+            'normalPrice': 1000,
+            'discount': 1000,
+            'finalPrice': 0,
+        },
+    ],
+    'country': 'United States',
+    'country_code': 'US',
+}
+
+CREATE = 'create'
+CANCEL = 'cancel'
+
+
+def synthetic_allocations(prefix='LOADGEN'):
+    """
+    Yield an endless stream of distinct synthetic enterprise allocations.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    index = 0
+    while True:
+        yield dict(
+            SYNTHETIC_ALLOCATION,
+            payment_reference=f'{prefix}-{run_id}-{index}',
+            email=f'loadgen+{run_id}-{index}@example.com',
+        )
+        index += 1
+
+
+def percentile(sorted_values, fraction):
+    """
+    Return the nearest-rank percentile of a sorted list, or None if empty.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def _outcome(response=None, error=None):
+    """
+    Return the label an outcome is counted under.
+
+    For example '201', 'http_503' or 'ConnectionError'.
+    """
+    if error is None:
+        return str(response.status_code)
+    if isinstance(error, HTTPError) and error.response is not None:
+        return f'http_{error.response.status_code}'
+    return error.__class__.__name__
+
+
+class LoadGenerator:
+    """
+    Send allocation creates and cancels through a client at a fixed rate.
+    """
+
+    def __init__(
+        self,
+        client,
+        rate,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        cancel_ratio=0,
+        arrival='uniform',
+        seed=None,
+    ):
+        """
+        Initialize the load generator.
+
+        Args:
+            client: The GetSmarterEnterpriseApiClient to send requests with.
+            rate: Target requests per second.
+            max_in_flight: Maximum number of requests being sent at once.
+                Requests that are due while all are busy wait in a queue,
+                and the wait counts towards their latency.
+            cancel_ratio: Fraction (0 to 1) of requests that cancel an
+                allocation created earlier in the run instead of creating one.
+            arrival: 'uniform' to space requests evenly, or 'poisson' for
+                exponentially distributed gaps with the same mean.
+            seed: Optional seed for the operation mix and arrival gaps.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+        if not 0 <= cancel_ratio <= 1:
+            raise ValueError('cancel_ratio must be between 0 and 1.')
+        if arrival not in ('uniform', 'poisson'):
+            raise ValueError("arrival must be 'uniform' or 'poisson'.")
+
+        self.client = client
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.cancel_ratio = cancel_ratio
+        self.arrival = arrival
+        self.random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._order_uuids = deque()
+        self._latencies = []
+        self._histogram = Histogram()
+        self._operations = Counter()
+        self._outcomes = Counter()
+        self._errors = 0
+
+    def _next_gap(self):
+        if self.arrival == 'poisson':
+            return self.random.expovariate(self.rate)
+        return 1 / self.rate
+
+    def _create(self, allocation):
+        """
+        Create an allocation, remembering its order UUID for later cancels.
+        """
+        response = self.client.create_enterprise_allocation(**dict(allocation, should_raise=True))
+        try:
+            order_uuid = response.json().get('orderUuid')
+        except ValueError:
+            order_uuid = None
+        if order_uuid:
+            self._order_uuids.append(order_uuid)
+        return response
+
+    def _cancel(self):
+        """
+        Cancel a previously created allocation, or a random order UUID.
+        """
+        try:
+            order_uuid = self._order_uuids.popleft()
+        except IndexError:
+            order_uuid = uuid.uuid4()
+        return self.client.cancel_enterprise_allocation(order_uuid, should_raise=True)
+
+    def _send(self, operation, allocation, due):
+        """
+        Send one request and record its latency, measured from when it was due.
+        """
+        response = error = None
+        try:
+            if operation == CANCEL:
+                response = self._cancel()
+            else:
+                response = self._create(allocation)
+        except Exception as ex:  # pylint: disable=broad-except
+            error = ex
+        latency = time.monotonic() - due
+        self._histogram.observe(latency)
+        with self._lock:
+            self._latencies.append(latency)
+            self._outcomes[_outcome(response, error)] += 1
+            self._errors += error is not None
+
+    def run(self, allocations, duration=None, count=None):
+        """
+        Replay allocations until duration, count or the allocations run out.
+
+        Stops once duration seconds have passed, count requests have been sent
+        or there are no allocations left, whichever comes first.
+
+        Returns:
+            A dict report with the offered and achieved throughput, a
+            breakdown of operations and outcomes, latency percentiles and a
+            cumulative latency histogram.
+        """
+        if duration is None and count is None:
+            raise ValueError('Either duration or count is required.')
+
+        allocations = iter(allocations)
+        sent = 0
+        max_lag = 0.0
+        start = time.monotonic()
+        due = start
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='geag-loadgen') as executor:
+            while count is None or sent < count:
+                if duration is not None and due - start >= duration:
+                    break
+                if self.cancel_ratio and self.random.random() < self.cancel_ratio:
+                    operation, allocation = CANCEL, None
+                else:
+                    allocation = next(allocations, None)
+                    if allocation is None:
+                        break
+                    operation = CREATE
+
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+                executor.submit(self._send, operation, allocation, due)
+                self._operations[operation] += 1
+                sent += 1
+                due += self._next_gap()
+        elapsed = time.monotonic() - start
+
+        return self._report(sent, elapsed, max_lag)
+
+    def _report(self, sent, elapsed, max_lag):
+        """
+        Return the report of a run; see run.
+        """
+        latencies = sorted(self._latencies)
+        cumulative, _, _ = self._histogram.snapshot()
+        bounds = [*self._histogram.buckets, '+Inf']
+
+        def milliseconds(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        return {
+            'offered_rate': self.rate,
+            'duration_s': round(elapsed, 3),
+            'requests': sent,
+            'achieved_throughput': round(len(latencies) / elapsed, 2) if elapsed else None,
+            'operations': dict(self._operations),
+            'outcomes': dict(self._outcomes),
+            'errors': self._errors,
+            'latency_ms': {
+                'p50': milliseconds(percentile(latencies, 0.5)),
+                'p90': milliseconds(percentile(latencies, 0.9)),
+                'p99': milliseconds(percentile(latencies, 0.99)),
+                'max': milliseconds(latencies[-1] if latencies else None),
+            },
+            'latency_histogram': [
+                {'le_ms': bound if bound == '+Inf' else bound * 1000, 'count': bucket_count}
+                for bound, bucket_count in zip(bounds, cumulative)
+            ],
+            'max_schedule_lag_ms': milliseconds(max_lag),
+        }
+
+
+def main(argv=None):
+    """
+    Console entry point: replay an allocation workload through GEAG.
+
+    Prints a JSON report of the run.
+    """
+    parser = argparse.ArgumentParser(description='Replay an allocation workload through GEAG at a target rate.')
+    parser.add_argument('--input', help='JSONL or CSV file of allocations to replay (default: synthetic allocations)')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from the file extension)')
+    parser.add_argument('--rate', type=float, required=True, help='target requests per second')
+    parser.add_argument('--duration', type=float, help='seconds to generate load for')
+    parser.add_argument('--requests', type=int, help='number of requests to send')
+    parser.add_argument('--cancel-ratio', type=float, default=0, help='fraction of requests that are cancellations')
+    parser.add_argument('--arrival', choices=['uniform', 'poisson'], default='uniform')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument(
+        '--insecure-transport',
+        action='store_true',
+        help='allow fetching tokens over plain HTTP, e.g. from a local stand-in',
+    )
+    parser.add_argument('--client-id', default=os.environ.get('GETSMARTER_CLIENT_ID'))
+    parser.add_argument('--client-secret', default=os.environ.get('GETSMARTER_CLIENT_SECRET'))
+    parser.add_argument('--provider-url', default=os.environ.get('GETSMARTER_PROVIDER_URL'))
+    parser.add_argument('--api-url', default=os.environ.get('GETSMARTER_API_URL'))
+    args = parser.parse_args(argv)
+
+    for option in ('client_id', 'client_secret', 'provider_url', 'api_url'):
+        if not getattr(args, option):
+            parser.error(f'--{option.replace("_", "-")} is required')
+    if args.duration is None and args.requests is None:
+        parser.error('one of --duration or --requests is required')
+
+    if args.insecure_transport:
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+    logging.basicConfig(level=logging.WARNING)
+    configure_django()
+    client = GetSmarterEnterpriseApiClient(
+        client_id=args.client_id,
+        client_secret=args.client_secret,
+        provider_url=args.provider_url,
+        api_url=args.api_url,
+        pool_maxsize=args.max_in_flight,
+    )
+    allocations = read_allocation_records(args.input, args.format) if args.input else synthetic_allocations()
+    load_generator = LoadGenerator(
+        client,
+        args.rate,
+        max_in_flight=args.max_in_flight,
+        cancel_ratio=args.cancel_ratio,
+        arrival=args.arrival,
+        seed=args.seed,
+    )
+    report = load_generator.run(allocations, duration=args.duration, count=args.requests)
+    print(json.dumps(report, indent=2))
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Helpers that keep the cost of logging allocations down.
+
+The cost stays independent of the allocation volume and response body size.
+"""
+import logging
+import logging.handlers
+import queue
+import random
+
+# Characters of a GEAG response body included in error logs.
+DEFAULT_MAX_LOGGED_BODY_LENGTH = 2000
+
+
+class LazyText:
+    """
+    Defer building a log argument until a record is actually emitted.
+
+    Log calls pass their arguments %-style, so the message is only
+    formatted when a handler emits the record; wrapping an expensive
+    argument in LazyText defers computing it too.
+    """
+
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        """
+        Initialize with the function, and its arguments, that produce the text.
+        """
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        """
+        Build the text.
+        """
+        return str(self.fn(*self.args))
+
+
+def truncate_body(text, max_length=DEFAULT_MAX_LOGGED_BODY_LENGTH):
+    """
+    Return text cut to max_length characters, noting how much was left out.
+    """
+    if max_length is None or len(text) <= max_length:
+        return text
+    return f'{text[:max_length]}... [{len(text) - max_length} more characters]'
+
+
+def lazy_response_body(response, max_length=DEFAULT_MAX_LOGGED_BODY_LENGTH):
+    """
+    Return a log argument for a response body, capped at max_length characters.
+
+    The body is only decoded if the record is emitted.
+    """
+    return LazyText(lambda: truncate_body(response.text, max_length))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through only a fraction of the records at each configured level.
+
+    Levels without a rate are not sampled. For example,
+    ``SamplingFilter({logging.INFO: 0.01})`` keeps 1% of INFO records and
+    every WARNING and ERROR. Add it to a handler rather than a logger, so
+    it also applies to records from child loggers.
+    """
+
+    def __init__(self, rates, name=''):
+        """
+        Initialize the filter.
+
+        Args:
+            rates: Dict of log level to the fraction (0 to 1) of its records
+                to keep.
+            name: Passed on to logging.Filter.
+        """
+        super().__init__(name)
+        self.rates = dict(rates)
+
+    def filter(self, record):
+        """
+        Return whether to keep the record, at random for sampled levels.
+        """
+        rate = self.rates.get(record.levelno)
+        if rate is None:
+            return True
+        return random.random() < rate
+
+
+def enable_queue_logging(logger_name='getsmarter_api_clients', handlers=None, maxsize=10000, sample_rates=None):
+    """
+    Send a logger's records through a queue, so log calls never block on I/O.
+
+    Records are put on a bounded queue by a QueueHandler and formatted and
+    written by the handlers on a QueueListener thread. When the queue is
+    full, records are dropped rather than blocking the caller. Because
+    formatting happens on the listener thread, log arguments must not be
+    mutated after the log call.
+
+    Args:
+        logger_name: Logger whose records are queued. It stops propagating
+            to its ancestors, so records are only written by the listener.
+        handlers: Handlers that write the queued records. Defaults to the
+            logger's own handlers, which are removed from it, or to the
+            root logger's handlers if it has none.
+        maxsize: Maximum number of records waiting to be written.
+        sample_rates: Optional dict of log level to the fraction of its
+            records to queue; see SamplingFilter.
+
+    Returns:
+        The started QueueListener. Call its ``stop`` method on shutdown to
+        flush the remaining records.
+    """
+    target_logger = logging.getLogger(logger_name)
+    if handlers is None:
+        handlers = list(target_logger.handlers) or list(logging.getLogger().handlers)
+    for handler in list(target_logger.handlers):
+        target_logger.removeHandler(handler)
+
+    record_queue = queue.Queue(maxsize=maxsize)
+    queue_handler = _NonBlockingQueueHandler(record_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+    target_logger.addHandler(queue_handler)
+    target_logger.propagate = False
+    listener = logging.handlers.QueueListener(record_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener.
+
+    Records are dropped when the queue is full.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
@@ -0,0 +1,255 @@
+"""
+In-memory request metrics with per-endpoint latency histograms.
+
+A request's time is broken down into phases, recorded as they happen on the
+thread sending the request:
+
+* ``token_cache_lookup``: checking the memoized token and the token cache.
+* ``token_fetch``: fetching a new token from the provider.
+* ``rate_limit_wait``: waiting for the client's rate limiter.
+* ``pool_acquire``: taking a connection from the connection pool.
+* ``connect``: opening a new connection (TCP and TLS).
+* ``ttfb``: sending the request and waiting for the response headers.
+* ``body_read``: reading the response body.
+
+The registry renders the Prometheus text exposition format, so it can be
+served from any HTTP endpoint and scraped.
+"""
+import bisect
+import contextlib
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_DURATION = 'getsmarter_api_client_request_duration_seconds'
+REQUEST_PHASE_DURATION = 'getsmarter_api_client_request_phase_duration_seconds'
+REQUESTS = 'getsmarter_api_client_requests_total'
+CONNECTIONS = 'getsmarter_api_client_connections_total'
+
+_HELP = {
+    REQUEST_DURATION: 'Time taken by client requests, including authentication and retries.',
+    REQUEST_PHASE_DURATION: 'Time taken by each phase of client requests.',
+    REQUESTS: 'Client requests by outcome.',
+    CONNECTIONS: 'Connections used by client requests, by whether they were new or reused.',
+}
+
+_local = threading.local()
+
+
+class RequestTimer:
+    """
+    Accumulate the phase timings of one request on the thread sending it.
+    """
+
+    __slots__ = ('phases', 'connections', 'last_send_duration', 'attempts')
+
+    def __init__(self):
+        """
+        Initialize an empty timer.
+        """
+        self.phases = defaultdict(float)
+        self.connections = []
+        self.last_send_duration = 0.0
+        self.attempts = 0
+
+    def add(self, phase, seconds):
+        """
+        Add seconds to the named phase.
+        """
+        self.phases[phase] += seconds
+
+
+def current_timer():
+    """
+    Return the RequestTimer of the request being sent on this thread, or None.
+    """
+    return getattr(_local, 'timer', None)
+
+
+@contextlib.contextmanager
+def timed_request():
+    """
+    Make a new RequestTimer current on this thread for the block.
+    """
+    previous = current_timer()
+    timer = _local.timer = RequestTimer()
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextlib.contextmanager
+def time_phase(phase):
+    """
+    Add the time spent in the block to the current request's phase.
+
+    Does nothing if no request is being timed.
+    """
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(phase, time.perf_counter() - start)
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram of observed values.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize an empty histogram with the given bucket upper bounds.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Record one value.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """
+        Return (cumulative bucket counts including +Inf, sum, count).
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+def _format_labels(labels, extra=()):
+    """
+    Return labels, and any extra ones, in the Prometheus text format.
+    """
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of labelled counters and histograms.
+
+    Share one registry between clients to aggregate their metrics.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize an empty registry whose histograms use the given buckets.
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, amount=1, **labels):
+        """
+        Add amount to the counter with the given name and labels.
+        """
+        with self._lock:
+            self._counters[self._key(name, labels)] += amount
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value in the histogram with the given name and labels.
+        """
+        key = self._key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def get_counter(self, name, **labels):
+        """
+        Return the value of a counter, 0 if it has not been incremented.
+        """
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def get_histogram(self, name, **labels):
+        """
+        Return a histogram, or None if nothing has been observed in it.
+        """
+        return self._histograms.get(self._key(name, labels))
+
+    def record_request(self, endpoint, timer, duration, outcome):
+        """
+        Record a timed request to an endpoint.
+
+        Args:
+            endpoint: The endpoint name, e.g. 'enterprise_allocations'.
+            timer: The request's RequestTimer.
+            duration: Total seconds the request took.
+            outcome: The response status code, or the exception class name.
+        """
+        self.observe(REQUEST_DURATION, duration, endpoint=endpoint)
+        for phase, seconds in timer.phases.items():
+            self.observe(REQUEST_PHASE_DURATION, seconds, endpoint=endpoint, phase=phase)
+        for state in timer.connections:
+            self.increment(CONNECTIONS, endpoint=endpoint, state=state)
+        self.increment(REQUESTS, endpoint=endpoint, outcome=str(outcome))
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+        lines = []
+        described = set()
+
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                if name in _HELP:
+                    lines.append(f'# HELP {name} {_HELP[name]}')
+                lines.append(f'# TYPE {name} {metric_type}')
+
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value:g}')
+
+        for (name, labels), histogram in histograms:
+            describe(name, 'histogram')
+            cumulative, total, count = histogram.snapshot()
+            bounds = [f'{bucket:g}' for bucket in histogram.buckets] + ['+Inf']
+            for bound, bucket_count in zip(bounds, cumulative):
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {bucket_count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total:g}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,257 @@
+"""
+Compact request models that serialize to GEAG's camelCase wire format.
+"""
+from operator import attrgetter
+
+
+def to_camel_case(name):
+    """
+    Return the camelCase form of a snake_case name.
+
+    For example, 'address_line1' becomes 'addressLine1'.
+    """
+    first, *rest = name.split('_')
+    return first + ''.join(part.capitalize() for part in rest)
+
+
+class WireModel:
+    """
+    Base class for request models whose fields are declared in ``__slots__``.
+
+    The snake_case to camelCase field mapping is built once per subclass into
+    a tuple of wire names and an attrgetter for the field values, so
+    serializing an instance is a single pass over its fields. Fields that
+    are None are left out of the payload.
+    """
+
+    __slots__ = ()
+
+    # Fields that are safe to include in logs, as snake_case attribute names.
+    log_fields = ()
+
+    # Set for each subclass: the camelCase names of ``__slots__``, in order,
+    # and the (attribute, wire name) pairs of ``log_fields``.
+    wire_names = ()
+    log_wire_fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Build the subclass's field mapping from its ``__slots__``.
+        """
+        super().__init_subclass__(**kwargs)
+        cls.field_mapping = {name: to_camel_case(name) for name in cls.__slots__}
+        cls.wire_names = tuple(cls.field_mapping.values())
+        cls.log_wire_fields = tuple((name, cls.field_mapping[name]) for name in cls.log_fields)
+        cls._field_values = staticmethod(attrgetter(*cls.__slots__))
+
+    @staticmethod
+    def _field_values(instance):
+        """
+        Return the values of instance's fields, in ``__slots__`` order.
+
+        Replaced for each subclass by an attrgetter of its ``__slots__``.
+        """
+        return tuple(getattr(instance, name) for name in instance.__slots__)
+
+    def to_payload(self):
+        """
+        Return the GEAG payload for this request, without fields that are None.
+        """
+        return {
+            wire_name: value
+            for wire_name, value in zip(self.wire_names, self._field_values(self))
+            if value is not None
+        }
+
+    def payload_for_logging(self):
+        """
+        Return the non-PII fields of the payload, with None for empty ones.
+        """
+        return {wire_name: getattr(self, name) for name, wire_name in self.log_wire_fields}
+
+    def __eq__(self, other):
+        """
+        Return whether other is a request of this type with the same values.
+        """
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._field_values(self) == other._field_values(other)
+
+    def __repr__(self):
+        """
+        Return the request's type and field values.
+        """
+        fields = ', '.join(f'{name}={value!r}' for name, value in zip(self.__slots__, self._field_values(self)))
+        return f'{self.__class__.__name__}({fields})'
+
+
+class AllocationRequest(WireModel):
+    """
+    An allocation (enrollment) request.
+
+    See GetSmarterEnterpriseApiClient.create_allocation for the fields.
+    """
+
+    __slots__ = (
+        'payment_reference',
+        'address_line1',
+        'city',
+        'postal_code',
+        'country',
+        'country_code',
+        'first_name',
+        'last_name',
+        'email',
+        'date_of_birth',
+        'terms_accepted_at',
+        'currency',
+        'order_items',
+        'address_line2',
+        'state',
+        'state_code',
+        'mobile_phone',
+        'work_experience',
+        'education_highest_level',
+    )
+    log_fields = (
+        'payment_reference',
+        'order_items',
+    )
+
+    def __init__(
+        self,
+        payment_reference,
+        address_line1,
+        city,
+        postal_code,
+        country,
+        country_code,
+        first_name,
+        last_name,
+        email,
+        date_of_birth,
+        terms_accepted_at,
+        currency,
+        order_items,
+        address_line2=None,
+        state=None,
+        state_code=None,
+        mobile_phone=None,
+        work_experience=None,
+        education_highest_level=None
+    ):
+        """
+        Initialize the request with its field values.
+        """
+        self.payment_reference = payment_reference
+        self.address_line1 = address_line1
+        self.city = city
+        self.postal_code = postal_code
+        self.country = country
+        self.country_code = country_code
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.date_of_birth = date_of_birth
+        self.terms_accepted_at = terms_accepted_at
+        self.currency = currency
+        self.order_items = order_items
+        # optional fields
+        self.address_line2 = address_line2
+        self.state = state
+        self.state_code = state_code
+        self.mobile_phone = mobile_phone
+        self.work_experience = work_experience
+        self.education_highest_level = education_highest_level
+
+
+class EnterpriseAllocationRequest(WireModel):
+    """
+    An enterprise allocation (enrollment) request.
+
+    See GetSmarterEnterpriseApiClient.create_enterprise_allocation for the
+    fields.
+    """
+
+    __slots__ = (
+        'payment_reference',
+        'enterprise_customer_uuid',
+        'first_name',
+        'last_name',
+        'email',
+        'date_of_birth',
+        'terms_accepted_at',
+        'data_share_consent',
+        'currency',
+        'order_items',
+        'address_line1',
+        'address_line2',
+        'city',
+        'postal_code',
+        'state',
+        'state_code',
+        'country',
+        'country_code',
+        'mobile_phone',
+        'work_experience',
+        'education_highest_level',
+        'org_id',
+    )
+    log_fields = (
+        'payment_reference',
+        'enterprise_customer_uuid',
+        'org_id',
+        'order_items',
+    )
+
+    def __init__(
+        self,
+        payment_reference,
+        enterprise_customer_uuid,
+        first_name,
+        last_name,
+        email,
+        date_of_birth,
+        terms_accepted_at,
+        data_share_consent,
+        currency,
+        order_items,
+        address_line1=None,
+        address_line2=None,
+        city=None,
+        postal_code=None,
+        state=None,
+        state_code=None,
+        country=None,
+        country_code=None,
+        mobile_phone=None,
+        work_experience=None,
+        education_highest_level=None,
+        org_id=None
+    ):
+        """
+        Initialize the request with its field values.
+        """
+        self.payment_reference = payment_reference
+        self.enterprise_customer_uuid = enterprise_customer_uuid
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.date_of_birth = date_of_birth
+        self.terms_accepted_at = terms_accepted_at
+        self.data_share_consent = data_share_consent
+        self.currency = currency
+        self.order_items = order_items
+        # optional fields
+        self.address_line1 = address_line1
+        self.address_line2 = address_line2
+        self.city = city
+        self.postal_code = postal_code
+        self.state = state
+        self.state_code = state_code
+        self.country = country
+        self.country_code = country_code
+        self.mobile_phone = mobile_phone
+        self.work_experience = work_experience
+        self.education_highest_level = education_highest_level
+        self.org_id = org_id
@@ -0,0 +1,56 @@
+"""
+Optional APM integration through edx_django_utils.monitoring.
+
+When a client is created with ``monitoring=True``, every call tags the
+current transaction with custom attributes, and token fetches and
+allocation calls appear as their own spans. edx_django_utils.monitoring is
+only imported once a monitored client makes a call.
+"""
+import functools
+
+ATTRIBUTE_PREFIX = 'geag'
+
+
+def set_request_attributes(endpoint, outcome, attempts, token_cache_hit, elapsed):
+    """
+    Tag the current transaction with the outcome of a call.
+
+    Args:
+        endpoint: The endpoint name, e.g. 'enterprise_allocations'.
+        outcome: The response status code, or the exception class name.
+        attempts: The number of attempts made, including retries.
+        token_cache_hit: Whether the access token was found without
+            fetching a new one.
+        elapsed: Seconds the call took.
+    """
+    # pylint: disable=import-outside-toplevel
+    from edx_django_utils.monitoring import accumulate, set_custom_attribute
+
+    elapsed_ms = round(elapsed * 1000, 1)
+    set_custom_attribute(f'{ATTRIBUTE_PREFIX}.endpoint', endpoint)
+    set_custom_attribute(f'{ATTRIBUTE_PREFIX}.status', outcome)
+    set_custom_attribute(f'{ATTRIBUTE_PREFIX}.attempts', attempts)
+    set_custom_attribute(f'{ATTRIBUTE_PREFIX}.token_cache', 'hit' if token_cache_hit else 'miss')
+    set_custom_attribute(f'{ATTRIBUTE_PREFIX}.elapsed_ms', elapsed_ms)
+    # A transaction can make several calls; the accumulated totals cover all
+    # of them.
+    accumulate(f'{ATTRIBUTE_PREFIX}.calls', 1)
+    accumulate(f'{ATTRIBUTE_PREFIX}.elapsed_ms_total', elapsed_ms)
+
+
+def traced(function_name):
+    """
+    Decorate a client method to run in its own span.
+
+    The span is only created when the client has monitoring enabled.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.monitoring:
+                return method(self, *args, **kwargs)
+            from edx_django_utils.monitoring import function_trace  # pylint: disable=import-outside-toplevel
+            with function_trace(function_name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
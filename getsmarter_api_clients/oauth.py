@@ -5,17 +5,161 @@ Base API client that handles authentication.
 
 import datetime
 import logging
+import threading
+import time
+import uuid
 
 import pytz
 import requests
-from edx_django_utils.cache import TieredCache
 from oauthlib.oauth2 import BackendApplicationClient
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
 from requests_oauthlib import OAuth2Session
 
+from getsmarter_api_clients.adapters import PooledHTTPAdapter
+from getsmarter_api_clients.metrics import current_timer, time_phase, timed_request
+from getsmarter_api_clients.monitoring import set_request_attributes, traced
+from getsmarter_api_clients.retry import IDEMPOTENT_METHODS
+from getsmarter_api_clients.singleflight import SingleFlight
+from getsmarter_api_clients.token_cache import TieredTokenCache
+
 logger = logging.getLogger(__name__)
 
+# Token fetches are coalesced per cache key across every client in the process.
+_token_fetches = SingleFlight()
+
+# Seconds before the provider's expiry at which a token is treated as expired,
+# to absorb clock skew and in-flight request time.
+DEFAULT_TOKEN_EXPIRY_MARGIN = 10
+
+# Seconds between checks for a token fetched by the process holding the
+# fetch lease.
+TOKEN_FETCH_LEASE_POLL_INTERVAL = 0.05
+
+# Minimum seconds between background refreshes of the same client's token, so
+# a failing token endpoint is not retried on every request.
+TOKEN_REFRESH_RETRY_INTERVAL = 30
+
 
-class OAuthApiClient(requests.Session):
+class AccessTokenCacheMixin:
+    """
+    Access token caching shared by the sync and async API clients.
+
+    Expects the including class to set ``oauth_client_id``, ``token_cache``,
+    ``refresh_ahead_fraction``, ``token_expiry_margin`` and ``_token_memo``.
+    """
+
+    @property
+    def access_token_cache_key(self):
+        """
+        Return the cache key for the access token.
+        """
+        return 'get_smarter_api_client.access_token_response.{}'.format(self.oauth_client_id)
+
+    @property
+    def access_token_lease_cache_key(self):
+        """
+        Return the cache key of the cross-process lease on fetching a token.
+        """
+        return '{}.lease'.format(self.access_token_cache_key)
+
+    def _get_cached_token_response(self):
+        """
+        Return the cached token response, or None if nothing is cached.
+
+        A process-local cache tier can hold an older copy than the shared
+        one (for example the request cache in long-lived worker threads), so
+        a copy that is expired or due for refresh is looked past once.
+        """
+        token_response = self.token_cache.get(self.access_token_cache_key)
+        if token_response is None:
+            return None
+
+        if self._is_expired(token_response) or self._is_due_for_refresh(token_response):
+            token_response = self.token_cache.get_shared(self.access_token_cache_key)
+        return token_response
+
+    def _is_expired(self, token_response):
+        """
+        Return True if the token response has expired, allowing for margin.
+        """
+        return datetime.datetime.now(pytz.utc).timestamp() >= token_response['expires_at'] - self.token_expiry_margin
+
+    def _is_due_for_refresh(self, token_response):
+        """
+        Return True if refresh-ahead is enabled and the token is due.
+        """
+        refresh_at = self._get_refresh_at(token_response)
+        return refresh_at is not None and datetime.datetime.now(pytz.utc).timestamp() >= refresh_at
+
+    def _get_refresh_at(self, token_response):
+        """
+        Return the timestamp at which the token is due for refresh.
+
+        Returns None if refresh-ahead is disabled.
+        """
+        if self.refresh_ahead_fraction is None:
+            return None
+        return token_response['expires_at'] - token_response['expires_in'] * (1 - self.refresh_ahead_fraction)
+
+    def _remember_token(self, token_response, next_refresh_attempt_at=None):
+        """
+        Keep a local copy of the token, with its expiry on the monotonic clock.
+
+        Args:
+            token_response: The token response from the provider or cache.
+            next_refresh_attempt_at: Optional monotonic time of the next
+                refresh attempt for a token that is already due for refresh.
+                The copy is used until then instead of the token's own refresh
+                point, which has already passed.
+        """
+        now = time.monotonic()
+        wall_now = datetime.datetime.now(pytz.utc).timestamp()
+        expires_at = now + token_response['expires_at'] - self.token_expiry_margin - wall_now
+        refresh_at = next_refresh_attempt_at
+        if refresh_at is None:
+            refresh_at = self._get_refresh_at(token_response)
+            if refresh_at is not None:
+                refresh_at = now + refresh_at - wall_now
+        self._token_memo = (token_response['access_token'], expires_at, refresh_at)
+
+    def _get_memoized_access_token(self):
+        """
+        Return the local access token if it is neither expired nor due.
+        """
+        memo = self._token_memo
+        if memo is None:
+            return None
+        access_token, expires_at, refresh_at = memo
+        now = time.monotonic()
+        if now >= expires_at or (refresh_at is not None and now >= refresh_at):
+            return None
+        return access_token
+
+
+class BearerAuth(requests.auth.AuthBase):
+    """
+    Authenticate each request with the client's current access token.
+
+    The Authorization header is set on the prepared request rather than on
+    the session, so threads sharing a client never see each other's headers.
+    """
+
+    def __init__(self, client):
+        """
+        Initialize the auth for a client.
+        """
+        self.client = client
+
+    def __call__(self, request):
+        """
+        Set the Authorization header of a prepared request.
+        """
+        access_token = self.client._get_access_token()
+        request.headers['Authorization'] = 'Bearer ' + access_token
+        return request
+
+
+class OAuthApiClient(AccessTokenCacheMixin, requests.Session):
     """
     Base API client that authenticates using the provided client credentials.
     """
@@ -26,46 +170,246 @@ class OAuthApiClient(requests.Session):
         client_secret,
         provider_url,
         api_url,
+        refresh_ahead_fraction=None,
+        token_expiry_margin=DEFAULT_TOKEN_EXPIRY_MARGIN,
+        token_fetch_lease_timeout=None,
+        token_fetch_lease_wait=5,
+        pool_connections=DEFAULT_POOLSIZE,
+        pool_maxsize=DEFAULT_POOLSIZE,
+        pool_block=DEFAULT_POOLBLOCK,
+        keep_alive=True,
+        retry_policy=None,
+        rate_limiter=None,
+        metrics=None,
+        monitoring=False,
+        token_cache=None,
+        adapter=None,
         **kwargs
     ):
         """
         Initialize an instance of the OAuthApiClient.
+
+        Args:
+            client_id: OAuth client ID.
+            client_secret: OAuth client secret.
+            provider_url: Base URL of the OAuth provider.
+            api_url: Base URL of the API.
+            refresh_ahead_fraction: Optional fraction of the token lifetime
+                (between 0 and 1) after which the token is renewed in the
+                background while the current one keeps being used. Disabled
+                by default.
+            token_expiry_margin: Seconds before the provider's expiry at
+                which a token is no longer used.
+            token_fetch_lease_timeout: Optional number of seconds a process
+                may hold the cross-process lease on fetching a new token. When
+                set, only the process that wins the lease (an atomic add on the
+                token cache) calls the provider; the others poll the cache for
+                its token. Disabled by default.
+            token_fetch_lease_wait: Maximum seconds a process that lost the
+                lease polls for the winner's token before fetching its own.
+            pool_connections: Number of hosts to keep connection pools for.
+            pool_maxsize: Maximum number of connections kept open per host.
+                Set it to at least the number of threads sharing the client,
+                or connections will be discarded after use.
+            pool_block: Whether to wait for a free connection when all
+                pool_maxsize connections are busy, instead of opening an
+                extra one that is discarded afterwards.
+            keep_alive: Whether to reuse connections between requests. When
+                False, every request asks the server to close the connection.
+            retry_policy: Optional RetryPolicy for transient failures.
+                Requests are sent once when it is omitted.
+            rate_limiter: Optional RateLimiter that every request, including
+                each retry, takes capacity from before it is sent.
+            metrics: Optional MetricsRegistry that records the duration of
+                every request, broken down into phases (token lookup and
+                fetch, pool acquisition, connection setup, time to first byte
+                and body read), per endpoint.
+            monitoring: Whether to report every request to the APM backends
+                configured for edx_django_utils.monitoring, as custom
+                attributes on the current transaction, and to trace token
+                fetches as their own spans. Disabled by default.
+            token_cache: Optional TokenCache backend to store the access
+                token in. Defaults to a TieredTokenCache, which shares it
+                through the Django cache; use an InMemoryTokenCache or
+                FileTokenCache outside Django.
+            adapter: Optional PooledHTTPAdapter to send requests through,
+                for example one shared with other clients. The pool_*
+                arguments are ignored when it is given.
         """
         super().__init__(**kwargs)
 
+        if refresh_ahead_fraction is not None and not 0 < refresh_ahead_fraction < 1:
+            raise ValueError('refresh_ahead_fraction must be between 0 and 1.')
+
         self.oauth_client_id = client_id
         self.oauth_client_secret = client_secret
         self.oauth_provider_url = provider_url
         self.api_url = api_url
+        self.refresh_ahead_fraction = refresh_ahead_fraction
+        self.token_expiry_margin = token_expiry_margin
+        self.token_fetch_lease_timeout = token_fetch_lease_timeout
+        self.token_fetch_lease_wait = token_fetch_lease_wait
+        # GetSmarter blocks the python-requests user agent for certain
+        # requests.
+        self.headers['User-Agent'] = 'Mozilla/5.0'
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
 
-    @property
-    def access_token_cache_key(self):
-        """
-        Return the cache key for the access token.
-        """
-        return 'get_smarter_api_client.access_token_response.{}'.format(self.oauth_client_id)
+        if adapter is None:
+            adapter = PooledHTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+            )
+        self.adapter = adapter
+        self.mount('https://', self.adapter)
+        self.mount('http://', self.adapter)
+
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.monitoring = monitoring
+        self.token_cache = token_cache if token_cache is not None else TieredTokenCache()
+        self.auth = BearerAuth(self)
+
+        # (access_token, expires_at, refresh_at) measured on the monotonic
+        # clock, so the shared cache tiers are only consulted when the local
+        # copy runs out.
+        self._token_memo = None
+        # Monotonic time before which no background refresh is started.
+        self._next_refresh_attempt_at = 0
+        self._refresh_lock = threading.Lock()
 
     def _get_cached_access_token(self):
         """
         Return the cached access token if it is not expired.
+
+        When the token is due for refresh, a background renewal is started and
+        the still-valid token is returned without waiting for it. It is kept
+        locally until the next refresh attempt, so a failing refresh does not
+        send every request back to the cache.
+        """
+        token_response = self._get_cached_token_response()
+        if token_response is None or self._is_expired(token_response):
+            return None
+
+        if self._is_due_for_refresh(token_response):
+            self._schedule_access_token_refresh(token_response)
+        else:
+            self._remember_token(token_response)
+        return token_response['access_token']
+
+    def _schedule_access_token_refresh(self, token_response):
+        """
+        Renew the access token in a background thread unless already fetching.
+
+        At most one refresh is started every TOKEN_REFRESH_RETRY_INTERVAL
+        seconds, so a failed refresh is retried after that interval rather
+        than on the next request. Until then the current token is kept
+        locally, before the refresh can replace it.
         """
-        cached_response = TieredCache.get_cached_response(self.access_token_cache_key)
-        if cached_response.is_found:
-            cached_value = cached_response.value
-            expires_at = cached_value['expires_at']
-            if datetime.datetime.now(pytz.utc).timestamp() < expires_at:
-                return cached_value['access_token']
+        with self._refresh_lock:
+            now = time.monotonic()
+            start = now >= self._next_refresh_attempt_at and not _token_fetches.in_flight(self.access_token_cache_key)
+            if start:
+                self._next_refresh_attempt_at = now + TOKEN_REFRESH_RETRY_INTERVAL
+            self._remember_token(token_response, self._next_refresh_attempt_at)
+        if not start:
+            return
+        thread = threading.Thread(
+            target=self._refresh_access_token,
+            name=f'{self.__class__.__name__}-token-refresh',
+            daemon=True,
+        )
+        thread.start()
 
-        return None
+    def _refresh_access_token(self):
+        """
+        Fetch a replacement for a token that is due for refresh.
+        """
+        return _token_fetches.do(self.access_token_cache_key, self._fetch_access_token, refresh=True)
 
     def _get_access_token(self):
         """
         Return the access token required for making calls.
         """
-        cached_token = self._get_cached_access_token()
-        if cached_token:
-            return cached_token
+        with time_phase('token_cache_lookup'):
+            token = self._get_memoized_access_token() or self._get_cached_access_token()
+        if token:
+            return token
+
+        with time_phase('token_fetch'):
+            return _token_fetches.do(self.access_token_cache_key, self._fetch_access_token)
+
+    def _fetch_access_token(self, refresh=False):
+        """
+        Fetch a new access token from the provider and cache it.
 
+        Only one thread per cache key runs this at a time; the others wait for
+        its result in _get_access_token.
+
+        Args:
+            refresh: Whether this is a refresh-ahead renewal, in which case a
+                cached token that is still due for refresh is replaced.
+        """
+        # Another flight may have cached a token after our caller's cache miss.
+        token_response = self._get_cached_token_response()
+        if token_response is not None and not self._is_expired(token_response):
+            if not (refresh and self._is_due_for_refresh(token_response)):
+                return token_response['access_token']
+
+        if self.token_fetch_lease_timeout is None:
+            return self._request_access_token()
+
+        lease_owner = uuid.uuid4().hex
+        if self.token_cache.add(self.access_token_lease_cache_key, lease_owner, self.token_fetch_lease_timeout):
+            try:
+                return self._request_access_token()
+            finally:
+                self._release_lease(lease_owner)
+
+        if refresh and token_response is not None and not self._is_expired(token_response):
+            # Another process is already renewing a token that is still valid.
+            return token_response['access_token']
+        return self._wait_for_leased_access_token() or self._request_access_token()
+
+    def _release_lease(self, lease_owner):
+        """
+        Delete the token fetch lease if it is still held by lease_owner.
+
+        A fetch that outlives token_fetch_lease_timeout loses its lease, which
+        another process may then take; that process's lease is left alone.
+        """
+        if self.token_cache.get_shared(self.access_token_lease_cache_key) == lease_owner:
+            self.token_cache.delete(self.access_token_lease_cache_key)
+
+    def _wait_for_leased_access_token(self):
+        """
+        Poll the cache for the token fetched by the process holding the lease.
+
+        Returns:
+            The new access token, or None if it did not appear before the
+            lease was released or token_fetch_lease_wait elapsed.
+        """
+        deadline = time.monotonic() + self.token_fetch_lease_wait
+        while True:
+            time.sleep(TOKEN_FETCH_LEASE_POLL_INTERVAL)
+            # Check the lease before the token: the holder caches its token
+            # before releasing the lease, so a released lease means the token
+            # lookup below already sees whatever the holder fetched.
+            lease_held = self.token_cache.get_shared(self.access_token_lease_cache_key) is not None
+            token_response = self._get_cached_token_response()
+            if token_response is not None and not self._is_expired(token_response):
+                self._remember_token(token_response)
+                return token_response['access_token']
+            if not lease_held or time.monotonic() >= deadline:
+                return None
+
+    @traced('getsmarter_api_clients.fetch_access_token')
+    def _request_access_token(self):
+        """
+        Request a new access token and store it in every cache tier.
+        """
         try:
             client = BackendApplicationClient(client_id=self.oauth_client_id)
             oauth = OAuth2Session(client=client)
@@ -73,29 +417,165 @@ class OAuthApiClient(requests.Session):
                 token_url=f'{self.oauth_provider_url}/oauth2/token',
                 client_secret=self.oauth_client_secret
             )
-            TieredCache.set_all_tiers(self.access_token_cache_key, token_response, token_response['expires_in'])
+            self.token_cache.set(self.access_token_cache_key, token_response, token_response['expires_in'])
+            self._remember_token(token_response)
             return token_response['access_token']
         except Exception as ex:  # pylint: disable=broad-except
             logger.exception(ex)
             return None
 
-    def _ensure_authentication(self):
+    def get_endpoint(self, url):
+        """
+        Return the endpoint name for a URL.
+
+        For example 'enterprise_allocations/cancel'.
+
+        URLs outside api_url are named by their full path.
         """
-        Add the required headers for authentication.
+        path = url.split('?', 1)[0]
+        if path.startswith(self.api_url):
+            path = path[len(self.api_url):]
+        return path.strip('/')
+
+    @property
+    def pool_stats(self):
         """
-        headers = {
-            'User-Agent': 'Mozilla/5.0',  # GetSmarter blocks the python-requests user agent for certain requests
-            'Authorization': 'Bearer ' + self._get_access_token(),
-        }
-        self.headers.update(headers)
+        Return this client's created, reused and discarded pool connections.
+        """
+        return self.adapter.pool_stats.snapshot()
 
-    def request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
+    def request(self, method, url, idempotency_key=None, **kwargs):  # pylint: disable=arguments-differ
         """
-        Override Session.request to ensure that the session is authenticated.
+        Override Session.request to add retries and instrumentation.
+
+        The request is authenticated by the client's BearerAuth when it is
+        prepared, so the session itself is never modified.
+
+        When the client has a retry_policy, transient failures are retried.
+        Non-idempotent methods are only retried when an idempotency_key
+        (such as an allocation's payment reference) is given, and then only
+        on failures that mean the request was not processed (see
+        RetryPolicy).
 
         Note: Typically, users of the client won't call this directly, but will
         instead use Session.get or Session.post.
 
         """
-        self._ensure_authentication()
-        return super().request(method, url, **kwargs)
+        if self.metrics is None and not self.monitoring:
+            return self._send_request(method, url, idempotency_key, **kwargs)
+
+        with timed_request() as timer:
+            start = time.perf_counter()
+            outcome = None
+            try:
+                response = self._send_request(method, url, idempotency_key, **kwargs)
+                outcome = response.status_code
+                return response
+            except Exception as ex:
+                outcome = ex.__class__.__name__
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                endpoint = self.get_endpoint(url)
+                if self.metrics is not None:
+                    self.metrics.record_request(endpoint, timer, duration, outcome)
+                if self.monitoring:
+                    set_request_attributes(
+                        endpoint, outcome, timer.attempts, 'token_fetch' not in timer.phases, duration
+                    )
+
+    def _send_request(self, method, url, idempotency_key=None, **kwargs):
+        """
+        Send the request, with retries if the client has a retry_policy.
+        """
+        if self.retry_policy is None:
+            return super().request(method, url, **kwargs)
+        return self._request_with_retries(method, url, idempotency_key, **kwargs)
+
+    def send(self, request, **kwargs):
+        """
+        Override Session.send to wait for the endpoint's rate limit, if any.
+        """
+        if self.rate_limiter is not None:
+            with time_phase('rate_limit_wait'):
+                self.rate_limiter.acquire(self.get_endpoint(request.url))
+        return self._send_attempt(request, **kwargs)
+
+    def _send_attempt(self, request, **kwargs):
+        """
+        Send one attempt of a request that has passed the rate limiter.
+
+        The body read is timed when the request is being timed.
+        """
+        timer = current_timer()
+        if timer is None:
+            return super().send(request, **kwargs)
+        timer.attempts += 1
+
+        # Session.send reads the body (unless streaming) after the adapter has
+        # returned with the response headers.
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        timer.add('body_read', time.perf_counter() - start - timer.last_send_duration)
+        return response
+
+    def _request_with_retries(
+        self,
+        method,
+        url,
+        idempotency_key,
+        timeout=None,
+        allow_redirects=True,
+        proxies=None,
+        stream=None,
+        verify=None,
+        cert=None,
+        **request_kwargs
+    ):
+        """
+        Send a request according to the retry policy.
+
+        The request is prepared once, so every attempt sends the body that
+        was serialized for the first.
+        """
+        policy = self.retry_policy
+        prepared_request = self.prepare_request(requests.Request(method=method.upper(), url=url, **request_kwargs))
+        send_kwargs = {'timeout': timeout, 'allow_redirects': allow_redirects}
+        send_kwargs.update(self.merge_environment_settings(prepared_request.url, proxies or {}, stream, verify, cert))
+
+        retries_allowed = policy.allows_retries(method, idempotency_key)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        deadline = time.monotonic() + policy.max_total_time
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            try:
+                response = self.send(prepared_request, **send_kwargs)
+            except Exception as ex:  # pylint: disable=broad-except
+                if not (retries_allowed and policy.is_retryable_exception(ex, idempotent)):
+                    raise
+                outcome = ex
+                delay = policy.get_delay(attempt)
+            else:
+                response.attempts = attempt
+                if not (retries_allowed and policy.is_retryable_status(response.status_code, response, idempotent)):
+                    return response
+                outcome = response.status_code
+                delay = policy.get_delay(attempt, response)
+
+            if attempt >= policy.max_attempts or time.monotonic() + delay > deadline:
+                if response is None:
+                    raise outcome
+                return response
+
+            logger.warning(
+                'Retrying %s %s (key %s) in %.2fs after attempt %d: %s',
+                method.upper(), url, idempotency_key, delay, attempt, outcome,
+            )
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+            # The token may have been renewed while we waited.
+            prepared_request.prepare_auth(self.auth)
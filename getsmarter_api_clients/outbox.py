@@ -0,0 +1,428 @@
+"""
+Durable outbox for allocation and cancellation requests.
+
+Calls are written to a local SQLite journal and returned from immediately;
+a sender drains the journal to GEAG in batches, retrying transient failures
+with backoff. A GEAG outage therefore delays requests instead of losing
+them, and the caller's request path only pays for a local write.
+
+Each entry is deduplicated on its payment reference (allocations) or order
+UUID (cancellations), so enqueueing the same order twice sends it once.
+Entries that were sent are kept for ``sent_retention`` seconds so late
+duplicates are still recognised. Entries that were given up on are sent
+again if the same order is enqueued again, or after ``requeue_failed``.
+
+Usage::
+
+    outbox = AllocationOutbox(client, '/var/lib/app/geag-outbox.sqlite3')
+    outbox.start()
+    outbox.create_enterprise_allocation(**allocation)
+    ...
+    outbox.stop()
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import HTTPError, RequestException
+
+from getsmarter_api_clients.geag import DEFAULT_BULK_MAX_WORKERS
+from getsmarter_api_clients.models import AllocationRequest, EnterpriseAllocationRequest
+from getsmarter_api_clients.retry import RetryPolicy
+from getsmarter_api_clients.validation import ALLOCATION_VALIDATOR, ENTERPRISE_ALLOCATION_VALIDATOR
+
+logger = logging.getLogger(__name__)
+
+ALLOCATION = 'allocation'
+ENTERPRISE_ALLOCATION = 'enterprise_allocation'
+CANCELLATION = 'cancellation'
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+# Seconds an entry claimed by a sender is hidden from other senders. If the
+# sender dies mid-batch, its entries become due again after this long.
+DEFAULT_CLAIM_TIMEOUT = 300
+
+DEFAULT_SENT_RETENTION = 7 * 24 * 60 * 60
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (operation, dedupe_key)
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt_at);
+'''
+
+
+class OutboxEntry(namedtuple('OutboxEntry', [
+    'id', 'operation', 'dedupe_key', 'payload', 'state', 'attempts', 'next_attempt_at', 'last_error',
+])):
+    """
+    One journaled request.
+
+    ``payload`` holds the keyword arguments of the client call.
+    """
+
+    __slots__ = ()
+
+
+_ENTRY_COLUMNS = ', '.join(OutboxEntry._fields)
+
+# Keys of the send_batch results, by the state an entry was left in.
+_RESULT_KEYS = {SENT: 'sent', PENDING: 'retrying', FAILED: 'failed'}
+
+
+def _to_entry(row):
+    return OutboxEntry(*row[:3], json.loads(row[3]), *row[4:])
+
+
+def _is_retryable(error, retry_policy):
+    """
+    Return True if a request that failed with error may succeed if sent again.
+
+    Failures before a response was received (connection errors, an open
+    circuit breaker, a client-side rate limit) and retryable or 5xx
+    statuses are transient; other HTTP errors and exceptions are not.
+    """
+    if isinstance(error, HTTPError):
+        status_code = error.response.status_code if error.response is not None else None
+        return status_code is None or status_code >= 500 or retry_policy.is_retryable_status(status_code)
+    return isinstance(error, RequestException)
+
+
+class AllocationOutbox:
+    """
+    SQLite-backed outbox of allocations and cancellations.
+
+    Journaled requests are sent through a client in the background.
+    """
+
+    def __init__(
+        self,
+        client,
+        path,
+        batch_size=50,
+        max_workers=DEFAULT_BULK_MAX_WORKERS,
+        retry_policy=None,
+        poll_interval=1.0,
+        claim_timeout=DEFAULT_CLAIM_TIMEOUT,
+        sent_retention=DEFAULT_SENT_RETENTION,
+    ):
+        """
+        Initialize the outbox, creating the journal if needed.
+
+        Args:
+            client: The GetSmarterEnterpriseApiClient to send requests with.
+            path: Path of the SQLite journal. Several processes may share it.
+            batch_size: Maximum number of entries sent per batch.
+            max_workers: Maximum number of requests of a batch in flight.
+            retry_policy: RetryPolicy deciding how often, and after what
+                delay, a transiently failed entry is sent again. Its
+                ``max_attempts`` counts across batches; ``max_total_time``
+                is not used. Defaults to 10 attempts with backoff of up to
+                5 minutes.
+            poll_interval: Seconds the background sender waits between
+                checks for due entries when it has not been woken by a new one.
+            claim_timeout: Seconds entries taken by a sender are hidden from
+                other senders sharing the journal.
+            sent_retention: Seconds sent entries are kept for deduplication.
+        """
+        self.client = client
+        self.path = path
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=10, backoff_base=1, backoff_max=300)
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.sent_retention = sent_retention
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _transaction(self, fn):
+        """
+        Call fn with the connection inside an immediate transaction.
+
+        The transaction is write-locked from the start. Returns fn's result.
+        """
+        with self._lock:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(connection)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            return result
+
+    def _enqueue(self, operation, dedupe_key, payload):
+        """
+        Journal a request unless one with the same key is pending or sent.
+        """
+        now = time.time()
+        # A failed entry for the same order is replaced by the new request.
+        inserted = self._transaction(lambda connection: connection.execute(
+            'INSERT INTO outbox '
+            '(operation, dedupe_key, payload, state, next_attempt_at, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (operation, dedupe_key) DO UPDATE SET '
+            'payload = excluded.payload, state = excluded.state, attempts = 0, '
+            'next_attempt_at = excluded.next_attempt_at, last_error = NULL, updated_at = excluded.updated_at '
+            'WHERE state = ?',
+            (operation, dedupe_key, json.dumps(payload), PENDING, now, now, now, FAILED),
+        ).rowcount)
+        if not inserted:
+            logger.info('[outbox] Ignoring duplicate %s %s', operation, dedupe_key)
+            return False
+        self._wakeup.set()
+        return True
+
+    def create_allocation(self, payment_reference, *args, **kwargs):
+        """
+        Journal an allocation to be sent with ``create_allocation``.
+
+        Takes the same parameters. Invalid allocations raise
+        AllocationValidationError and are not journaled, if the client
+        validates allocations.
+
+        Returns:
+            True if the allocation was journaled, False if one with the same
+            payment reference is already pending or was sent.
+        """
+        allocation_request = AllocationRequest(payment_reference, *args, **kwargs)
+        if self.client.validate_allocations:
+            ALLOCATION_VALIDATOR.check(allocation_request)
+        payload = {field: getattr(allocation_request, field) for field in AllocationRequest.__slots__}
+        return self._enqueue(ALLOCATION, payment_reference, payload)
+
+    def create_enterprise_allocation(self, payment_reference, *args, **kwargs):
+        """
+        Journal an allocation to be sent with ``create_enterprise_allocation``.
+
+        Takes the same parameters, except should_raise. See create_allocation.
+        """
+        allocation_request = EnterpriseAllocationRequest(payment_reference, *args, **kwargs)
+        if self.client.validate_allocations:
+            ENTERPRISE_ALLOCATION_VALIDATOR.check(allocation_request)
+        payload = {field: getattr(allocation_request, field) for field in EnterpriseAllocationRequest.__slots__}
+        return self._enqueue(ENTERPRISE_ALLOCATION, payment_reference, payload)
+
+    def cancel_enterprise_allocation(self, order_uuid):
+        """
+        Journal a cancellation to send with ``cancel_enterprise_allocation``.
+
+        Returns:
+            True if the cancellation was journaled, False if one for the same
+            order is already pending or was sent.
+        """
+        return self._enqueue(CANCELLATION, str(order_uuid), {'order_uuid': str(order_uuid)})
+
+    def _claim_due_entries(self):
+        """
+        Take up to batch_size due entries.
+
+        They are hidden from other senders for claim_timeout seconds.
+        """
+        now = time.time()
+
+        def claim(connection):
+            rows = connection.execute(
+                f'SELECT {_ENTRY_COLUMNS} FROM outbox WHERE state = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?',
+                (PENDING, now, self.batch_size),
+            ).fetchall()
+            connection.executemany(
+                'UPDATE outbox SET next_attempt_at = ?, updated_at = ? WHERE id = ?',
+                [(now + self.claim_timeout, now, row[0]) for row in rows],
+            )
+            return rows
+
+        return [_to_entry(row) for row in self._transaction(claim)]
+
+    def _send(self, entry):
+        """
+        Send one entry and return the error raised, or None if it succeeded.
+        """
+        try:
+            if entry.operation == CANCELLATION:
+                self.client.cancel_enterprise_allocation(entry.payload['order_uuid'], should_raise=True)
+            elif entry.operation == ENTERPRISE_ALLOCATION:
+                self.client.create_enterprise_allocation(**entry.payload, should_raise=True)
+            else:
+                # create_allocation always raises on error responses.
+                self.client.create_allocation(**entry.payload)
+        except Exception as ex:  # pylint: disable=broad-except
+            return ex
+        return None
+
+    def _record_result(self, entry, error):
+        """
+        Record an attempt's outcome, scheduling a retry if it can be retried.
+        """
+        now = time.time()
+        attempts = entry.attempts + 1
+        if error is None:
+            state, next_attempt_at = SENT, now
+        elif _is_retryable(error, self.retry_policy) and attempts < self.retry_policy.max_attempts:
+            state = PENDING
+            next_attempt_at = now + self.retry_policy.get_delay(attempts, getattr(error, 'response', None))
+        else:
+            state, next_attempt_at = FAILED, now
+            logger.error(
+                '[outbox] Giving up on %s %s after %d attempts: %s',
+                entry.operation, entry.dedupe_key, attempts, error,
+                extra={'order_uuid' if entry.operation == CANCELLATION else 'payment_reference': entry.dedupe_key},
+            )
+        self._transaction(lambda connection: connection.execute(
+            'UPDATE outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? '
+            'WHERE id = ?',
+            (state, attempts, next_attempt_at, None if error is None else repr(error), now, entry.id),
+        ))
+        return state
+
+    def send_batch(self):
+        """
+        Send one batch of due entries.
+
+        Returns:
+            A dict of the number of entries sent, rescheduled for another
+            attempt, and failed permanently.
+        """
+        entries = self._claim_due_entries()
+        results = {'sent': 0, 'retrying': 0, 'failed': 0}
+        if not entries:
+            return results
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='geag-outbox') as executor:
+            errors = list(executor.map(self._send, entries))
+        for entry, error in zip(entries, errors):
+            results[_RESULT_KEYS[self._record_result(entry, error)]] += 1
+        return results
+
+    def drain(self):
+        """
+        Send batches until no entry is due, then purge expired sent entries.
+
+        Returns:
+            The totals of send_batch over every batch sent.
+        """
+        totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+        while not self._stopping.is_set():
+            batch = self.send_batch()
+            for key, count in batch.items():
+                totals[key] += count
+            if sum(batch.values()) < self.batch_size:
+                break
+        self.purge_sent()
+        return totals
+
+    def purge_sent(self):
+        """
+        Delete sent entries older than sent_retention seconds.
+        """
+        cutoff = time.time() - self.sent_retention
+        self._transaction(lambda connection: connection.execute(
+            'DELETE FROM outbox WHERE state = ? AND updated_at < ?', (SENT, cutoff),
+        ))
+
+    def counts(self):
+        """
+        Return the number of entries in each state.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT state, COUNT(*) FROM outbox GROUP BY state').fetchall()
+        return {PENDING: 0, SENT: 0, FAILED: 0, **dict(rows)}
+
+    def failed_entries(self):
+        """
+        Return the entries that were given up on, oldest first.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {_ENTRY_COLUMNS} FROM outbox WHERE state = ? ORDER BY id', (FAILED,),
+            ).fetchall()
+        return [_to_entry(row) for row in rows]
+
+    def requeue_failed(self, dedupe_keys=None):
+        """
+        Make given-up entries due again, with a fresh attempt count.
+
+        Args:
+            dedupe_keys: Optional payment references and order UUIDs of the
+                entries to requeue. Every failed entry is requeued if omitted.
+
+        Returns:
+            The number of entries requeued.
+        """
+        now = time.time()
+        query = 'UPDATE outbox SET state = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE state = ?'
+        params = [PENDING, now, now, FAILED]
+        if dedupe_keys is not None:
+            dedupe_keys = [str(dedupe_key) for dedupe_key in dedupe_keys]
+            query += f' AND dedupe_key IN ({", ".join("?" * len(dedupe_keys))})'
+            params.extend(dedupe_keys)
+        requeued = self._transaction(lambda connection: connection.execute(query, params).rowcount)
+        if requeued:
+            self._wakeup.set()
+        return requeued
+
+    def _run(self):
+        """
+        Drain the outbox until stopped, waking up every poll_interval.
+        """
+        while not self._stopping.is_set():
+            try:
+                self.drain()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('[outbox] Sending failed')
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """
+        Start sending journaled entries from a background thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='geag-outbox', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the background sender after its current batch.
+
+        Unsent entries stay in the journal.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self):
+        """
+        Stop the background sender and close the journal.
+        """
+        self.stop()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,191 @@
+"""
+Client-side rate limiters for GEAG endpoints.
+
+They keep the requests to each endpoint under a set rate.
+"""
+import threading
+import time
+
+import requests
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """
+    Raised instead of sending a request when the rate limit is exhausted.
+    """
+
+
+class RateLimiter:
+    """
+    Base class for rate limiters with per-endpoint limits.
+
+    Subclasses implement ``_try_acquire``, which takes one unit of capacity
+    for an endpoint and returns 0, or returns the seconds to wait before
+    capacity is expected to be available.
+    """
+
+    def __init__(self, limits=None, default_limit=None, block=True, max_wait=None):
+        """
+        Initialize an instance of RateLimiter.
+
+        Args:
+            limits: Dict of endpoint (e.g. 'enterprise_allocations') to the
+                maximum requests per second sent to it.
+            default_limit: Requests per second for endpoints not in limits,
+                or None to leave them unlimited.
+            block: Whether to wait for capacity. If False, RateLimitExceeded
+                is raised as soon as an endpoint is over its limit.
+            max_wait: When blocking, the most seconds to wait before raising
+                RateLimitExceeded, or None to wait as long as needed.
+        """
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.block = block
+        self.max_wait = max_wait
+
+    def get_limit(self, endpoint):
+        """
+        Return the endpoint's requests per second, or None if it is unlimited.
+        """
+        return self.limits.get(endpoint, self.default_limit)
+
+    def acquire(self, endpoint):
+        """
+        Take capacity for one request to the endpoint.
+
+        Waits for the capacity if the limiter blocks.
+
+        Raises:
+            RateLimitExceeded: If there is no capacity and the limiter does not
+                block, or capacity did not become available within max_wait.
+        """
+        rate = self.get_limit(endpoint)
+        if rate is None:
+            return
+
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        while True:
+            wait = self._try_acquire(endpoint, rate)
+            if not wait:
+                return
+            if not self.block or (deadline is not None and time.monotonic() + wait > deadline):
+                raise RateLimitExceeded(f'Rate limit of {rate}/s exceeded for {endpoint}.')
+            time.sleep(wait)
+
+    def _try_acquire(self, endpoint, rate):
+        raise NotImplementedError
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at ``rate`` tokens per second.
+
+    The bucket holds at most ``capacity`` tokens.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize a full bucket.
+
+        The capacity defaults to one second's worth of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self):
+        """
+        Take a token and return 0, or return the seconds until one is free.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class InProcessRateLimiter(RateLimiter):
+    """
+    Rate limiter with one token bucket per endpoint, shared across threads.
+
+    Share one instance between clients to limit them together. Limits are
+    per process; use DjangoCacheRateLimiter to limit across processes.
+    """
+
+    def __init__(self, *args, burst=None, **kwargs):
+        """
+        Initialize an instance of InProcessRateLimiter.
+
+        Args:
+            burst: Requests that may be sent at once after an idle period.
+                Defaults to one second's worth of requests.
+
+        Other arguments are as for RateLimiter.
+        """
+        super().__init__(*args, **kwargs)
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, endpoint, rate):
+        """
+        Return the endpoint's token bucket, creating it on first use.
+        """
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            if bucket is None:
+                bucket = self._buckets[endpoint] = TokenBucket(rate, self.burst)
+            return bucket
+
+    def _try_acquire(self, endpoint, rate):
+        return self._get_bucket(endpoint, rate).try_take()
+
+
+class DjangoCacheRateLimiter(RateLimiter):
+    """
+    Rate limiter shared by every process using the same Django cache.
+
+    Each endpoint gets a counter per ``window`` seconds, created with
+    ``cache.add`` and incremented with ``cache.incr``, which are atomic on
+    the memcached and Redis backends. Up to ``rate * window`` requests
+    (at least one) are let through per window.
+    """
+
+    def __init__(self, *args, window=1, cache=None, key_prefix='get_smarter_api_client.rate_limit', **kwargs):
+        """
+        Initialize an instance of DjangoCacheRateLimiter.
+
+        Args:
+            window: Length in seconds of each counting window.
+            cache: Django cache to keep the counters in. Defaults to the
+                default cache, which TieredCache also uses.
+            key_prefix: Prefix of the counters' cache keys.
+
+        Other arguments are as for RateLimiter.
+        """
+        super().__init__(*args, **kwargs)
+        if cache is None:
+            from django.core.cache import cache  # pylint: disable=import-outside-toplevel
+        self.window = window
+        self.cache = cache
+        self.key_prefix = key_prefix
+
+    def _try_acquire(self, endpoint, rate):
+        now = time.time()
+        window_index = int(now // self.window)
+        key = f'{self.key_prefix}.{endpoint}.{window_index}'
+        self.cache.add(key, 0, timeout=self.window * 2)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # The counter expired between add and incr.
+            self.cache.add(key, 0, timeout=self.window * 2)
+            count = self.cache.incr(key)
+        if count <= max(1, int(rate * self.window)):
+            return 0
+        return (window_index + 1) * self.window - now
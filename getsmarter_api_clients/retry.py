@@ -0,0 +1,161 @@
+"""
+Retry policy for transient GEAG and network failures.
+"""
+import datetime
+import email.utils
+import random
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+
+# Statuses that mean the request was not processed and may be sent again.
+DEFAULT_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+DEFAULT_RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+# Methods that are safe to send more than once without an idempotency key.
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+def is_connect_error(exception):
+    """
+    Return True if exception was raised before a connection was established.
+
+    Such a request never reached the server, so it is safe to send again
+    even if it is not idempotent.
+    """
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(exception, requests.exceptions.ConnectionError) or not exception.args:
+        return False
+    reason = exception.args[0]
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    # urllib3's NewConnectionError (refused connections, failed DNS
+    # lookups) is a ConnectTimeoutError.
+    return isinstance(reason, ConnectTimeoutError)
+
+
+class RetryPolicy:
+    """
+    Decide whether and when a failed request is retried.
+
+    Delays use exponential backoff with full jitter, unless the response
+    carries a ``Retry-After`` header, which is honoured instead. Requests
+    are retried until ``max_attempts`` have been made or the next attempt
+    would start after ``max_total_time`` seconds.
+
+    Non-idempotent requests (such as allocation POSTs) are only retried when
+    the caller supplies an idempotency key, such as the allocation's
+    payment reference. GEAG does not deduplicate requests on such a key, so
+    they are only retried when the request cannot have been processed: on
+    failures to connect, 429s, and 503s with a Retry-After header.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        max_total_time=30,
+        backoff_base=0.5,
+        backoff_max=10,
+        retry_statuses=DEFAULT_RETRY_STATUSES,
+        retry_exceptions=DEFAULT_RETRY_EXCEPTIONS,
+        respect_retry_after=True,
+    ):
+        """
+        Initialize an instance of RetryPolicy.
+
+        Args:
+            max_attempts: Maximum number of attempts, including the first.
+            max_total_time: Maximum seconds from the first attempt to the
+                start of the last one.
+            backoff_base: Upper bound in seconds of the delay before the
+                first retry; doubles with each further retry.
+            backoff_max: Upper bound in seconds of any backoff delay.
+            retry_statuses: Response statuses that are retried.
+            retry_exceptions: Exception classes that are retried.
+            respect_retry_after: Whether to wait for the duration given in a
+                response's Retry-After header.
+        """
+        self.max_attempts = max_attempts
+        self.max_total_time = max_total_time
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.respect_retry_after = respect_retry_after
+
+    def allows_retries(self, method, idempotency_key=None):
+        """
+        Return True if a request with this method may be sent more than once.
+        """
+        return method.upper() in IDEMPOTENT_METHODS or idempotency_key is not None
+
+    def is_retryable_status(self, status_code, response=None, idempotent=True):
+        """
+        Return True if a response with this status should be retried.
+
+        Args:
+            status_code: The response status.
+            response: The response, if any, for its Retry-After header.
+            idempotent: Whether the request's method is idempotent.
+        """
+        if status_code not in self.retry_statuses:
+            return False
+        if idempotent or status_code == 429:
+            return True
+        return status_code == 503 and response is not None and bool(response.headers.get('Retry-After'))
+
+    def is_retryable_exception(self, exception, idempotent=True):
+        """
+        Return True if a request that raised this exception should be retried.
+
+        Args:
+            exception: The exception the request raised.
+            idempotent: Whether the request's method is idempotent.
+        """
+        if not isinstance(exception, self.retry_exceptions):
+            return False
+        return idempotent or is_connect_error(exception)
+
+    def backoff(self, attempt):
+        """
+        Return the jittered delay in seconds before the next retry.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def get_delay(self, attempt, response=None):
+        """
+        Return the delay in seconds before retrying, honouring Retry-After.
+        """
+        if response is not None and self.respect_retry_after:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return retry_after
+        return self.backoff(attempt)
+
+
+def parse_retry_after(value):
+    """
+    Return the seconds to wait given a Retry-After header value.
+
+    Returns None if the value is missing or invalid.
+
+    The header may hold either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
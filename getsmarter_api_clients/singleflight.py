@@ -0,0 +1,69 @@
+"""
+In-process coalescing of concurrent calls that share a key.
+"""
+import threading
+
+
+class _Call:
+    """
+    A single in-flight call and the outcome its waiters will receive.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight:
+    """
+    Ensure only one execution of a call per key is in flight at a time.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running block until it finishes and receive the same
+    result (or exception) instead of running the function themselves.
+    """
+
+    def __init__(self):
+        """
+        Initialize an instance of SingleFlight.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key):
+        """
+        Return True if a call for the given key is currently running.
+        """
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run ``fn(*args, **kwargs)`` unless a call for ``key`` is running.
+
+        Returns:
+            The result of the leader's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as ex:
+            call.exception = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
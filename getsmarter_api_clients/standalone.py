@@ -0,0 +1,14 @@
+"""
+Helpers for running the clients outside a Django project.
+"""
+
+
+def configure_django():
+    """
+    Give TieredCache an in-memory cache when run outside a Django project.
+
+    Does nothing if Django settings are already configured.
+    """
+    from django.conf import settings  # pylint: disable=import-outside-toplevel
+    if not settings.configured:
+        settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
@@ -0,0 +1,201 @@
+"""
+Cache of the GEAG terms and policies, revalidated with conditional requests.
+"""
+import logging
+import threading
+import time
+
+import requests
+
+from getsmarter_api_clients.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached terms document, and its validators, are kept after it was
+# last fetched or revalidated. This is independent of the freshness TTL: an
+# entry older than the TTL is revalidated, not discarded.
+TERMS_CACHE_STORE_TIMEOUT = 24 * 60 * 60
+
+# Fetches of the terms that are in flight in this process, by cache key.
+_terms_fetches = SingleFlight()
+
+
+class TermsCacheStats:
+    """
+    Thread-safe counters of terms cache hits, misses and revalidations.
+
+    ``hits`` are served from the cache without a request, ``misses`` send a
+    full GET, and ``revalidations`` send a conditional GET, of which
+    ``not_modified`` were answered with a 304. ``stale_hits`` are served
+    stale while a background revalidation runs, and ``stale_on_error`` are
+    served stale because fetching the terms failed.
+    """
+
+    def __init__(self):
+        """
+        Initialize all counters to zero.
+        """
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.stale_hits = 0
+        self.stale_on_error = 0
+
+    def increment(self, counter):
+        """
+        Add one to the named counter.
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        """
+        Return the current counters as a dict.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'not_modified': self.not_modified,
+                'stale_hits': self.stale_hits,
+                'stale_on_error': self.stale_on_error,
+            }
+
+
+class TermsCache:
+    """
+    Serve a client's terms and policies from its token cache.
+
+    Cached terms are served for ``ttl`` seconds.
+
+    Once an entry is older than the TTL it is revalidated with the response's
+    ETag and Last-Modified validators, so an unchanged document costs a 304
+    with no body. At most one fetch per cache key is in flight per process;
+    concurrent callers that need the result wait for it.
+    """
+
+    def __init__(self, client, ttl, stale_while_revalidate=0, stale_if_error=0):
+        """
+        Initialize the cache for a GetSmarterEnterpriseApiClient.
+
+        Args:
+            client: The client used to fetch the terms.
+            ttl: Seconds a fetched document is served without revalidation.
+            stale_while_revalidate: Seconds after the TTL during which the
+                stale document is returned immediately while it is
+                revalidated in a background thread.
+            stale_if_error: Seconds after the TTL during which the stale
+                document is returned if fetching the terms fails.
+        """
+        self.client = client
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.stats = TermsCacheStats()
+
+    @property
+    def cache_key(self):
+        """
+        Return the cache key for the terms and policies.
+        """
+        return 'get_smarter_api_client.terms.{}'.format(self.client.oauth_client_id)
+
+    def _get_entry(self):
+        """
+        Return the cached entry, or None if nothing is cached.
+
+        As for access tokens, a stale process-local copy is looked past once
+        in case a background revalidation has replaced it.
+        """
+        entry = self.client.token_cache.get(self.cache_key)
+        if entry is not None and self._get_age(entry) >= self.ttl:
+            entry = self.client.token_cache.get_shared(self.cache_key)
+        return entry
+
+    def _get_age(self, entry):
+        return time.time() - entry['fetched_at']
+
+    def get(self):
+        """
+        Return the terms and policies, fetching or revalidating them if needed.
+        """
+        entry = self._get_entry()
+        if entry is not None:
+            age = self._get_age(entry)
+            if age < self.ttl:
+                self.stats.increment('hits')
+                return entry['terms']
+            if age < self.ttl + self.stale_while_revalidate:
+                self.stats.increment('stale_hits')
+                self._schedule_revalidation(entry)
+                return entry['terms']
+
+        try:
+            return _terms_fetches.do(self.cache_key, self._fetch, entry)['terms']
+        except requests.exceptions.RequestException as ex:
+            if entry is None or self._get_age(entry) >= self.ttl + self.stale_if_error:
+                raise
+            logger.warning('Serving stale terms and policies after failing to fetch them: %s', ex)
+            self.stats.increment('stale_on_error')
+            return entry['terms']
+
+    def _schedule_revalidation(self, entry):
+        """
+        Revalidate the terms in a background thread unless already fetching.
+        """
+        if _terms_fetches.in_flight(self.cache_key):
+            return
+        thread = threading.Thread(
+            target=self._revalidate,
+            args=(entry,),
+            name=f'{self.__class__.__name__}-revalidate',
+            daemon=True,
+        )
+        thread.start()
+
+    def _revalidate(self, entry):
+        """
+        Revalidate a stale entry, logging rather than raising failures.
+        """
+        try:
+            _terms_fetches.do(self.cache_key, self._fetch, entry)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to revalidate the terms and policies in the background.')
+
+    def _fetch(self, entry):
+        """
+        Fetch the terms, conditionally if cached, and cache the result.
+        """
+        headers = {}
+        if entry is None:
+            self.stats.increment('misses')
+        else:
+            self.stats.increment('revalidations')
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.client.get(f'{self.client.api_url}/terms', headers=headers)
+        if entry is not None and response.status_code == 304:
+            self.stats.increment('not_modified')
+            entry = dict(
+                entry,
+                etag=response.headers.get('ETag', entry.get('etag')),
+                last_modified=response.headers.get('Last-Modified', entry.get('last_modified')),
+                fetched_at=time.time(),
+            )
+        else:
+            response.raise_for_status()
+            entry = {
+                'terms': response.json(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+            }
+        store_timeout = max(TERMS_CACHE_STORE_TIMEOUT, self.ttl + self.stale_while_revalidate + self.stale_if_error)
+        self.client.token_cache.set(self.cache_key, entry, store_timeout)
+        return entry
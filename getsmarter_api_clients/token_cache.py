@@ -0,0 +1,329 @@
+"""
+Pluggable storage for access tokens and other cached client state.
+
+The clients keep their access token (and the terms cache its entries) in a
+TokenCache backend:
+
+* ``TieredTokenCache`` (the default) uses edx_django_utils' TieredCache, so
+  tokens are shared through the Django cache by every process using it.
+  Django is only imported when the backend is first used.
+* ``InMemoryTokenCache`` keeps tokens in the process, for code that does not
+  run under Django. Share one instance between clients to share tokens.
+* ``FileTokenCache`` keeps tokens in files, so processes on the same host
+  (e.g. batch workers) share them without Django or a cache server.
+"""
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
+
+
+class TokenCache:
+    """
+    Base class for token cache backends.
+
+    Timeouts are in seconds; a timeout of None never expires. Values must be
+    JSON serializable for backends that store them outside the process.
+    """
+
+    def get(self, key):
+        """
+        Return the value cached under key, or None if there is none.
+        """
+        raise NotImplementedError
+
+    def get_shared(self, key):
+        """
+        Return the value cached under key in the tier shared between processes.
+
+        Backends that keep a process-local copy in front of a shared tier look
+        past it, to pick up a value another process has since replaced.
+        """
+        return self.get(key)
+
+    def set(self, key, value, timeout):
+        """
+        Cache value under key for timeout seconds.
+        """
+        raise NotImplementedError
+
+    def add(self, key, value, timeout):
+        """
+        Atomically cache value under key unless a value is already cached.
+
+        Returns:
+            True if the value was added, False if key was already cached.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Remove any value cached under key.
+        """
+        raise NotImplementedError
+
+
+class TieredTokenCache(TokenCache):
+    """
+    Cache backed by edx_django_utils' TieredCache.
+
+    TieredCache keeps the request cache in front of the Django cache.
+
+    ``add`` only uses the Django cache, which is where cross-process leases
+    must live.
+    """
+
+    def get(self, key):
+        """
+        Return the value cached under key, or None if there is none.
+        """
+        from edx_django_utils.cache import TieredCache  # pylint: disable=import-outside-toplevel
+        cached_response = TieredCache.get_cached_response(key)
+        return cached_response.value if cached_response.is_found else None
+
+    def get_shared(self, key):
+        """
+        Return the value cached under key in the Django cache.
+
+        The request cache is bypassed.
+        """
+        from edx_django_utils.cache import DEFAULT_REQUEST_CACHE  # pylint: disable=import-outside-toplevel
+
+        # The request cache tier can hold an older copy than the shared Django
+        # cache (for example in long-lived worker threads).
+        DEFAULT_REQUEST_CACHE.delete(key)
+        return self.get(key)
+
+    def set(self, key, value, timeout):
+        """
+        Cache value under key for timeout seconds.
+        """
+        from edx_django_utils.cache import TieredCache  # pylint: disable=import-outside-toplevel
+        TieredCache.set_all_tiers(key, value, timeout)
+
+    def add(self, key, value, timeout):
+        """
+        Atomically cache value under key unless a value is already cached.
+
+        Only the Django cache is used.
+        """
+        from django.core.cache import cache as django_cache  # pylint: disable=import-outside-toplevel
+        return django_cache.add(key, value, timeout)
+
+    def delete(self, key):
+        """
+        Remove any value cached under key.
+        """
+        from edx_django_utils.cache import TieredCache  # pylint: disable=import-outside-toplevel
+        TieredCache.delete_all_tiers(key)
+
+
+class InMemoryTokenCache(TokenCache):
+    """
+    Thread-safe cache local to the process.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty cache.
+        """
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _get_live_entry(self, key, now):
+        """
+        Return the (value, expires_at) entry for key, or None if it expired.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and now >= entry[1]:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key):
+        """
+        Return the value cached under key, or None if there is none.
+        """
+        with self._lock:
+            entry = self._get_live_entry(key, time.monotonic())
+        return None if entry is None else entry[0]
+
+    def set(self, key, value, timeout):
+        """
+        Cache value under key for timeout seconds.
+        """
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+
+    def add(self, key, value, timeout):
+        """
+        Atomically cache value under key unless a value is already cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._get_live_entry(key, now) is not None:
+                return False
+            self._entries[key] = (value, None if timeout is None else now + timeout)
+            return True
+
+    def delete(self, key):
+        """
+        Remove any value cached under key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileTokenCache(TokenCache):
+    """
+    Cache that keeps each value in a JSON file.
+
+    The files are shared by processes on the same host.
+
+    Files are only readable by the current user, written to a temporary file
+    and moved into place, so readers never see a partial value. ``add``
+    links the new file into place, which fails atomically if another
+    process got there first. An expired file is moved aside and checked
+    again before it is removed, so a value another process just added is
+    never removed in its place.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Directory to keep the cache files in. Defaults to a
+                ``getsmarter-api-clients`` directory in the system temp
+                directory. It is created if needed.
+
+        Raises:
+            PermissionError: If the directory is a symlink, is not owned by
+                the current user or is accessible to other users. Another
+                user could otherwise read the tokens, or plant their own.
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'getsmarter-api-clients')
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._check_directory()
+
+    def _check_directory(self):
+        """
+        Raise PermissionError unless the directory is private to this user.
+        """
+        directory_stat = os.lstat(self.directory)
+        if not stat.S_ISDIR(directory_stat.st_mode):
+            raise PermissionError(f'Token cache directory {self.directory} is not a directory')
+        if hasattr(os, 'getuid') and directory_stat.st_uid != os.getuid():
+            raise PermissionError(f'Token cache directory {self.directory} is not owned by the current user')
+        if directory_stat.st_mode & 0o077:
+            raise PermissionError(
+                f'Token cache directory {self.directory} is accessible to other users '
+                f'(mode {stat.S_IMODE(directory_stat.st_mode):o}, expected 700)'
+            )
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _write_temp_file(self, value, timeout):
+        """
+        Write value to a new temporary file and return its path.
+        """
+        expires_at = None if timeout is None else time.time() + timeout
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as temp_file:
+            json.dump({'value': value, 'expires_at': expires_at}, temp_file)
+        return temp_path
+
+    def _read(self, path):
+        """
+        Return (value, expired) for the file at path.
+
+        Returns None if the file is missing or unreadable.
+        """
+        try:
+            with open(path, encoding='utf-8') as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        expires_at = entry.get('expires_at')
+        return entry.get('value'), expires_at is not None and time.time() >= expires_at
+
+    def get(self, key):
+        """
+        Return the value cached under key, or None if there is none.
+        """
+        entry = self._read(self._path(key))
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def set(self, key, value, timeout):
+        """
+        Cache value under key for timeout seconds.
+
+        The value's file is replaced atomically.
+        """
+        os.replace(self._write_temp_file(value, timeout), self._path(key))
+
+    def add(self, key, value, timeout):
+        """
+        Atomically cache value under key unless a live value is cached.
+        """
+        path = self._path(key)
+        temp_path = self._write_temp_file(value, timeout)
+        try:
+            for _ in range(2):
+                try:
+                    os.link(temp_path, path)
+                    return True
+                except FileExistsError:
+                    if not self._remove_if_expired(path):
+                        return False
+            return False
+        finally:
+            os.remove(temp_path)
+
+    def _remove_if_expired(self, path):
+        """
+        Remove the file at path if its value has expired or is unreadable.
+
+        Another process may replace the file between reading it and removing
+        it, so the file is first moved aside and checked again there; a live
+        value moved aside by mistake is put back.
+
+        Returns:
+            True if the file was removed or is already gone.
+        """
+        entry = self._read(path)
+        if entry is not None and not entry[1]:
+            return False
+        stale_path = os.path.join(self.directory, f'{uuid.uuid4().hex}.stale')
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return True
+        try:
+            entry = self._read(stale_path)
+            if entry is None or entry[1]:
+                return True
+            try:
+                os.link(stale_path, path)
+            except FileExistsError:
+                pass
+            return False
+        finally:
+            os.remove(stale_path)
+
+    def delete(self, key):
+        """
+        Remove any value cached under key.
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
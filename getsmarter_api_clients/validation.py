@@ -0,0 +1,243 @@
+"""
+Client-side validation of allocation requests.
+
+It runs before anything is sent to GEAG.
+"""
+from collections import namedtuple
+from numbers import Number
+
+from getsmarter_api_clients.models import AllocationRequest, EnterpriseAllocationRequest
+
+CURRENCIES = frozenset({'USD', 'GBP', 'ZAR', 'EUR', 'AED', 'SGD', 'HKD', 'SAR', 'INR', 'CAD'})
+
+WORK_EXPERIENCE_LEVELS = frozenset({'None', '1 to 5 years', '5 to 15 years', 'More than 15 years'})
+
+EDUCATION_LEVELS = frozenset({
+    'High school',
+    'Bachelor’s degree',
+    'Master’s degree',
+    'Doctoral degree',
+    'Other tertiary qualification',
+    'Honours degree',
+    'Bachelors degree',
+})
+
+ORDER_ITEM_PRICE_FIELDS = ('normalPrice', 'discount', 'finalPrice')
+
+
+class Violation(namedtuple('Violation', ['field', 'message'])):
+    """
+    One reason an allocation request is invalid.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        """
+        Return the violation as ``field: message``.
+        """
+        return f'{self.field}: {self.message}'
+
+
+class AllocationValidationError(ValueError):
+    """
+    Raised instead of sending an allocation request that GEAG would reject.
+
+    ``violations`` lists every problem found with the request.
+    """
+
+    def __init__(self, violations, payment_reference=None):
+        """
+        Initialize the error with its violations.
+        """
+        self.violations = violations
+        self.payment_reference = payment_reference
+        super().__init__(
+            f'Invalid allocation {payment_reference}: ' + '; '.join(str(violation) for violation in violations)
+        )
+
+
+def _check_one_of(allowed):
+    """
+    Return a check that a value is one of allowed.
+    """
+    choices = ', '.join(sorted(allowed))
+
+    def check(value):
+        if value not in allowed:
+            return f'{value!r} is not one of {choices}'
+        return None
+    return check
+
+
+def _check_required(value):
+    if value is None or value == '':
+        return 'is required'
+    return None
+
+
+def _check_order_items(order_items):
+    """
+    Check that order_items is a non-empty list of well-formed items.
+    """
+    if not isinstance(order_items, list) or not order_items:
+        return 'must be a non-empty list'
+    problems = []
+    for index, item in enumerate(order_items):
+        if not isinstance(item, dict):
+            problems.append(f'item {index} must be an object')
+            continue
+        if not isinstance(item.get('productId'), str) or not item['productId']:
+            problems.append(f'item {index} needs a productId')
+        quantity = item.get('quantity')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            problems.append(f'item {index} needs a positive integer quantity')
+        for field in ORDER_ITEM_PRICE_FIELDS:
+            if field in item and (not isinstance(item[field], Number) or isinstance(item[field], bool)):
+                problems.append(f'item {index} {field} must be a number')
+    return '; '.join(problems) or None
+
+
+class AllocationValidator:
+    """
+    Check every field of one kind of allocation request in a single pass.
+
+    The checks are compiled once per model into a tuple of (field, check)
+    pairs, where each check returns an error message or None. Optional
+    fields that are None are not checked.
+    """
+
+    def __init__(self, model_class, required_fields, field_checks):
+        """
+        Initialize the validator.
+
+        Args:
+            model_class: The request model (e.g. EnterpriseAllocationRequest).
+            required_fields: Fields that must not be None or empty.
+            field_checks: Dict of field to a check for its non-None values.
+        """
+        self.model_class = model_class
+        self.checks = tuple(
+            (field, _check_required) for field in required_fields
+        ) + tuple(
+            (field, check) for field, check in field_checks.items()
+        )
+
+    def validate(self, allocation_request):
+        """
+        Return the list of Violations for an allocation request.
+
+        The list is empty if the request is valid.
+        """
+        violations = []
+        for field, check in self.checks:
+            value = getattr(allocation_request, field)
+            if value is None and check is not _check_required:
+                continue
+            message = check(value)
+            if message is not None:
+                violations.append(Violation(field, message))
+        return violations
+
+    def check(self, allocation_request):
+        """
+        Raise AllocationValidationError if the allocation request is invalid.
+        """
+        violations = self.validate(allocation_request)
+        if violations:
+            raise AllocationValidationError(violations, allocation_request.payment_reference)
+
+    def build_batch(self, allocations, validate=True):
+        """
+        Build the request for each allocation in a batch.
+
+        The allocations are given as keyword argument dicts.
+
+        Args:
+            allocations: A list of keyword argument dicts for the model.
+                Their should_raise keys are ignored.
+            validate: Whether to validate the requests as they are built.
+
+        Returns:
+            A list, in input order, of each allocation's request, or of its
+            AllocationValidationError if it is invalid. Allocations whose
+            arguments do not fit the model (e.g. a missing required field)
+            are always reported as invalid.
+        """
+        built = []
+        for allocation in allocations:
+            kwargs = {key: value for key, value in allocation.items() if key != 'should_raise'}
+            try:
+                allocation_request = self.model_class(**kwargs)
+            except TypeError as ex:
+                built.append(AllocationValidationError(
+                    [Violation('arguments', str(ex))], allocation.get('payment_reference')
+                ))
+                continue
+            violations = self.validate(allocation_request) if validate else None
+            if violations:
+                built.append(AllocationValidationError(violations, allocation_request.payment_reference))
+            else:
+                built.append(allocation_request)
+        return built
+
+    def validate_batch(self, allocations):
+        """
+        Validate a batch of allocations before any is sent.
+
+        The allocations are given as keyword argument dicts.
+
+        Returns:
+            A dict of the index of each invalid allocation to its
+            AllocationValidationError. See build_batch.
+        """
+        return {
+            index: allocation_request
+            for index, allocation_request in enumerate(self.build_batch(allocations))
+            if isinstance(allocation_request, AllocationValidationError)
+        }
+
+
+_FIELD_CHECKS = {
+    'currency': _check_one_of(CURRENCIES),
+    'order_items': _check_order_items,
+    'work_experience': _check_one_of(WORK_EXPERIENCE_LEVELS),
+    'education_highest_level': _check_one_of(EDUCATION_LEVELS),
+}
+
+ALLOCATION_VALIDATOR = AllocationValidator(
+    AllocationRequest,
+    required_fields=(
+        'payment_reference',
+        'address_line1',
+        'city',
+        'postal_code',
+        'country',
+        'country_code',
+        'first_name',
+        'last_name',
+        'email',
+        'date_of_birth',
+        'terms_accepted_at',
+        'currency',
+        'order_items',
+    ),
+    field_checks=_FIELD_CHECKS,
+)
+
+ENTERPRISE_ALLOCATION_VALIDATOR = AllocationValidator(
+    EnterpriseAllocationRequest,
+    required_fields=(
+        'payment_reference',
+        'enterprise_customer_uuid',
+        'first_name',
+        'last_name',
+        'email',
+        'date_of_birth',
+        'terms_accepted_at',
+        'data_share_consent',
+        'currency',
+        'order_items',
+    ),
+    field_checks=_FIELD_CHECKS,
+)
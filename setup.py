@@ -147,6 +147,15 @@ setup(
     ],
     include_package_data=True,
     install_requires=load_requirements('requirements/base.in'),
+    extras_require={
+        'async': ['httpx'],
+    },
+    entry_points={
+        'console_scripts': [
+            'geag-ingest-allocations = getsmarter_api_clients.ingest:main',
+            'geag-loadgen = getsmarter_api_clients.loadgen:main',
+        ],
+    },
     python_requires=">3.8",
     license="AGPL 3.0",
     zip_safe=False,
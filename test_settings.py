@@ -0,0 +1,19 @@
+"""
+These settings are here to use during tests, because django requires them.
+
+In a real-world use case, this package is installed into Django services
+that provide their own settings, so these settings will not be used.
+"""
+
+SECRET_KEY = 'insecure-secret-key'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'getsmarter-api-clients-tests',
+    },
+}
+
+INSTALLED_APPS = ()
+
+USE_TZ = True
@@ -0,0 +1,185 @@
+"""
+A local stand-in for the GetSmarter OAuth provider and GEAG.
+
+Serves ``/oauth2/token``, ``/terms``, ``/allocations``,
+``/enterprise_allocations`` and ``/enterprise_allocations/cancel`` over real
+sockets with optional artificial latency, so that benchmarks exercise
+connection pooling and threading the way production traffic does.
+
+Run standalone with ``python -m test_utils.stand_in --port 8000``.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TERMS = {
+    'privacyPolicy': 'https://www.getsmarter.com/privacy-policy',
+    'websiteTermsOfUse': 'https://www.getsmarter.com/terms-of-use',
+    'studentTermsAndConditions': 'https://www.getsmarter.com/terms-and-conditions',
+    'cookiePolicy': 'https://www.getsmarter.com/cookie-policy',
+}
+TERMS_ETAG = '"stand-in-terms-v1"'
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handle requests for the stand-in provider and gateway.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # and delayed ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """
+        Keep request logging quiet.
+        """
+
+    def _send_json(self, status, body=None, headers=None):
+        """
+        Send a JSON response.
+        """
+        content = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self):
+        """
+        Answer a request for one of the stand-in endpoints.
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.record(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status = self.server.statuses.get(self.path)
+        if status is not None:
+            self._send_json(status, {'error': 'stand-in error'})
+        elif self.path == '/oauth2/token':
+            self._send_json(200, {
+                'access_token': f'stand-in-{uuid.uuid4().hex}',
+                'token_type': 'Bearer',
+                'expires_in': self.server.token_lifetime,
+            })
+        elif self.path == '/terms':
+            if self.headers.get('If-None-Match') == TERMS_ETAG:
+                self._send_json(304, headers={'ETag': TERMS_ETAG})
+            else:
+                self._send_json(200, TERMS, headers={'ETag': TERMS_ETAG})
+        elif self.path in ('/allocations', '/enterprise_allocations'):
+            payload = json.loads(body or b'{}')
+            self._send_json(201, {'paymentReference': payload.get('paymentReference'), 'orderUuid': str(uuid.uuid4())})
+        elif self.path == '/enterprise_allocations/cancel':
+            self._send_json(204)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server that counts the requests made to each path.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0, token_lifetime=3600, statuses=None):
+        """
+        Initialize the server, listening on localhost.
+
+        Args:
+            port: Port to listen on; 0 picks a free one.
+            latency: Seconds to wait before answering each request.
+            token_lifetime: ``expires_in`` of the issued access tokens.
+            statuses: Optional mapping of path to an error status to return.
+        """
+        super().__init__(('127.0.0.1', port), StandInRequestHandler)
+        self.latency = latency
+        self.token_lifetime = token_lifetime
+        self.statuses = statuses or {}
+        self.counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Return the base URL the server listens on.
+        """
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record(self, path):
+        """
+        Count a request to the given path.
+        """
+        with self._counts_lock:
+            self.counts[path] += 1
+
+    def reset_counts(self):
+        """
+        Forget the requests counted so far.
+        """
+        with self._counts_lock:
+            self.counts.clear()
+
+    def start(self):
+        """
+        Serve requests from a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        """
+        Start the server and return it.
+        """
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """
+        Stop the server.
+        """
+        self.stop()
+
+
+def main():
+    """
+    Run the stand-in server in the foreground.
+    """
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the GetSmarter APIs.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, help='seconds to wait before each response')
+    args = parser.parse_args()
+
+    server = StandInServer(port=args.port, latency=args.latency)
+    print(f'Serving stand-in GetSmarter APIs on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Tests for the pooled HTTP adapter, against the local stand-in server.
+"""
+
+import threading
+from datetime import datetime
+from unittest import mock
+
+import pytz
+
+from getsmarter_api_clients.oauth import OAuthApiClient
+from test_utils.stand_in import StandInServer
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class PooledHTTPAdapterTests(BaseOAuthApiClientTests):
+    """
+    Tests for connection pool configuration and statistics.
+    """
+    def setUp(self):
+        super().setUp()
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+    def start_server(self, **kwargs):
+        server = StandInServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def make_client(self, server, **kwargs):
+        client = OAuthApiClient(**{**self.mock_constructor_args, 'api_url': server.url}, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def send_concurrently(self, client, url, thread_count):
+        """
+        Send a GET to url from thread_count threads at once.
+        """
+        barrier = threading.Barrier(thread_count)
+
+        def send():
+            barrier.wait()
+            client.get(url).raise_for_status()
+
+        threads = [threading.Thread(target=send) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_connections_reused(self):
+        server = self.start_server()
+        client = self.make_client(server)
+
+        for _ in range(5):
+            client.get(f'{server.url}/terms').raise_for_status()
+
+        self.assertEqual(client.pool_stats, {'created': 1, 'reused': 4, 'discarded': 0})
+
+    def test_full_pool_discards_connections(self):
+        server = self.start_server(latency=0.1)
+        client = self.make_client(server, pool_maxsize=2)
+
+        self.send_concurrently(client, f'{server.url}/terms', 6)
+
+        stats = client.pool_stats
+        self.assertEqual(stats['created'], 6)
+        self.assertEqual(stats['discarded'], 4)
+
+    def test_blocking_pool(self):
+        server = self.start_server(latency=0.1)
+        client = self.make_client(server, pool_maxsize=2, pool_block=True)
+
+        self.send_concurrently(client, f'{server.url}/terms', 6)
+
+        self.assertEqual(client.pool_stats, {'created': 2, 'reused': 4, 'discarded': 0})
+
+    def test_keep_alive_disabled(self):
+        server = self.start_server()
+        client = self.make_client(server, keep_alive=False)
+
+        for _ in range(3):
+            response = client.get(f'{server.url}/terms')
+            self.assertEqual(response.request.headers['Connection'], 'close')
+
+        self.assertEqual(client.pool_stats['created'], 3)
+        self.assertEqual(client.pool_stats['reused'], 0)
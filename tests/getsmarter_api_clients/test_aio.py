@@ -0,0 +1,227 @@
+"""
+Tests for the async GEAG client.
+"""
+
+import asyncio
+import json
+import threading
+from unittest import IsolatedAsyncioTestCase, mock
+
+import ddt
+import httpx
+import requests
+from edx_django_utils.cache import TieredCache
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.aio import AsyncGetSmarterEnterpriseApiClient
+from getsmarter_api_clients.token_cache import InMemoryTokenCache
+from tests.getsmarter_api_clients import test_geag
+
+
+@ddt.ddt
+class AsyncGetSmarterEnterpriseApiClientTests(IsolatedAsyncioTestCase):
+    """
+    Tests for AsyncGetSmarterEnterpriseApiClient.
+    """
+    provider_url = 'https://provider-url.com'
+    api_url = 'https://api-url.com'
+    ENTERPRISE_ALLOCATION_PAYLOAD = test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+
+    def setUp(self):
+        super().setUp()
+        TieredCache.dangerous_clear_all_tiers()
+        self.addCleanup(TieredCache.dangerous_clear_all_tiers)
+
+        self.requests = []
+        self.responses = {}
+
+    def add_response(self, path, status=200, body=None, delay=0):
+        self.responses[path] = (status, body, delay)
+
+    async def handler(self, request):
+        """
+        Record the request and return the response configured for its path.
+        """
+        self.requests.append(request)
+        status, body, delay = self.responses[request.url.path]
+        if delay:
+            await asyncio.sleep(delay)
+        if isinstance(body, Exception):
+            raise body
+        return httpx.Response(status, json=body)
+
+    def make_client(self, **kwargs):
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        self.addAsyncCleanup(http_client.aclose)
+        return AsyncGetSmarterEnterpriseApiClient(
+            client_id='client-id',
+            client_secret='client-secret',
+            provider_url=self.provider_url,
+            api_url=self.api_url,
+            http_client=http_client,
+            **kwargs
+        )
+
+    def requests_to(self, path):
+        return [request for request in self.requests if request.url.path == path]
+
+    async def test_get_terms_and_policies(self):
+        terms_and_conditions = {'privacyPolicy': 'abcd', 'websiteTermsOfUse': 'efgh'}
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/terms', body=terms_and_conditions)
+        client = self.make_client()
+
+        self.assertEqual(await client.get_terms_and_policies(), terms_and_conditions)
+        terms_request = self.requests_to('/terms')[0]
+        self.assertEqual(terms_request.headers['Authorization'], 'Bearer abcd')
+        self.assertEqual(terms_request.headers['User-Agent'], 'Mozilla/5.0')
+
+    async def test_concurrent_calls_share_token_fetch(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300}, delay=0.1)
+        self.add_response('/enterprise_allocations/cancel', status=204)
+        client = self.make_client()
+
+        await asyncio.gather(*(client.cancel_enterprise_allocation(str(i)) for i in range(20)))
+
+        self.assertEqual(len(self.requests_to('/oauth2/token')), 1)
+        self.assertEqual(len(self.requests_to('/enterprise_allocations/cancel')), 20)
+
+    async def test_create_enterprise_allocation(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations', status=204)
+        client = self.make_client()
+
+        await client.create_enterprise_allocation(**self.ENTERPRISE_ALLOCATION_PAYLOAD)
+
+        payload = json.loads(self.requests_to('/enterprise_allocations')[0].content)
+        self.assertEqual(payload['paymentReference'], 'payment_reference')
+        self.assertEqual(payload['orgId'], '12KJ2j9js0')
+        self.assertNotIn('addressLine2', payload)
+
+    async def test_create_allocation_error_response(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/allocations', status=400, body={'error': 'the workers are going home'})
+        client = self.make_client()
+        kwargs = {
+            field: value for field, value in self.ENTERPRISE_ALLOCATION_PAYLOAD.items()
+            if field not in ('enterprise_customer_uuid', 'data_share_consent', 'org_id')
+        }
+
+        with self.assertRaises(HTTPError) as context:
+            await client.create_allocation(**kwargs)
+        self.assertEqual(context.exception.response.status_code, 400)
+
+    @ddt.data(True, False)
+    async def test_create_enterprise_allocation_error_response(self, should_raise):
+        error_payload = {'error': 'the workers are going home'}
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations', status=400, body=error_payload)
+        client = self.make_client()
+
+        if should_raise:
+            with self.assertRaises(HTTPError):
+                await client.create_enterprise_allocation(
+                    **self.ENTERPRISE_ALLOCATION_PAYLOAD,
+                    should_raise=should_raise,
+                )
+        else:
+            response = await client.create_enterprise_allocation(
+                **self.ENTERPRISE_ALLOCATION_PAYLOAD,
+                should_raise=should_raise,
+            )
+            self.assertEqual(error_payload, response.json())
+            self.assertEqual(400, response.status_code)
+
+    @ddt.data(True, False)
+    async def test_cancel_enterprise_allocation_error_response(self, should_raise):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations/cancel', status=400, body={'error': 'nope'})
+        client = self.make_client()
+
+        if should_raise:
+            with self.assertRaises(HTTPError):
+                await client.cancel_enterprise_allocation('order-uuid', should_raise=should_raise)
+        else:
+            response = await client.cancel_enterprise_allocation('order-uuid', should_raise=should_raise)
+            self.assertEqual(400, response.status_code)
+
+    async def test_token_shared_with_cache(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations/cancel', status=204)
+        client = self.make_client()
+        await client.cancel_enterprise_allocation('order-uuid')
+
+        # A second client finds the token in the shared cache tiers.
+        other_client = self.make_client()
+        with mock.patch.object(other_client, '_request_access_token') as mock_request_access_token:
+            await other_client.cancel_enterprise_allocation('order-uuid')
+        mock_request_access_token.assert_not_called()
+        self.assertEqual(len(self.requests_to('/oauth2/token')), 1)
+
+    async def test_redirects_not_raised(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations/cancel', status=304)
+        client = self.make_client()
+
+        response = await client.cancel_enterprise_allocation('order-uuid')
+
+        self.assertEqual(response.status_code, 304)
+
+    @ddt.data(
+        (httpx.ConnectError('refused'), requests.exceptions.ConnectionError),
+        (httpx.RemoteProtocolError('disconnected'), requests.exceptions.ConnectionError),
+        (httpx.ConnectTimeout('timed out'), requests.exceptions.ConnectTimeout),
+        (httpx.ReadTimeout('timed out'), requests.exceptions.ReadTimeout),
+    )
+    @ddt.unpack
+    async def test_transport_errors_raised_as_requests_exceptions(self, error, expected_exception):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations/cancel', body=error)
+        client = self.make_client()
+
+        with self.assertRaises(expected_exception) as context:
+            await client.cancel_enterprise_allocation('order-uuid')
+        self.assertIs(context.exception.__cause__, error)
+
+    async def test_token_cache_used_off_the_event_loop(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300})
+        self.add_response('/enterprise_allocations/cancel', status=204)
+        token_cache = InMemoryTokenCache()
+        cache_threads = []
+        for method_name in ('get', 'set'):
+            method = getattr(token_cache, method_name)
+
+            def record_thread(*args, method=method):
+                cache_threads.append(threading.current_thread())
+                return method(*args)
+            setattr(token_cache, method_name, record_thread)
+        client = self.make_client(token_cache=token_cache)
+
+        await client.cancel_enterprise_allocation('order-uuid')
+
+        self.assertTrue(cache_threads)
+        self.assertNotIn(threading.current_thread(), cache_threads)
+
+    def test_usable_from_several_event_loops(self):
+        self.add_response('/oauth2/token', body={'access_token': 'abcd', 'expires_in': 300}, delay=0.05)
+        self.add_response('/enterprise_allocations/cancel', status=204)
+        client = AsyncGetSmarterEnterpriseApiClient(
+            client_id='client-id',
+            client_secret='client-secret',
+            provider_url=self.provider_url,
+            api_url=self.api_url,
+            token_cache=InMemoryTokenCache(),
+        )
+
+        async def cancel():
+            client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+            # Make both calls wait on the token lock for a new token.
+            client._token_memo = None  # pylint: disable=protected-access
+            client.token_cache.delete(client.access_token_cache_key)
+            async with client.http_client:
+                await asyncio.gather(*(client.cancel_enterprise_allocation(str(i)) for i in range(2)))
+
+        asyncio.run(cancel())
+        asyncio.run(cancel())
+
+        self.assertEqual(len(self.requests_to('/enterprise_allocations/cancel')), 4)
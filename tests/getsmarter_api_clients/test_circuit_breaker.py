@@ -0,0 +1,200 @@
+"""
+Tests for circuit breakers and their use by the GEAG client.
+"""
+
+from datetime import datetime
+from unittest import TestCase, mock
+
+import pytz
+import requests
+import responses
+
+from getsmarter_api_clients.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerOpenError,
+    CircuitBreakerRegistry,
+)
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.rate_limit import InProcessRateLimiter, RateLimitExceeded
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class CircuitBreakerTests(TestCase):
+    """
+    Tests for CircuitBreaker state transitions.
+    """
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        monotonic_patcher = mock.patch(
+            'getsmarter_api_clients.circuit_breaker.time.monotonic', side_effect=lambda: self.now
+        )
+        monotonic_patcher.start()
+        self.addCleanup(monotonic_patcher.stop)
+
+    def record(self, breaker, failed, duration=0.1):
+        breaker.before_call()
+        breaker.after_call(failed=failed, duration=duration)
+
+    def test_stays_closed_below_minimum_calls(self):
+        breaker = CircuitBreaker(minimum_calls=5)
+        for _ in range(4):
+            self.record(breaker, failed=True)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_opens_on_failure_rate(self):
+        breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=4, minimum_calls=4)
+        for failed in (False, True, False, True):
+            self.record(breaker, failed=failed)
+
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitBreakerOpenError):
+            breaker.before_call()
+
+    def test_window_forgets_old_failures(self):
+        breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=4, minimum_calls=4)
+        for failed in (True, False, False, False, False, True):
+            self.record(breaker, failed=failed)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_opens_on_slow_call_rate(self):
+        breaker = CircuitBreaker(slow_call_rate_threshold=0.5, slow_call_duration=2, minimum_calls=2)
+        self.record(breaker, failed=False, duration=3)
+        self.record(breaker, failed=False, duration=0.1)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open_trial_closes_breaker(self):
+        breaker = CircuitBreaker(minimum_calls=1, open_duration=30)
+        self.record(breaker, failed=True)
+        self.assertEqual(breaker.state, OPEN)
+
+        self.now += 30
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.before_call()
+        with self.assertRaises(CircuitBreakerOpenError):
+            breaker.before_call()
+        breaker.after_call(failed=False, duration=0.1)
+
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_half_open_failure_reopens_breaker(self):
+        breaker = CircuitBreaker(minimum_calls=1, open_duration=30)
+        self.record(breaker, failed=True)
+
+        self.now += 30
+        self.record(breaker, failed=True)
+
+        self.assertEqual(breaker.state, OPEN)
+        self.now += 29
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_stale_outcomes_ignored(self):
+        breaker = CircuitBreaker(minimum_calls=1, open_duration=30)
+        stale_ticket = breaker.before_call()
+        self.record(breaker, failed=True)
+
+        self.now += 30
+        probe_ticket = breaker.before_call()
+        # A call that started before the breaker opened cannot close it.
+        breaker.after_call(failed=False, duration=0.1, ticket=stale_ticket)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.after_call(failed=False, duration=0.1, ticket=probe_ticket)
+
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_registry_returns_one_breaker_per_endpoint(self):
+        registry = CircuitBreakerRegistry(minimum_calls=3)
+        breaker = registry.get('enterprise_allocations')
+
+        self.assertIs(registry.get('enterprise_allocations'), breaker)
+        self.assertIsNot(registry.get('terms'), breaker)
+        self.assertEqual(breaker.minimum_calls, 3)
+
+
+class GetSmarterEnterpriseApiClientCircuitBreakerTests(BaseOAuthApiClientTests):
+    """
+    Tests for GetSmarterEnterpriseApiClient with circuit breakers.
+    """
+    def setUp(self):
+        super().setUp()
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+        self.registry = CircuitBreakerRegistry(minimum_calls=2, window_size=2)
+        self.client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, circuit_breakers=self.registry)
+        self.allocation_url = f'{self.api_url}/enterprise_allocations'
+
+    def create_allocation(self):
+        return self.client.create_enterprise_allocation(
+            **test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+        )
+
+    @responses.activate
+    def test_server_errors_open_breaker(self):
+        responses.add(responses.POST, self.allocation_url, status=503)
+        responses.add(responses.GET, f'{self.api_url}/terms', json={})
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.create_allocation()
+        with self.assertRaises(CircuitBreakerOpenError):
+            self.create_allocation()
+
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(self.registry.get('enterprise_allocations').state, OPEN)
+        # Other endpoints are unaffected.
+        self.assertEqual(self.client.get_terms_and_policies(), {})
+
+    @responses.activate
+    def test_connection_errors_count_as_failures(self):
+        responses.add(responses.POST, self.allocation_url, body=requests.exceptions.ConnectionError('reset'))
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.create_allocation()
+
+        self.assertEqual(self.registry.get('enterprise_allocations').state, OPEN)
+
+    @responses.activate
+    def test_client_errors_do_not_open_breaker(self):
+        responses.add(responses.POST, self.allocation_url, status=400)
+
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.create_allocation()
+
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(self.registry.get('enterprise_allocations').state, CLOSED)
+
+    @responses.activate
+    def test_rate_limit_does_not_open_breaker(self):
+        responses.add(responses.POST, self.allocation_url, status=201)
+        self.client.rate_limiter = InProcessRateLimiter({'enterprise_allocations': 0.001}, block=False)
+        self.client.circuit_breakers = CircuitBreakerRegistry(minimum_calls=2, window_size=2)
+
+        self.create_allocation()
+        for _ in range(3):
+            with self.assertRaises(RateLimitExceeded):
+                self.create_allocation()
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(self.client.circuit_breakers.get('enterprise_allocations').state, CLOSED)
+
+    def test_get_endpoint(self):
+        self.assertEqual(
+            self.client.get_endpoint(f'{self.api_url}/enterprise_allocations/cancel?x=1'),
+            'enterprise_allocations/cancel'
+        )
@@ -0,0 +1,137 @@
+"""
+Tests for sharing clients between threads, against the local stand-in server.
+"""
+
+import gc
+import os
+import threading
+import weakref
+from unittest import mock
+
+from getsmarter_api_clients.client_pool import ClientPool
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.token_cache import InMemoryTokenCache
+from test_utils.stand_in import StandInServer
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+THREAD_COUNT = 16
+REQUESTS_PER_THREAD = 25
+
+
+class ThreadSafetyTests(BaseOAuthApiClientTests):
+    """
+    Multi-threaded stress tests for a shared client and for ClientPool.
+    """
+    def setUp(self):
+        super().setUp()
+        env_patcher = mock.patch.dict(os.environ, {'OAUTHLIB_INSECURE_TRANSPORT': '1'})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+        self.server = StandInServer().start()
+        self.addCleanup(self.server.stop)
+        self.client_kwargs = {
+            **self.mock_constructor_args,
+            'provider_url': self.server.url,
+            'api_url': self.server.url,
+            'token_cache': InMemoryTokenCache(),
+            'pool_maxsize': THREAD_COUNT,
+        }
+
+    def stress(self, get_client):
+        """
+        Send allocations, cancellations and terms requests from many threads.
+
+        Returns:
+            The list of unexpected exceptions and status codes.
+        """
+        barrier = threading.Barrier(THREAD_COUNT)
+        failures = []
+        allocation = test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+
+        def work(thread_index):
+            client = get_client()
+            barrier.wait()
+            for index in range(REQUESTS_PER_THREAD):
+                try:
+                    if index % 3 == 0:
+                        response = client.get_terms_and_policies()
+                        if 'privacyPolicy' not in response:
+                            failures.append(response)
+                        continue
+                    if index % 3 == 1:
+                        response = client.create_enterprise_allocation(
+                            **dict(allocation, payment_reference=f'ref-{thread_index}-{index}')
+                        )
+                    else:
+                        response = client.cancel_enterprise_allocation(f'order-{thread_index}-{index}')
+                    if response.status_code >= 400:
+                        failures.append(response.status_code)
+                except Exception as ex:  # pylint: disable=broad-except
+                    failures.append(ex)
+
+        threads = [threading.Thread(target=work, args=(index,)) for index in range(THREAD_COUNT)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return failures
+
+    def test_shared_client(self):
+        client = GetSmarterEnterpriseApiClient(**self.client_kwargs)
+        self.addCleanup(client.close)
+
+        self.assertEqual(self.stress(lambda: client), [])
+
+        self.assertEqual(self.server.counts['/oauth2/token'], 1)
+        self.assertNotIn('Authorization', client.headers)
+        stats = client.pool_stats
+        self.assertLessEqual(stats['created'], THREAD_COUNT)
+        self.assertEqual(stats['discarded'], 0)
+
+    def test_client_pool(self):
+        pool = ClientPool(**self.client_kwargs)
+        self.addCleanup(pool.close)
+        clients = set()
+
+        def get_client():
+            client = pool.get()
+            self.assertIs(pool.get(), client)
+            clients.add(client)
+            return client
+
+        self.assertEqual(self.stress(get_client), [])
+
+        self.assertEqual(len(clients), THREAD_COUNT)
+        self.assertTrue(all(client.adapter is pool.adapter for client in clients))
+        self.assertEqual(self.server.counts['/oauth2/token'], 1)
+        stats = pool.pool_stats
+        self.assertLessEqual(stats['created'], THREAD_COUNT)
+        self.assertEqual(stats['discarded'], 0)
+        total = THREAD_COUNT * REQUESTS_PER_THREAD
+        self.assertEqual(stats['created'] + stats['reused'], total)
+
+    def test_clients_released_with_their_threads(self):
+        pool = ClientPool(**self.client_kwargs)
+        self.addCleanup(pool.close)
+        client_refs = []
+
+        def create_client():
+            client_refs.append(weakref.ref(pool.get()))
+
+        for _ in range(3):
+            thread = threading.Thread(target=create_client)
+            thread.start()
+            thread.join()
+        gc.collect()
+
+        self.assertEqual([ref() for ref in client_refs], [None, None, None])
+
+    def test_close(self):
+        with ClientPool(**self.client_kwargs) as pool:
+            self.assertEqual(pool.pool_stats, {'created': 0, 'reused': 0, 'discarded': 0})
+            client = pool.get()
+            client.cancel_enterprise_allocation('order-uuid')
+
+        self.assertIsNot(pool.get(), client)
@@ -0,0 +1,159 @@
+"""
+Tests for deduplicating repeated allocation submissions.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import TestCase, mock
+
+import ddt
+import pytz
+import responses
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.dedupe import DedupeCache, fingerprint
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.token_cache import InMemoryTokenCache
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class DedupeCacheTests(TestCase):
+    """
+    Tests for DedupeCache.
+    """
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('url', {'a': 1, 'b': 2}), fingerprint('url', {'b': 2, 'a': 1}))
+        self.assertNotEqual(fingerprint('url', {'a': 1}), fingerprint('url', {'a': 2}))
+        self.assertNotEqual(fingerprint('url', {'a': 1}), fingerprint('other-url', {'a': 1}))
+
+    def test_concurrent_duplicates_join_in_flight_request(self):
+        cache = DedupeCache()
+        started, release = threading.Event(), threading.Event()
+        response = mock.Mock(status_code=201)
+
+        def send():
+            started.set()
+            release.wait(5)
+            return response
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get_or_send('url', {'a': 1}, send)))
+        leader.start()
+        self.assertTrue(started.wait(5))
+        follower = threading.Thread(target=lambda: results.append(cache.get_or_send('url', {'a': 1}, send)))
+        follower.start()
+        # Give the follower time to join the flight before the leader finishes.
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(results, [response, response])
+        self.assertEqual(cache.stats.snapshot(), {'hits': 0, 'shared_hits': 0, 'joined': 1, 'misses': 1})
+
+    def test_lru_is_bounded(self):
+        cache = DedupeCache(max_entries=1)
+        send = mock.Mock(return_value=mock.Mock(status_code=201))
+
+        cache.get_or_send('url', {'a': 1}, send)
+        cache.get_or_send('url', {'a': 2}, send)
+        cache.get_or_send('url', {'a': 1}, send)
+
+        self.assertEqual(send.call_count, 3)
+
+    def test_entries_expire(self):
+        cache = DedupeCache(ttl=60)
+        send = mock.Mock(return_value=mock.Mock(status_code=201))
+
+        with mock.patch('getsmarter_api_clients.dedupe.time.monotonic', return_value=1000):
+            cache.get_or_send('url', {'a': 1}, send)
+        with mock.patch('getsmarter_api_clients.dedupe.time.monotonic', return_value=1059):
+            cache.get_or_send('url', {'a': 1}, send)
+        self.assertEqual(send.call_count, 1)
+
+        with mock.patch('getsmarter_api_clients.dedupe.time.monotonic', return_value=1060):
+            cache.get_or_send('url', {'a': 1}, send)
+        self.assertEqual(send.call_count, 2)
+
+
+@ddt.ddt
+class ClientDedupeTests(BaseOAuthApiClientTests):
+    """
+    Tests for GetSmarterEnterpriseApiClient with a DedupeCache.
+    """
+    def setUp(self):
+        super().setUp()
+        self.url = f'{self.api_url}/enterprise_allocations'
+        self.allocation = test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+    def make_client(self, **dedupe_kwargs):
+        return GetSmarterEnterpriseApiClient(**self.mock_constructor_args, dedupe=DedupeCache(**dedupe_kwargs))
+
+    @responses.activate
+    def test_recent_duplicate_not_sent(self):
+        responses.add(responses.POST, self.url, status=201, json={'orderUuid': 'order-uuid'})
+        client = self.make_client()
+
+        first = client.create_enterprise_allocation(**self.allocation)
+        second = client.create_enterprise_allocation(**self.allocation)
+        client.create_enterprise_allocation(**{**self.allocation, 'payment_reference': 'other'})
+
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(client.dedupe.stats.snapshot(), {'hits': 1, 'shared_hits': 0, 'joined': 0, 'misses': 2})
+
+    @responses.activate
+    def test_client_errors_replayed(self):
+        responses.add(responses.POST, self.url, status=400, body='bad request')
+        client = self.make_client()
+
+        for _ in range(2):
+            with self.assertRaises(HTTPError):
+                client.create_enterprise_allocation(**self.allocation)
+
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    @ddt.data(503, 500, 429, 409, 404, 401, 304)
+    def test_transient_responses_not_cached(self, status):
+        responses.add(responses.POST, self.url, status=status)
+        responses.add(responses.POST, self.url, status=201)
+        client = self.make_client()
+
+        self.assertEqual(
+            client.create_enterprise_allocation(**self.allocation, should_raise=False).status_code, status
+        )
+        self.assertEqual(client.create_enterprise_allocation(**self.allocation).status_code, 201)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_shared_tier(self):
+        responses.add(responses.POST, self.url, status=201, json={'orderUuid': 'order-uuid'})
+        shared_cache = InMemoryTokenCache()
+        first_client = self.make_client(shared_cache=shared_cache)
+        second_client = self.make_client(shared_cache=shared_cache)
+
+        first_client.create_enterprise_allocation(**self.allocation)
+        response = second_client.create_enterprise_allocation(**self.allocation)
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'orderUuid': 'order-uuid'})
+        self.assertEqual(response.url, self.url)
+        self.assertEqual((response.request.method, response.request.url), ('POST', self.url))
+        self.assertEqual(response.elapsed, timedelta(0))
+        self.assertEqual(second_client.dedupe.stats.shared_hits, 1)
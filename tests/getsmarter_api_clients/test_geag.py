@@ -13,7 +13,8 @@ import pytz
 import responses
 from requests.exceptions import HTTPError
 
-from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.geag import BulkCancellationError, GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.validation import AllocationValidationError
 from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
 
 
@@ -64,7 +65,7 @@ class GetSmarterEnterpriseApiClientTests(BaseOAuthApiClientTests):
         self.enterprise_allocations_url = f'{self.api_url}/enterprise_allocations'
         self.enterprise_allocations_cancellation_url = f'{self.api_url}/enterprise_allocations/cancel'
 
-        self.tiered_cache_patcher = mock.patch('getsmarter_api_clients.oauth.TieredCache')
+        self.tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
         self.mock_tiered_cache = self.tiered_cache_patcher.start()
         self.mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
             value={
@@ -268,3 +269,111 @@ class GetSmarterEnterpriseApiClientTests(BaseOAuthApiClientTests):
             )
             self.assertEqual(error_payload, response.json())
             self.assertEqual(400, response.status_code)
+
+    @responses.activate
+    def test_create_enterprise_allocations(self):
+        failing_references = {'ref-3', 'ref-7'}
+
+        def allocation_callback(request):
+            payment_reference = json.loads(request.body)['paymentReference']
+            if payment_reference in failing_references:
+                return (400, {}, json.dumps({'error': payment_reference}))
+            return (201, {}, json.dumps({'paymentReference': payment_reference}))
+
+        responses.add_callback(
+            responses.POST,
+            self.enterprise_allocations_url,
+            callback=allocation_callback,
+            content_type='application/json',
+        )
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        allocations = (
+            dict(self.ENTERPRISE_ALLOCATION_PAYLOAD, payment_reference=f'ref-{i}')
+            for i in range(10)
+        )
+
+        results = client.create_enterprise_allocations(allocations, max_workers=4)
+
+        self.assertEqual(len(responses.calls), 10)
+        self.assertEqual([result.item['payment_reference'] for result in results], [f'ref-{i}' for i in range(10)])
+        for result in results:
+            failed = result.item['payment_reference'] in failing_references
+            self.assertEqual(result.succeeded, not failed)
+            self.assertEqual(result.response.status_code, 400 if failed else 201)
+            if failed:
+                self.assertIsInstance(result.error, HTTPError)
+
+    @responses.activate
+    def test_create_enterprise_allocations_invalid_item(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+        results = client.create_enterprise_allocations([
+            {'payment_reference': 'missing-fields'},
+            self.ENTERPRISE_ALLOCATION_PAYLOAD,
+        ])
+
+        self.assertIsInstance(results[0].error, AllocationValidationError)
+        self.assertIsNone(results[0].response)
+        self.assertTrue(results[1].succeeded)
+        self.assertEqual(len(responses.calls), 1)
+
+    def test_create_enterprise_allocations_raises_programming_errors(self):
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+        with mock.patch.object(client, '_send_enterprise_allocation', side_effect=TypeError('bug')):
+            with self.assertRaises(TypeError):
+                client.create_enterprise_allocations([self.ENTERPRISE_ALLOCATION_PAYLOAD])
+
+    @responses.activate
+    @ddt.data(True, False)
+    def test_cancel_enterprise_allocations(self, should_raise):
+        failing_uuids = {'order-3'}
+
+        def cancellation_callback(request):
+            order_uuid = json.loads(request.body)['orderUuid']
+            return (400 if order_uuid in failing_uuids else 200, {}, json.dumps({'orderUuid': order_uuid}))
+
+        responses.add_callback(
+            responses.POST,
+            self.enterprise_allocations_cancellation_url,
+            callback=cancellation_callback,
+            content_type='application/json',
+        )
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        order_uuids = [f'order-{i}' for i in range(6)] + ['order-1', 'order-4']
+
+        if should_raise:
+            with self.assertRaises(BulkCancellationError) as context:
+                client.cancel_enterprise_allocations(order_uuids, max_workers=3)
+            results = context.exception.results
+            self.assertEqual([result.item for result in context.exception.failed], ['order-3'])
+            self.assertIsInstance(context.exception.failed[0].error, HTTPError)
+            self.assertEqual(context.exception.response.status_code, 400)
+        else:
+            results = client.cancel_enterprise_allocations(order_uuids, max_workers=3, should_raise=False)
+
+        self.assertEqual(len(responses.calls), 6)
+        self.assertEqual(list(results), [f'order-{i}' for i in range(6)])
+        for order_uuid, result in results.items():
+            failed = order_uuid in failing_uuids
+            self.assertEqual(result.succeeded, not failed)
+            self.assertEqual(result.response.status_code, 400 if failed else 200)
+
+    def test_cancel_enterprise_allocations_raises_programming_errors(self):
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+        with mock.patch.object(client, 'cancel_enterprise_allocation', side_effect=TypeError('bug')):
+            with self.assertRaises(TypeError):
+                client.cancel_enterprise_allocations(['order-1'], should_raise=False)
+
+    @responses.activate
+    def test_cancel_enterprise_allocations_accepts_uuids(self):
+        responses.add(responses.POST, self.enterprise_allocations_cancellation_url, status=200)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        order_uuid = uuid4()
+
+        results = client.cancel_enterprise_allocations([order_uuid, str(order_uuid)])
+
+        self.assertEqual(list(results), [str(order_uuid)])
+        self.assertEqual(len(responses.calls), 1)
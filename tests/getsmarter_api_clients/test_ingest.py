@@ -0,0 +1,245 @@
+"""
+Tests for the streaming allocation ingest.
+"""
+
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+import pytz
+import responses
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.ingest import AllocationIngest, Checkpoint, main, read_allocation_records
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+ALLOCATION = {
+    'enterprise_customer_uuid': '01234567-1234-1234-1234-0123456789ab',
+    'first_name': 'John',
+    'last_name': 'Smith',
+    'email': 'johnsmith@example.com',
+    'date_of_birth': '2000-01-01',
+    'terms_accepted_at': '2022-07-25T10:29:56Z',
+    'data_share_consent': True,
+    'currency': 'USD',
+    'order_items': [{'productId': 'product-id', 'quantity': 1, 'normalPrice': 1000, 'discount': 0, 'finalPrice': 1000}],
+}
+
+
+class AllocationIngestTests(BaseOAuthApiClientTests):
+    """
+    Tests for reading, sending and checkpointing streamed allocations.
+    """
+    def setUp(self):
+        super().setUp()
+        self.enterprise_allocations_url = f'{self.api_url}/enterprise_allocations'
+
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        self.mock_tiered_cache = tiered_cache_patcher.start()
+        self.mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def write_jsonl(self, name, count):
+        """
+        Write count allocation records to a JSONL file and return its path.
+        """
+        path = self.path(name)
+        with open(path, 'w', encoding='utf-8') as records:
+            for index in range(count):
+                records.write(json.dumps(dict(ALLOCATION, payment_reference=f'ref-{index}')) + '\n')
+        return path
+
+    def sent_references(self):
+        return [json.loads(call.request.body)['paymentReference'] for call in responses.calls]
+
+    def test_read_csv_records(self):
+        path = self.path('allocations.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as records:
+            writer = csv.writer(records)
+            writer.writerow(['paymentReference', 'first_name', 'dataShareConsent', 'orderItems', 'city', 'notes'])
+            writer.writerow(['ref-0', 'John', 'true', json.dumps(ALLOCATION['order_items']), '', 'ignored'])
+
+        self.assertEqual(list(read_allocation_records(path)), [{
+            'payment_reference': 'ref-0',
+            'first_name': 'John',
+            'data_share_consent': True,
+            'order_items': ALLOCATION['order_items'],
+        }])
+
+    def test_read_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            list(read_allocation_records(self.path('allocations.xml'), 'xml'))
+
+    @responses.activate
+    def test_run(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        path = self.write_jsonl('allocations.jsonl', 20)
+        checkpoint_path = self.path('checkpoint.json')
+
+        stats = AllocationIngest(client, checkpoint_path=checkpoint_path, max_in_flight=4).run(
+            read_allocation_records(path)
+        )
+
+        self.assertEqual(stats, {'sent': 20, 'succeeded': 20, 'failed': 0, 'retryable': 0, 'skipped': 0})
+        self.assertEqual(sorted(self.sent_references()), sorted(f'ref-{i}' for i in range(20)))
+        with open(checkpoint_path, encoding='utf-8') as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file), {'offset': 20, 'completed': [], 'retry': []})
+
+    @responses.activate
+    def test_resume_after_crash(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        path = self.write_jsonl('allocations.jsonl', 10)
+        checkpoint_path = self.path('checkpoint.json')
+
+        def crash_after(records, count):
+            for index, record in enumerate(records):
+                if index == count:
+                    raise KeyboardInterrupt
+                yield record
+
+        with self.assertRaises(KeyboardInterrupt):
+            AllocationIngest(client, checkpoint_path=checkpoint_path, max_in_flight=3).run(
+                crash_after(read_allocation_records(path), 6)
+            )
+        sent_before_crash = set(self.sent_references())
+        self.assertEqual(sent_before_crash, {f'ref-{i}' for i in range(6)})
+
+        stats = AllocationIngest(client, checkpoint_path=checkpoint_path, max_in_flight=3).run(
+            read_allocation_records(path)
+        )
+
+        self.assertEqual(stats['skipped'], 6)
+        self.assertEqual(stats['sent'], 4)
+        self.assertEqual(len(self.sent_references()), 10)
+        self.assertEqual(set(self.sent_references()), {f'ref-{i}' for i in range(10)})
+
+    @responses.activate
+    def test_failures_recorded(self):
+        def allocation_callback(request):
+            status = 400 if json.loads(request.body)['paymentReference'] == 'ref-2' else 201
+            return (status, {}, '')
+
+        responses.add_callback(responses.POST, self.enterprise_allocations_url, callback=allocation_callback)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        path = self.write_jsonl('allocations.jsonl', 5)
+        failures_path = self.path('failures.jsonl')
+
+        stats = AllocationIngest(client, failures_path=failures_path).run(read_allocation_records(path))
+
+        self.assertEqual(stats, {'sent': 5, 'succeeded': 4, 'failed': 1, 'retryable': 0, 'skipped': 0})
+        failed = list(read_allocation_records(failures_path))
+        self.assertEqual([record['payment_reference'] for record in failed], ['ref-2'])
+
+    @responses.activate
+    def test_resume_after_transient_failure(self):
+        outage = {'ref-1', 'ref-3'}
+
+        def allocation_callback(request):
+            payment_reference = json.loads(request.body)['paymentReference']
+            if payment_reference in outage:
+                return (503, {}, '')
+            return (400 if payment_reference == 'ref-2' else 201, {}, '')
+
+        responses.add_callback(responses.POST, self.enterprise_allocations_url, callback=allocation_callback)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        path = self.write_jsonl('allocations.jsonl', 5)
+        checkpoint_path = self.path('checkpoint.json')
+
+        stats = AllocationIngest(client, checkpoint_path=checkpoint_path).run(read_allocation_records(path))
+        self.assertEqual(stats, {'sent': 5, 'succeeded': 2, 'failed': 3, 'retryable': 2, 'skipped': 0})
+        checkpoint = Checkpoint(checkpoint_path)
+        self.assertEqual((checkpoint.offset, checkpoint.completed, checkpoint.retry), (5, set(), {1, 3}))
+
+        outage.clear()
+        first_run_calls = len(responses.calls)
+        stats = AllocationIngest(client, checkpoint_path=checkpoint_path).run(read_allocation_records(path))
+
+        self.assertEqual(stats, {'sent': 2, 'succeeded': 2, 'failed': 0, 'retryable': 0, 'skipped': 3})
+        self.assertEqual(sorted(self.sent_references()[first_run_calls:]), ['ref-1', 'ref-3'])
+        checkpoint = Checkpoint(checkpoint_path)
+        self.assertEqual((checkpoint.offset, checkpoint.completed, checkpoint.retry), (5, set(), set()))
+
+    def test_transient_failure_keeps_checkpoint_small(self):
+        def create_enterprise_allocation(**kwargs):
+            if kwargs['payment_reference'] == 'ref-0':
+                response = mock.Mock(status_code=503)
+                raise HTTPError('Service Unavailable', response=response)
+
+        client = mock.Mock(create_enterprise_allocation=create_enterprise_allocation)
+        checkpoint_path = self.path('checkpoint.json')
+        ingest = AllocationIngest(client, checkpoint_path=checkpoint_path, max_in_flight=4)
+        largest = {'finished': 0, 'completed': 0}
+        mark_complete = ingest.checkpoint.mark_complete
+
+        def track_size(index, payment_reference):
+            mark_complete(index, payment_reference)
+            finished = ingest.checkpoint._finished  # pylint: disable=protected-access
+            largest['finished'] = max(largest['finished'], len(finished))
+            largest['completed'] = max(largest['completed'], len(ingest.checkpoint.completed))
+
+        allocations = (dict(ALLOCATION, payment_reference=f'ref-{index}') for index in range(5000))
+        with mock.patch.object(ingest.checkpoint, 'mark_complete', side_effect=track_size), \
+                mock.patch('getsmarter_api_clients.ingest.os.replace', wraps=os.replace) as mock_replace:
+            stats = ingest.run(allocations)
+
+        self.assertEqual(stats, {'sent': 5000, 'succeeded': 4999, 'failed': 1, 'retryable': 1, 'skipped': 0})
+        self.assertLessEqual(largest['finished'], 8)
+        self.assertLessEqual(largest['completed'], 8)
+        self.assertLessEqual(mock_replace.call_count, 5000 // ingest.checkpoint.save_every + 1)
+        with open(checkpoint_path, encoding='utf-8') as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file), {'offset': 5000, 'completed': [], 'retry': [0]})
+
+    def test_checkpoint_stays_compact(self):
+        checkpoint = Checkpoint(self.path('checkpoint.json'))
+        checkpoint.mark_complete(1, 'ref-1')
+        checkpoint.mark_complete(2, 'ref-2')
+        self.assertEqual((checkpoint.offset, checkpoint.completed), (0, {'ref-1', 'ref-2'}))
+
+        checkpoint.mark_complete(0, 'ref-0')
+        self.assertEqual((checkpoint.offset, checkpoint.completed), (3, set()))
+
+    def test_checkpoint_saves_periodically(self):
+        checkpoint_path = self.path('checkpoint.json')
+        checkpoint = Checkpoint(checkpoint_path, save_every=2, save_interval=60)
+        checkpoint.mark_complete(0, 'ref-0')
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+        checkpoint.mark_retry(1)
+        self.assertEqual(Checkpoint(checkpoint_path).offset, 2)
+        self.assertEqual(Checkpoint(checkpoint_path).retry, {1})
+
+    @responses.activate
+    def test_main(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        path = self.write_jsonl('allocations.jsonl', 3)
+
+        exit_code = main([
+            path,
+            '--client-id', self.client_id,
+            '--client-secret', self.client_secret,
+            '--provider-url', self.provider_url,
+            '--api-url', self.api_url,
+        ])
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(len(responses.calls), 3)
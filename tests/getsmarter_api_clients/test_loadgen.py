@@ -0,0 +1,133 @@
+"""
+Tests for the allocation load generator.
+"""
+
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from unittest import mock
+
+import pytz
+import responses
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.loadgen import LoadGenerator, main, percentile, synthetic_allocations
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class LoadGeneratorTests(BaseOAuthApiClientTests):
+    """
+    Tests for replaying allocation workloads.
+    """
+    def setUp(self):
+        super().setUp()
+        self.enterprise_allocations_url = f'{self.api_url}/enterprise_allocations'
+        self.cancel_url = f'{self.api_url}/enterprise_allocations/cancel'
+
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+        self.client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_synthetic_allocations_are_distinct(self):
+        first, second = islice(synthetic_allocations(), 2)
+        self.assertNotEqual(first['payment_reference'], second['payment_reference'])
+
+    @responses.activate
+    def test_mixes_creates_and_cancels(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201, json={'orderUuid': 'order-1'})
+        responses.add(responses.POST, self.cancel_url, status=204)
+        load_generator = LoadGenerator(self.client, rate=1000, cancel_ratio=0.5, seed=3)
+
+        report = load_generator.run(synthetic_allocations(), count=40)
+
+        self.assertEqual(report['requests'], 40)
+        self.assertEqual(sum(report['operations'].values()), 40)
+        self.assertGreater(report['operations']['cancel'], 0)
+        self.assertGreater(report['operations']['create'], 0)
+        self.assertEqual(
+            report['outcomes'], {'201': report['operations']['create'], '204': report['operations']['cancel']}
+        )
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['latency_histogram'][-1], {'le_ms': '+Inf', 'count': 40})
+        cancelled = [
+            json.loads(call.request.body)['orderUuid']
+            for call in responses.calls if call.request.url == self.cancel_url
+        ]
+        self.assertIn('order-1', cancelled)
+
+    @responses.activate
+    def test_reports_errors_by_outcome(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201, json={})
+        responses.add(responses.POST, self.enterprise_allocations_url, status=503)
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201, json={})
+
+        report = LoadGenerator(self.client, rate=1000).run(synthetic_allocations(), count=3)
+
+        self.assertEqual(report['outcomes'], {'201': 2, 'http_503': 1})
+        self.assertEqual(report['errors'], 1)
+
+    @responses.activate
+    def test_latency_includes_queuing_delay(self):
+        def slow_response(request):  # pylint: disable=unused-argument
+            time.sleep(0.05)
+            return 201, {}, '{}'
+
+        responses.add_callback(responses.POST, self.enterprise_allocations_url, callback=slow_response)
+
+        # Four requests are due within 4ms but only one can be sent at a time,
+        # so the last one waits for the three before it.
+        report = LoadGenerator(self.client, rate=1000, max_in_flight=1).run(synthetic_allocations(), count=4)
+
+        self.assertGreaterEqual(report['latency_ms']['max'], 190)
+        self.assertLess(report['latency_ms']['p50'], report['latency_ms']['max'])
+
+    @responses.activate
+    def test_stops_after_duration(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201, json={})
+
+        report = LoadGenerator(self.client, rate=100).run(synthetic_allocations(), duration=0.1)
+
+        self.assertEqual(report['requests'], 10)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.client, rate=0)
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.client, rate=1, cancel_ratio=2)
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.client, rate=1).run(synthetic_allocations())
+
+    @responses.activate
+    def test_main(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201, json={})
+
+        with mock.patch('builtins.print') as mock_print:
+            exit_code = main([
+                '--rate', '1000',
+                '--requests', '5',
+                '--client-id', self.client_id,
+                '--client-secret', self.client_secret,
+                '--provider-url', self.provider_url,
+                '--api-url', self.api_url,
+            ])
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(mock_print.call_args[0][0])['outcomes'], {'201': 5})
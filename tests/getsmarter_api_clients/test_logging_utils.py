@@ -0,0 +1,131 @@
+"""
+Tests for the allocation logging helpers.
+"""
+
+import logging
+from datetime import datetime
+from unittest import TestCase, mock
+
+import pytz
+import responses
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.logging_utils import LazyText, SamplingFilter, enable_queue_logging, truncate_body
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class ListHandler(logging.Handler):
+    """
+    Handler that keeps the formatted messages it emits.
+    """
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class LoggingUtilsTests(TestCase):
+    """
+    Tests for the logging helpers.
+    """
+    def test_truncate_body(self):
+        self.assertEqual(truncate_body('abcdef', 10), 'abcdef')
+        self.assertEqual(truncate_body('abcdef', 2), 'ab... [4 more characters]')
+        self.assertEqual(truncate_body('abcdef', None), 'abcdef')
+
+    def test_lazy_text_not_built_when_level_disabled(self):
+        test_logger = logging.getLogger('tests.lazy_text')
+        test_logger.setLevel(logging.WARNING)
+        self.addCleanup(test_logger.setLevel, logging.NOTSET)
+        build = mock.Mock(return_value='payload')
+
+        test_logger.info('payload: %s', LazyText(build))
+        build.assert_not_called()
+
+        with self.assertLogs(test_logger, level='WARNING') as logs:
+            test_logger.warning('payload: %s', LazyText(build))
+        self.assertEqual(logs.records[0].getMessage(), 'payload: payload')
+
+    @mock.patch('getsmarter_api_clients.logging_utils.random.random')
+    def test_sampling_filter(self, mock_random):
+        sampling_filter = SamplingFilter({logging.INFO: 0.25})
+        info_record = logging.LogRecord('name', logging.INFO, __file__, 1, 'message', None, None)
+        error_record = logging.LogRecord('name', logging.ERROR, __file__, 1, 'message', None, None)
+
+        mock_random.return_value = 0.1
+        self.assertTrue(sampling_filter.filter(info_record))
+        mock_random.return_value = 0.5
+        self.assertFalse(sampling_filter.filter(info_record))
+        self.assertTrue(sampling_filter.filter(error_record))
+
+    def test_enable_queue_logging(self):
+        test_logger = logging.getLogger('tests.queue_logging')
+        test_logger.setLevel(logging.INFO)
+        handler = ListHandler()
+        test_logger.addHandler(handler)
+        self.addCleanup(setattr, test_logger, 'propagate', True)
+        self.addCleanup(test_logger.handlers.clear)
+
+        listener = enable_queue_logging('tests.queue_logging', sample_rates={logging.DEBUG: 0})
+        test_logger.info('order %s', 'GS-1')
+        test_logger.debug('dropped')
+        listener.stop()
+
+        self.assertEqual(handler.messages, ['order GS-1'])
+        self.assertNotIn(handler, test_logger.handlers)
+        self.assertFalse(test_logger.propagate)
+
+    def test_full_queue_drops_records(self):
+        test_logger = logging.getLogger('tests.full_queue')
+        test_logger.setLevel(logging.INFO)
+        handler = ListHandler()
+        self.addCleanup(setattr, test_logger, 'propagate', True)
+        self.addCleanup(test_logger.handlers.clear)
+
+        listener = enable_queue_logging('tests.full_queue', handlers=[handler], maxsize=1)
+        listener.stop()
+        test_logger.info('queued')
+        test_logger.info('dropped')
+
+        self.assertEqual(listener.queue.qsize(), 1)
+
+
+class AllocationLoggingTests(BaseOAuthApiClientTests):
+    """
+    Tests for the logging done by GetSmarterEnterpriseApiClient.
+    """
+    def setUp(self):
+        super().setUp()
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+    @responses.activate
+    def test_error_body_truncated(self):
+        responses.add(responses.POST, f'{self.api_url}/enterprise_allocations', status=400, body='x' * 5000)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, max_logged_body_length=100)
+
+        with self.assertLogs('getsmarter_api_clients.geag', level='INFO') as logs:
+            with self.assertRaises(HTTPError):
+                client.create_enterprise_allocation(
+                    **test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+                )
+
+        info_record, error_record = logs.records
+        self.assertEqual(info_record.payment_reference, 'payment_reference')
+        self.assertIn("'orgId': '12KJ2j9js0'", info_record.getMessage())
+        self.assertEqual(error_record.status_code, 400)
+        self.assertIn('x' * 100 + '... [4900 more characters]', error_record.getMessage())
+        self.assertNotIn('x' * 101, error_record.getMessage())
@@ -0,0 +1,136 @@
+"""
+Tests for request metrics, against the local stand-in server.
+"""
+
+import json
+from unittest import TestCase
+
+import responses
+from edx_django_utils.cache import TieredCache
+
+from getsmarter_api_clients.metrics import (
+    CONNECTIONS,
+    REQUEST_DURATION,
+    REQUEST_PHASE_DURATION,
+    REQUESTS,
+    Histogram,
+    MetricsRegistry,
+    time_phase,
+    timed_request,
+)
+from getsmarter_api_clients.oauth import OAuthApiClient
+from test_utils.stand_in import StandInServer
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class MetricsRegistryTests(TestCase):
+    """
+    Tests for Histogram and MetricsRegistry.
+    """
+    def test_histogram(self):
+        histogram = Histogram(buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.snapshot(), ([2, 3, 4], 5.65, 4))
+
+    def test_time_phase_without_timer(self):
+        with time_phase('connect'):
+            pass
+
+    def test_time_phase_accumulates(self):
+        with timed_request() as timer:
+            with time_phase('connect'):
+                pass
+            with time_phase('connect'):
+                pass
+        self.assertEqual(list(timer.phases), ['connect'])
+        self.assertGreater(timer.phases['connect'], 0)
+
+    def test_render(self):
+        registry = MetricsRegistry(buckets=(0.1, 1))
+        registry.observe(REQUEST_DURATION, 0.5, endpoint='terms')
+        registry.increment(REQUESTS, endpoint='terms', outcome='200')
+        registry.increment(REQUESTS, endpoint='terms', outcome='200')
+
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP getsmarter_api_client_requests_total Client requests by outcome.',
+            '# TYPE getsmarter_api_client_requests_total counter',
+            'getsmarter_api_client_requests_total{endpoint="terms",outcome="200"} 2',
+            '# HELP getsmarter_api_client_request_duration_seconds '
+            'Time taken by client requests, including authentication and retries.',
+            '# TYPE getsmarter_api_client_request_duration_seconds histogram',
+            'getsmarter_api_client_request_duration_seconds_bucket{endpoint="terms",le="0.1"} 0',
+            'getsmarter_api_client_request_duration_seconds_bucket{endpoint="terms",le="1"} 1',
+            'getsmarter_api_client_request_duration_seconds_bucket{endpoint="terms",le="+Inf"} 1',
+            'getsmarter_api_client_request_duration_seconds_sum{endpoint="terms"} 0.5',
+            'getsmarter_api_client_request_duration_seconds_count{endpoint="terms"} 1',
+        ])
+
+    def test_label_values_escaped(self):
+        registry = MetricsRegistry()
+        registry.increment(REQUESTS, endpoint='a"b\\c', outcome='200')
+
+        self.assertIn('endpoint="a\\"b\\\\c"', registry.render())
+
+
+class RequestMetricsTests(BaseOAuthApiClientTests):
+    """
+    Tests for the metrics recorded by OAuthApiClient.
+    """
+    def setUp(self):
+        super().setUp()
+        TieredCache.dangerous_clear_all_tiers()
+        self.addCleanup(TieredCache.dangerous_clear_all_tiers)
+
+        self.server = StandInServer(latency=0.02).start()
+        self.addCleanup(self.server.stop)
+        self.registry = MetricsRegistry()
+        self.client = OAuthApiClient(
+            **{**self.mock_constructor_args, 'provider_url': 'https://provider-url.com', 'api_url': self.server.url},
+            metrics=self.registry,
+        )
+        self.addCleanup(self.client.close)
+
+    def get_phase(self, phase, endpoint='terms'):
+        return self.registry.get_histogram(REQUEST_PHASE_DURATION, endpoint=endpoint, phase=phase)
+
+    @responses.activate
+    def test_records_phases(self):
+        responses.add_passthru(self.server.url)
+        responses.add(
+            responses.POST,
+            'https://provider-url.com/oauth2/token',
+            body=json.dumps({'access_token': 'abcd', 'expires_in': 3600}),
+        )
+
+        for _ in range(3):
+            self.client.get(f'{self.server.url}/terms').raise_for_status()
+
+        self.assertEqual(self.registry.get_histogram(REQUEST_DURATION, endpoint='terms').count, 3)
+        self.assertEqual(self.get_phase('token_fetch').count, 1)
+        self.assertEqual(self.get_phase('token_cache_lookup').count, 3)
+        self.assertEqual(self.get_phase('connect').count, 1)
+        self.assertEqual(self.get_phase('pool_acquire').count, 3)
+        self.assertEqual(self.get_phase('body_read').count, 3)
+        ttfb = self.get_phase('ttfb')
+        self.assertEqual(ttfb.count, 3)
+        # The stand-in's latency is spent waiting for the response headers.
+        self.assertGreaterEqual(ttfb.sum, 0.06)
+        self.assertEqual(self.registry.get_counter(CONNECTIONS, endpoint='terms', state='created'), 1)
+        self.assertEqual(self.registry.get_counter(CONNECTIONS, endpoint='terms', state='reused'), 2)
+        self.assertEqual(self.registry.get_counter(REQUESTS, endpoint='terms', outcome='200'), 3)
+
+    @responses.activate
+    def test_records_failures(self):
+        responses.add(
+            responses.POST,
+            'https://provider-url.com/oauth2/token',
+            body=json.dumps({'access_token': 'abcd', 'expires_in': 3600}),
+        )
+        self.server.stop()
+
+        with self.assertRaises(Exception):
+            self.client.get(f'{self.server.url}/terms')
+
+        self.assertEqual(self.registry.get_counter(REQUESTS, endpoint='terms', outcome='ConnectionError'), 1)
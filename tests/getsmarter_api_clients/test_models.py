@@ -0,0 +1,107 @@
+"""
+Tests for the allocation request models.
+"""
+
+from unittest import TestCase
+
+import ddt
+
+from getsmarter_api_clients.models import AllocationRequest, EnterpriseAllocationRequest, to_camel_case
+from tests.getsmarter_api_clients import test_geag
+
+
+@ddt.ddt
+class AllocationRequestModelTests(TestCase):
+    """
+    Tests for AllocationRequest and EnterpriseAllocationRequest.
+    """
+    ENTERPRISE_ALLOCATION_PAYLOAD = test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+
+    @ddt.data(
+        ('email', 'email'),
+        ('address_line1', 'addressLine1'),
+        ('education_highest_level', 'educationHighestLevel'),
+        ('org_id', 'orgId'),
+    )
+    @ddt.unpack
+    def test_to_camel_case(self, name, expected):
+        self.assertEqual(to_camel_case(name), expected)
+
+    def test_field_mapping(self):
+        self.assertEqual(len(EnterpriseAllocationRequest.field_mapping), 22)
+        self.assertEqual(
+            EnterpriseAllocationRequest.field_mapping['enterprise_customer_uuid'], 'enterpriseCustomerUuid'
+        )
+        self.assertEqual(AllocationRequest.field_mapping['address_line2'], 'addressLine2')
+
+    def test_to_payload(self):
+        allocation_request = EnterpriseAllocationRequest(**self.ENTERPRISE_ALLOCATION_PAYLOAD)
+
+        payload = allocation_request.to_payload()
+
+        self.assertEqual(payload['paymentReference'], 'payment_reference')
+        self.assertEqual(
+            payload['enterpriseCustomerUuid'], self.ENTERPRISE_ALLOCATION_PAYLOAD['enterprise_customer_uuid']
+        )
+        self.assertEqual(payload['dataShareConsent'], self.ENTERPRISE_ALLOCATION_PAYLOAD['data_share_consent'])
+        self.assertNotIn('addressLine2', payload)
+        self.assertEqual(list(payload)[:3], ['paymentReference', 'enterpriseCustomerUuid', 'firstName'])
+
+    def test_falsy_values_are_kept(self):
+        allocation_request = EnterpriseAllocationRequest(
+            **{**self.ENTERPRISE_ALLOCATION_PAYLOAD, 'data_share_consent': False, 'address_line2': ''}
+        )
+
+        payload = allocation_request.to_payload()
+
+        self.assertIs(payload['dataShareConsent'], False)
+        self.assertEqual(payload['addressLine2'], '')
+
+    def test_payload_for_logging(self):
+        allocation_request = AllocationRequest(
+            payment_reference='GS-12304',
+            address_line1='10 Lovely Street',
+            city='Cape Town',
+            postal_code='7570',
+            country='South Africa',
+            country_code='ZA',
+            first_name='Jan',
+            last_name='Pan',
+            email='janpan@gs.com',
+            date_of_birth='2021-05-12',
+            terms_accepted_at='2021-05-21T17:32:28Z',
+            currency='ZAR',
+            order_items=[{'productId': 'product_id', 'quantity': 1}],
+        )
+
+        self.assertEqual(
+            allocation_request.payload_for_logging(),
+            {'paymentReference': 'GS-12304', 'orderItems': [{'productId': 'product_id', 'quantity': 1}]},
+        )
+        enterprise_allocation_request = EnterpriseAllocationRequest(
+            **{**self.ENTERPRISE_ALLOCATION_PAYLOAD, 'org_id': None}
+        )
+        self.assertEqual(
+            list(enterprise_allocation_request.payload_for_logging().items())[1:3],
+            [
+                ('enterpriseCustomerUuid', self.ENTERPRISE_ALLOCATION_PAYLOAD['enterprise_customer_uuid']),
+                ('orgId', None),
+            ],
+        )
+
+    def test_slots(self):
+        allocation_request = EnterpriseAllocationRequest(**self.ENTERPRISE_ALLOCATION_PAYLOAD)
+
+        self.assertFalse(hasattr(allocation_request, '__dict__'))
+        with self.assertRaises(AttributeError):
+            allocation_request.unknown_field = 'value'  # pylint: disable=assigning-non-slot
+
+    def test_equality(self):
+        self.assertEqual(
+            EnterpriseAllocationRequest(**self.ENTERPRISE_ALLOCATION_PAYLOAD),
+            EnterpriseAllocationRequest(**self.ENTERPRISE_ALLOCATION_PAYLOAD),
+        )
+        self.assertNotEqual(
+            EnterpriseAllocationRequest(**self.ENTERPRISE_ALLOCATION_PAYLOAD),
+            EnterpriseAllocationRequest(**{**self.ENTERPRISE_ALLOCATION_PAYLOAD, 'payment_reference': 'other'}),
+        )
@@ -0,0 +1,124 @@
+"""
+Tests for the edx_django_utils monitoring integration.
+"""
+
+import json
+from unittest import mock
+
+import responses
+from edx_django_utils.cache import TieredCache
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.retry import RetryPolicy
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class MonitoringTests(BaseOAuthApiClientTests):
+    """
+    Tests for the custom attributes and spans reported by monitored clients.
+    """
+    def setUp(self):
+        super().setUp()
+        TieredCache.dangerous_clear_all_tiers()
+        self.addCleanup(TieredCache.dangerous_clear_all_tiers)
+
+        self.mock_set_custom_attribute = self.patch_monitoring('set_custom_attribute')
+        self.mock_accumulate = self.patch_monitoring('accumulate')
+        self.mock_function_trace = self.patch_monitoring('function_trace')
+
+        self.terms_url = f'{self.api_url}/terms'
+
+    def patch_monitoring(self, name):
+        """
+        Patch the named edx_django_utils.monitoring function for the test.
+        """
+        patcher = mock.patch(f'edx_django_utils.monitoring.{name}')
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def add_token_response(self):
+        responses.add(
+            responses.POST,
+            f'{self.provider_url}/oauth2/token',
+            body=json.dumps({'access_token': 'abcd', 'expires_in': 3600}),
+        )
+
+    def get_attributes(self):
+        return {args[0]: args[1] for args, _ in self.mock_set_custom_attribute.call_args_list}
+
+    def get_traced_functions(self):
+        return [args[0] for args, _ in self.mock_function_trace.call_args_list]
+
+    @responses.activate
+    def test_disabled_by_default(self):
+        self.add_token_response()
+        responses.add(responses.GET, self.terms_url, json={})
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+        client.get_terms_and_policies()
+
+        self.mock_set_custom_attribute.assert_not_called()
+        self.mock_function_trace.assert_not_called()
+
+    @responses.activate
+    def test_sets_request_attributes(self):
+        self.add_token_response()
+        responses.add(responses.GET, self.terms_url, json={})
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, monitoring=True)
+
+        client.get_terms_and_policies()
+        attributes = self.get_attributes()
+        self.assertEqual(attributes['geag.endpoint'], 'terms')
+        self.assertEqual(attributes['geag.status'], 200)
+        self.assertEqual(attributes['geag.attempts'], 1)
+        self.assertEqual(attributes['geag.token_cache'], 'miss')
+        self.assertGreaterEqual(attributes['geag.elapsed_ms'], 0)
+        self.assertEqual(self.get_traced_functions(), ['getsmarter_api_clients.fetch_access_token'])
+
+        self.mock_set_custom_attribute.reset_mock()
+        client.get_terms_and_policies()
+        self.assertEqual(self.get_attributes()['geag.token_cache'], 'hit')
+        self.mock_accumulate.assert_any_call('geag.calls', 1)
+        self.assertEqual(self.mock_accumulate.call_count, 4)
+
+    @responses.activate
+    def test_counts_retried_attempts(self):
+        self.add_token_response()
+        responses.add(responses.GET, self.terms_url, status=503)
+        responses.add(responses.GET, self.terms_url, json={})
+        client = GetSmarterEnterpriseApiClient(
+            **self.mock_constructor_args, monitoring=True, retry_policy=RetryPolicy(backoff_base=0)
+        )
+
+        client.get_terms_and_policies()
+
+        self.assertEqual(self.get_attributes()['geag.attempts'], 2)
+
+    @responses.activate
+    def test_traces_allocation_calls(self):
+        self.add_token_response()
+        responses.add(responses.POST, f'{self.api_url}/enterprise_allocations', status=204)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, monitoring=True)
+
+        client.create_enterprise_allocation(
+            **test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+        )
+
+        self.assertEqual(self.get_traced_functions(), [
+            'getsmarter_api_clients.create_enterprise_allocation',
+            'getsmarter_api_clients.fetch_access_token',
+        ])
+        attributes = self.get_attributes()
+        self.assertEqual(attributes['geag.endpoint'], 'enterprise_allocations')
+        self.assertEqual(attributes['geag.status'], 204)
+
+    @responses.activate
+    def test_sets_exception_outcome(self):
+        self.add_token_response()
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, monitoring=True)
+
+        with self.assertRaises(Exception):
+            client.get(self.terms_url)
+
+        self.assertEqual(self.get_attributes()['geag.status'], 'ConnectionError')
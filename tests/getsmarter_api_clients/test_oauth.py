@@ -3,14 +3,19 @@ Tests for the OAuth client.
 """
 
 import json
+import threading
+import time
 from datetime import datetime
 from unittest import TestCase, mock
 
 import ddt
 import pytz
 import responses
+from django.core.cache import cache as django_cache
+from edx_django_utils.cache import TieredCache
 
-from getsmarter_api_clients.oauth import OAuthApiClient
+from getsmarter_api_clients.oauth import TOKEN_REFRESH_RETRY_INTERVAL, OAuthApiClient
+from getsmarter_api_clients.token_cache import InMemoryTokenCache
 
 
 class BaseOAuthApiClientTests(TestCase):
@@ -53,7 +58,7 @@ class OAuthApiClientTests(BaseOAuthApiClientTests):
             status=200,
         )
 
-    @mock.patch('getsmarter_api_clients.oauth.TieredCache')
+    @mock.patch('edx_django_utils.cache.TieredCache')
     @responses.activate
     def test_get_access_token(self, mock_tiered_cache):
         """
@@ -73,7 +78,7 @@ class OAuthApiClientTests(BaseOAuthApiClientTests):
         (True, 'abcd'),
     )
     @ddt.unpack
-    @mock.patch('getsmarter_api_clients.oauth.TieredCache')
+    @mock.patch('edx_django_utils.cache.TieredCache')
     @responses.activate
     def test_cached_access_token(self, is_expired, expected_token, mock_tiered_cache):
         """
@@ -95,3 +100,385 @@ class OAuthApiClientTests(BaseOAuthApiClientTests):
 
         self.assertEqual(len(responses.calls), 1 if is_expired else 0)
         self.assertEqual(access_token, expected_token)
+
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    @responses.activate
+    def test_concurrent_expired_token_fetched_once(self, mock_tiered_cache):
+        """
+        Test that threads racing on an expired token share a single fetch.
+        """
+        cache = {
+            'value': {
+                'access_token': 'bcde',
+                'expires_in': 60,
+                'expires_at': datetime.now(pytz.utc).timestamp() - 60,
+            },
+        }
+        mock_tiered_cache.get_cached_response.side_effect = lambda key: mock.MagicMock(
+            value=cache['value'],
+            is_found=True,
+        )
+        mock_tiered_cache.set_all_tiers.side_effect = lambda key, value, timeout: cache.update(value=value)
+
+        def token_callback(request):  # pylint: disable=unused-argument
+            # Hold the fetch open long enough for every thread to pile up
+            # behind it.
+            time.sleep(0.2)
+            return (200, {}, json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+
+        responses.add_callback(
+            responses.POST,
+            f'{self.provider_url}/oauth2/token',
+            callback=token_callback,
+            content_type='application/json',
+        )
+        client = OAuthApiClient(**self.mock_constructor_args)
+
+        thread_count = 25
+        barrier = threading.Barrier(thread_count)
+        tokens = []
+
+        def get_token():
+            barrier.wait()
+            tokens.append(client._get_access_token())  # pylint: disable=protected-access
+
+        threads = [threading.Thread(target=get_token) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(tokens, ['abcd'] * thread_count)
+        mock_tiered_cache.set_all_tiers.assert_called_once()
+
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    @responses.activate
+    def test_concurrent_token_fetch_failure_shared(self, mock_tiered_cache):
+        """
+        Test that waiting threads get the leader's result when the fetch fails.
+        """
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(is_found=False)
+
+        def token_callback(request):  # pylint: disable=unused-argument
+            time.sleep(0.2)
+            return (500, {}, '')
+
+        responses.add_callback(responses.POST, f'{self.provider_url}/oauth2/token', callback=token_callback)
+        client = OAuthApiClient(**self.mock_constructor_args)
+
+        thread_count = 10
+        barrier = threading.Barrier(thread_count)
+        tokens = []
+
+        def get_token():
+            barrier.wait()
+            tokens.append(client._get_access_token())  # pylint: disable=protected-access
+
+        threads = [threading.Thread(target=get_token) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(tokens, [None] * thread_count)
+
+    @ddt.data(
+        (0.5, 100, True),
+        (0.5, 600, False),
+        (None, 100, False),
+    )
+    @ddt.unpack
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    @responses.activate
+    def test_refresh_ahead(self, refresh_ahead_fraction, seconds_left, expect_refresh, mock_tiered_cache):
+        """
+        Test that a token past the refresh-ahead point is renewed in the
+        background.
+        """
+        cache = {
+            'value': {
+                'access_token': 'bcde',
+                'expires_in': 1000,
+                'expires_at': datetime.now(pytz.utc).timestamp() + seconds_left,
+            },
+        }
+        refreshed = threading.Event()
+        mock_tiered_cache.get_cached_response.side_effect = lambda key: mock.MagicMock(
+            value=cache['value'],
+            is_found=True,
+        )
+
+        def set_all_tiers(key, value, timeout):  # pylint: disable=unused-argument
+            cache['value'] = value
+            refreshed.set()
+
+        mock_tiered_cache.set_all_tiers.side_effect = set_all_tiers
+        self.mock_access_token('abcd')
+        client = OAuthApiClient(**self.mock_constructor_args, refresh_ahead_fraction=refresh_ahead_fraction)
+
+        # The current token is returned without waiting on the token endpoint.
+        self.assertEqual(client._get_access_token(), 'bcde')  # pylint: disable=protected-access
+
+        self.assertEqual(refreshed.wait(timeout=5 if expect_refresh else 0.2), expect_refresh)
+        self.assertEqual(len(responses.calls), 1 if expect_refresh else 0)
+        self.assertEqual(
+            client._get_access_token(),  # pylint: disable=protected-access
+            'abcd' if expect_refresh else 'bcde',
+        )
+
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    @responses.activate
+    def test_failed_refresh_backs_off(self, mock_tiered_cache):
+        """
+        Test that a failed background refresh is not retried on every request.
+        """
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 1000,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 100,
+            },
+            is_found=True
+        )
+        responses.add(responses.POST, f'{self.provider_url}/oauth2/token', status=500)
+        client = OAuthApiClient(**self.mock_constructor_args, refresh_ahead_fraction=0.5)
+
+        def refresh_attempts_after(calls):
+            for _ in range(calls):
+                self.assertEqual(client._get_access_token(), 'bcde')  # pylint: disable=protected-access
+            time.sleep(0.2)
+            return len(responses.calls)
+
+        self.assertEqual(refresh_attempts_after(5), 1)
+        self.assertEqual(refresh_attempts_after(5), 1)
+
+        # Once the retry interval has passed, the next request starts another
+        # refresh.
+        later = time.monotonic() + TOKEN_REFRESH_RETRY_INTERVAL
+        with mock.patch('getsmarter_api_clients.oauth.time.monotonic', return_value=later):
+            self.assertEqual(refresh_attempts_after(1), 2)
+
+    @responses.activate
+    def test_failed_refresh_keeps_memoized_token(self):
+        """
+        Test that a token due for refresh stays local while a refresh fails.
+        """
+        token_cache = InMemoryTokenCache()
+        responses.add(responses.POST, f'{self.provider_url}/oauth2/token', status=500)
+        client = OAuthApiClient(**self.mock_constructor_args, refresh_ahead_fraction=0.5, token_cache=token_cache)
+        token_cache.set(
+            client.access_token_cache_key,
+            {'access_token': 'bcde', 'expires_in': 1000, 'expires_at': datetime.now(pytz.utc).timestamp() + 100},
+            1000,
+        )
+
+        with mock.patch.object(token_cache, 'get', wraps=token_cache.get) as mock_get:
+            for _ in range(1000):
+                self.assertEqual(client._get_access_token(), 'bcde')  # pylint: disable=protected-access
+            time.sleep(0.2)
+
+        self.assertEqual(len(responses.calls), 1)
+        # Only the first request and the failed refresh read the cache, each
+        # looking past the local tier once.
+        self.assertEqual(mock_get.call_count, 4)
+
+    @ddt.data(0, 1, 1.5)
+    def test_refresh_ahead_fraction_validation(self, refresh_ahead_fraction):
+        """
+        Test that refresh_ahead_fraction must lie strictly between 0 and 1.
+        """
+        with self.assertRaises(ValueError):
+            OAuthApiClient(**self.mock_constructor_args, refresh_ahead_fraction=refresh_ahead_fraction)
+
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    def test_memoized_access_token(self, mock_tiered_cache):
+        """
+        Test that the shared cache is checked once the local copy expires.
+        """
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600,
+            },
+            is_found=True
+        )
+        client = OAuthApiClient(**self.mock_constructor_args)
+
+        with mock.patch('getsmarter_api_clients.oauth.time.monotonic', return_value=1000):
+            for _ in range(3):
+                self.assertEqual(client._get_access_token(), 'bcde')  # pylint: disable=protected-access
+        self.assertEqual(mock_tiered_cache.get_cached_response.call_count, 1)
+
+        # Past the local expiry (less the safety margin), the shared cache is
+        # checked again.
+        with mock.patch('getsmarter_api_clients.oauth.time.monotonic', return_value=1000 + 595):
+            self.assertEqual(client._get_access_token(), 'bcde')  # pylint: disable=protected-access
+        self.assertEqual(mock_tiered_cache.get_cached_response.call_count, 2)
+
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    @responses.activate
+    def test_token_expiry_margin(self, mock_tiered_cache):
+        """
+        Test that a cached token inside the safety margin counts as expired.
+        """
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 60,
+            },
+            is_found=True
+        )
+        self.mock_access_token('abcd')
+        client = OAuthApiClient(**self.mock_constructor_args, token_expiry_margin=120)
+
+        self.assertEqual(client._get_access_token(), 'abcd')  # pylint: disable=protected-access
+        self.assertEqual(len(responses.calls), 1)
+
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    @responses.activate
+    def test_authentication_headers(self, mock_tiered_cache):
+        """
+        Test that requests carry the bearer token and the browser user agent.
+        """
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600,
+            },
+            is_found=True
+        )
+        responses.add(responses.GET, f'{self.api_url}/terms', status=200)
+        client = OAuthApiClient(**self.mock_constructor_args)
+
+        client.get(f'{self.api_url}/terms')
+        client.get(f'{self.api_url}/terms')
+
+        self.assertEqual(len(responses.calls), 2)
+        for call in responses.calls:
+            self.assertEqual(call.request.headers['Authorization'], 'Bearer bcde')
+            self.assertEqual(call.request.headers['User-Agent'], 'Mozilla/5.0')
+
+
+class OAuthApiClientTokenLeaseTests(BaseOAuthApiClientTests):
+    """
+    Tests for the cross-process token fetch lease.
+
+    They run against the local in-memory cache backend.
+    """
+    def setUp(self):
+        super().setUp()
+        TieredCache.dangerous_clear_all_tiers()
+        self.addCleanup(TieredCache.dangerous_clear_all_tiers)
+        self.token_url = f'{self.provider_url}/oauth2/token'
+
+    def _token_response(self, token):
+        return {
+            'access_token': token,
+            'expires_in': 300,
+            'expires_at': datetime.now(pytz.utc).timestamp() + 300,
+        }
+
+    @responses.activate
+    def test_lease_winner_fetches_token(self):
+        """
+        Test that the process winning the lease fetches the token.
+
+        The lease is released once the token is cached.
+        """
+        responses.add(responses.POST, self.token_url, body=json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+        client = OAuthApiClient(**self.mock_constructor_args, token_fetch_lease_timeout=10)
+
+        self.assertEqual(client._get_access_token(), 'abcd')  # pylint: disable=protected-access
+        self.assertEqual(len(responses.calls), 1)
+        self.assertIsNone(django_cache.get(client.access_token_lease_cache_key))
+        self.assertEqual(TieredCache.get_cached_response(client.access_token_cache_key).value['access_token'], 'abcd')
+
+    @responses.activate
+    def test_expired_lease_not_released(self):
+        """
+        Test that a fetch outliving its lease spares the lease another took.
+        """
+        client = OAuthApiClient(**self.mock_constructor_args, token_fetch_lease_timeout=10)
+
+        def token_callback(request):  # pylint: disable=unused-argument
+            # The lease expires mid-fetch and another worker process takes it.
+            django_cache.delete(client.access_token_lease_cache_key)
+            self.assertTrue(django_cache.add(client.access_token_lease_cache_key, 'other-process', 10))
+            return (200, {}, json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+
+        responses.add_callback(responses.POST, self.token_url, callback=token_callback)
+
+        self.assertEqual(client._get_access_token(), 'abcd')  # pylint: disable=protected-access
+        self.assertEqual(django_cache.get(client.access_token_lease_cache_key), 'other-process')
+
+    @responses.activate
+    def test_lease_loser_polls_for_token(self):
+        """
+        Test that a process losing the lease waits for the winner's token.
+        """
+        responses.add(responses.POST, self.token_url, body=json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+        client = OAuthApiClient(**self.mock_constructor_args, token_fetch_lease_timeout=10)
+
+        # Another worker process holds the lease and publishes its token a
+        # little later.
+        self.assertTrue(django_cache.add(client.access_token_lease_cache_key, True, 10))
+
+        def publish_token():
+            django_cache.set(client.access_token_cache_key, self._token_response('other-process'), 300)
+            django_cache.delete(client.access_token_lease_cache_key)
+
+        timer = threading.Timer(0.2, publish_token)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(client._get_access_token(), 'other-process')  # pylint: disable=protected-access
+        self.assertEqual(len(responses.calls), 0)
+
+    @responses.activate
+    def test_lease_loser_falls_back_after_wait(self):
+        """
+        Test that a process fetches its own token if the holder never delivers.
+        """
+        responses.add(responses.POST, self.token_url, body=json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+        client = OAuthApiClient(
+            **self.mock_constructor_args,
+            token_fetch_lease_timeout=10,
+            token_fetch_lease_wait=0.2,
+        )
+        self.assertTrue(django_cache.add(client.access_token_lease_cache_key, True, 10))
+
+        self.assertEqual(client._get_access_token(), 'abcd')  # pylint: disable=protected-access
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_refresh_after_lease_lost_without_cached_token(self):
+        """
+        Test that a refresh losing the lease gets a token when none is cached.
+        """
+        responses.add(responses.POST, self.token_url, body=json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+        client = OAuthApiClient(
+            **self.mock_constructor_args,
+            token_fetch_lease_timeout=10,
+            token_fetch_lease_wait=0.2,
+        )
+        self.assertTrue(django_cache.add(client.access_token_lease_cache_key, True, 10))
+
+        self.assertEqual(client._fetch_access_token(refresh=True), 'abcd')  # pylint: disable=protected-access
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_lease_disabled_by_default(self):
+        """
+        Test that a held lease is ignored when the lease is not enabled.
+        """
+        responses.add(responses.POST, self.token_url, body=json.dumps({'access_token': 'abcd', 'expires_in': 300}))
+        client = OAuthApiClient(**self.mock_constructor_args)
+        self.assertTrue(django_cache.add(client.access_token_lease_cache_key, True, 10))
+
+        self.assertEqual(client._get_access_token(), 'abcd')  # pylint: disable=protected-access
+        self.assertEqual(len(responses.calls), 1)
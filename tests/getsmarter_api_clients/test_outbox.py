@@ -0,0 +1,230 @@
+"""
+Tests for the SQLite allocation outbox.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from unittest import mock
+
+import pytz
+import requests
+import responses
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.outbox import FAILED, PENDING, SENT, AllocationOutbox
+from getsmarter_api_clients.retry import RetryPolicy
+from getsmarter_api_clients.validation import AllocationValidationError
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class AllocationOutboxTests(BaseOAuthApiClientTests):
+    """
+    Tests for journaling and sending allocations through the outbox.
+    """
+    def setUp(self):
+        super().setUp()
+        self.enterprise_allocations_url = f'{self.api_url}/enterprise_allocations'
+        self.cancel_url = f'{self.api_url}/enterprise_allocations/cancel'
+        self.allocation = test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'outbox.sqlite3')
+
+        self.client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+        self.outbox = self.make_outbox()
+
+    def make_outbox(self, **kwargs):
+        kwargs.setdefault('retry_policy', RetryPolicy(max_attempts=3, backoff_base=0))
+        outbox = AllocationOutbox(self.client, self.path, **kwargs)
+        self.addCleanup(outbox.close)
+        return outbox
+
+    @responses.activate
+    def test_enqueue_only_writes_locally(self):
+        self.assertTrue(self.outbox.create_enterprise_allocation(**self.allocation))
+        self.assertTrue(self.outbox.cancel_enterprise_allocation('order-uuid'))
+
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual(self.outbox.counts(), {PENDING: 2, SENT: 0, FAILED: 0})
+
+    @responses.activate
+    def test_drain_sends_entries(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        responses.add(responses.POST, self.cancel_url, status=204)
+        self.outbox.create_enterprise_allocation(**self.allocation)
+        self.outbox.cancel_enterprise_allocation('order-uuid')
+
+        self.assertEqual(self.outbox.drain(), {'sent': 2, 'retrying': 0, 'failed': 0})
+
+        self.assertEqual(self.outbox.counts(), {PENDING: 0, SENT: 2, FAILED: 0})
+        bodies = {call.request.url: json.loads(call.request.body) for call in responses.calls}
+        self.assertEqual(bodies[self.enterprise_allocations_url]['paymentReference'], 'payment_reference')
+        self.assertEqual(bodies[self.cancel_url], {'orderUuid': 'order-uuid'})
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 0, 'failed': 0})
+
+    @responses.activate
+    def test_drain_sends_allocations(self):
+        allocations_url = f'{self.api_url}/allocations'
+        responses.add(responses.POST, allocations_url, status=201)
+        self.outbox.create_allocation(
+            payment_reference='payment_reference',
+            address_line1='10 Lovely Street',
+            city='Herndon',
+            postal_code='35005',
+            country='country',
+            country_code='country_code',
+            first_name='John',
+            last_name='Smith',
+            email='johnsmith@example.com',
+            date_of_birth='2000-01-01',
+            terms_accepted_at='2022-07-25T10:29:56Z',
+            currency='USD',
+            order_items=self.allocation['order_items'],
+        )
+
+        self.assertEqual(self.outbox.drain(), {'sent': 1, 'retrying': 0, 'failed': 0})
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(responses.calls[0].request.url, allocations_url)
+        body = json.loads(responses.calls[0].request.body)
+        self.assertEqual(body['paymentReference'], 'payment_reference')
+        self.assertEqual(body['addressLine1'], '10 Lovely Street')
+
+    @responses.activate
+    def test_deduplicates(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+
+        self.assertTrue(self.outbox.create_enterprise_allocation(**self.allocation))
+        self.assertFalse(self.outbox.create_enterprise_allocation(**self.allocation))
+        self.outbox.drain()
+        # Still recognised after it was sent, and by another process sharing
+        # the journal.
+        self.assertFalse(self.make_outbox().create_enterprise_allocation(**self.allocation))
+
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_retries_transient_failures(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=503)
+        responses.add(
+            responses.POST, self.enterprise_allocations_url, body=requests.exceptions.ConnectionError('reset')
+        )
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        self.outbox.create_enterprise_allocation(**self.allocation)
+
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 1, 'failed': 0})
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 1, 'failed': 0})
+        self.assertEqual(self.outbox.drain(), {'sent': 1, 'retrying': 0, 'failed': 0})
+
+    @responses.activate
+    def test_gives_up(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=400, body='bad request')
+        responses.add(responses.POST, self.cancel_url, status=503)
+        self.outbox.create_enterprise_allocation(**self.allocation)
+        self.outbox.cancel_enterprise_allocation('order-uuid')
+
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 1, 'failed': 1})
+        self.outbox.drain()
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 0, 'failed': 1})
+
+        failed = self.outbox.failed_entries()
+        self.assertEqual([(entry.dedupe_key, entry.attempts) for entry in failed], [
+            ('payment_reference', 1),
+            ('order-uuid', 3),
+        ])
+        self.assertIn('400', failed[0].last_error)
+
+    @responses.activate
+    def test_failed_entries_can_be_sent_again(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=400, body='bad request')
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        responses.add(responses.POST, self.cancel_url, status=400)
+        responses.add(responses.POST, self.cancel_url, status=204)
+        self.outbox.create_enterprise_allocation(**self.allocation)
+        self.outbox.cancel_enterprise_allocation('order-uuid')
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 0, 'failed': 2})
+
+        # Enqueueing a failed order again replaces the failed entry.
+        self.assertTrue(self.outbox.create_enterprise_allocation(**{**self.allocation, 'first_name': 'Jane'}))
+        self.assertFalse(self.outbox.create_enterprise_allocation(**self.allocation))
+        self.assertEqual(self.outbox.requeue_failed(['order-uuid']), 1)
+        self.assertEqual(self.outbox.requeue_failed(), 0)
+
+        self.assertEqual(self.outbox.drain(), {'sent': 2, 'retrying': 0, 'failed': 0})
+        allocation_calls = [call for call in responses.calls if call.request.url == self.enterprise_allocations_url]
+        self.assertEqual(json.loads(allocation_calls[-1].request.body)['firstName'], 'Jane')
+
+    @responses.activate
+    def test_waits_for_retry_after(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=429, headers={'Retry-After': '60'})
+        self.outbox.create_enterprise_allocation(**self.allocation)
+
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.drain(), {'sent': 0, 'retrying': 0, 'failed': 0})
+        self.assertEqual(len(responses.calls), 1)
+
+    def test_invalid_allocation_not_journaled(self):
+        self.client.validate_allocations = True
+
+        with self.assertRaises(AllocationValidationError):
+            self.outbox.create_enterprise_allocation(**{**self.allocation, 'currency': 'XYZ'})
+
+        self.assertEqual(self.outbox.counts(), {PENDING: 0, SENT: 0, FAILED: 0})
+
+    @responses.activate
+    def test_entries_claimed_by_one_sender(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        self.outbox.create_enterprise_allocation(**self.allocation)
+        other_outbox = self.make_outbox()
+
+        with mock.patch.object(self.outbox, '_record_result', return_value=PENDING):
+            self.outbox.send_batch()
+
+        # The first sender died before recording its result; the entry stays
+        # hidden until the claim times out.
+        self.assertEqual(other_outbox.drain(), {'sent': 0, 'retrying': 0, 'failed': 0})
+        with mock.patch('getsmarter_api_clients.outbox.time.time', return_value=datetime.now().timestamp() + 301):
+            self.assertEqual(other_outbox.drain(), {'sent': 1, 'retrying': 0, 'failed': 0})
+
+    @responses.activate
+    def test_background_sender(self):
+        sent = threading.Event()
+
+        def allocation_created(request):  # pylint: disable=unused-argument
+            sent.set()
+            return 201, {}, ''
+
+        responses.add_callback(responses.POST, self.enterprise_allocations_url, callback=allocation_created)
+        outbox = self.make_outbox(poll_interval=60).start()
+
+        outbox.create_enterprise_allocation(**self.allocation)
+
+        self.assertTrue(sent.wait(5))
+        outbox.stop()
+        self.assertEqual(outbox.counts()[SENT], 1)
+
+    def test_purge_sent(self):
+        outbox = self.make_outbox(sent_retention=0)
+        outbox.cancel_enterprise_allocation('order-uuid')
+        with mock.patch.object(self.client, 'cancel_enterprise_allocation'):
+            outbox.drain()
+
+        self.assertEqual(outbox.counts(), {PENDING: 0, SENT: 0, FAILED: 0})
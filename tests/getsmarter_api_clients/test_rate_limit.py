@@ -0,0 +1,175 @@
+"""
+Tests for the client-side rate limiters.
+"""
+
+from datetime import datetime
+from unittest import TestCase, mock
+
+import pytz
+import responses
+from django.core.cache import cache
+
+from getsmarter_api_clients.oauth import OAuthApiClient
+from getsmarter_api_clients.rate_limit import (
+    DjangoCacheRateLimiter,
+    InProcessRateLimiter,
+    RateLimitExceeded,
+    TokenBucket,
+)
+from getsmarter_api_clients.retry import RetryPolicy
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+class FakeClockMixin:
+    """
+    Patch the rate limiters' clocks and sleep so that sleeping advances time.
+    """
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        for name in ('monotonic', 'time'):
+            patcher = mock.patch(f'getsmarter_api_clients.rate_limit.time.{name}', side_effect=lambda: self.now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        sleep_patcher = mock.patch('getsmarter_api_clients.rate_limit.time.sleep', side_effect=self.sleep)
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTests(FakeClockMixin, TestCase):
+    """
+    Tests for TokenBucket.
+    """
+    def test_refills_at_rate(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+
+        self.assertEqual(bucket.try_take(), 0)
+        self.assertEqual(bucket.try_take(), 0)
+        self.assertAlmostEqual(bucket.try_take(), 0.5)
+
+        self.now += 0.5
+        self.assertEqual(bucket.try_take(), 0)
+
+    def test_capacity_caps_burst(self):
+        bucket = TokenBucket(rate=1, capacity=1)
+        self.now += 60
+
+        self.assertEqual(bucket.try_take(), 0)
+        self.assertAlmostEqual(bucket.try_take(), 1)
+
+
+class InProcessRateLimiterTests(FakeClockMixin, TestCase):
+    """
+    Tests for InProcessRateLimiter.
+    """
+    def test_blocks_until_capacity(self):
+        limiter = InProcessRateLimiter({'enterprise_allocations': 2})
+
+        for _ in range(6):
+            limiter.acquire('enterprise_allocations')
+
+        self.assertAlmostEqual(self.now, 1002.0)
+
+    def test_fail_fast(self):
+        limiter = InProcessRateLimiter({'enterprise_allocations': 1}, block=False)
+        limiter.acquire('enterprise_allocations')
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire('enterprise_allocations')
+        self.mock_sleep.assert_not_called()
+
+    def test_max_wait(self):
+        limiter = InProcessRateLimiter({'enterprise_allocations': 1}, max_wait=0.5)
+        limiter.acquire('enterprise_allocations')
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire('enterprise_allocations')
+
+    def test_per_endpoint_limits(self):
+        limiter = InProcessRateLimiter({'enterprise_allocations': 1}, block=False)
+        limiter.acquire('enterprise_allocations')
+
+        # Other endpoints are unlimited without a default limit.
+        for _ in range(10):
+            limiter.acquire('terms')
+
+        limiter = InProcessRateLimiter(default_limit=1, block=False)
+        limiter.acquire('terms')
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire('terms')
+
+
+class DjangoCacheRateLimiterTests(FakeClockMixin, TestCase):
+    """
+    Tests for DjangoCacheRateLimiter.
+    """
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_limit_shared_between_instances(self):
+        # Each instance stands in for a different process sharing the cache.
+        first = DjangoCacheRateLimiter({'enterprise_allocations': 2}, block=False)
+        second = DjangoCacheRateLimiter({'enterprise_allocations': 2}, block=False)
+
+        first.acquire('enterprise_allocations')
+        second.acquire('enterprise_allocations')
+        with self.assertRaises(RateLimitExceeded):
+            first.acquire('enterprise_allocations')
+
+    def test_blocks_until_next_window(self):
+        limiter = DjangoCacheRateLimiter({'enterprise_allocations': 1})
+        self.now = 1000.25
+
+        limiter.acquire('enterprise_allocations')
+        limiter.acquire('enterprise_allocations')
+
+        self.assertAlmostEqual(self.now, 1001.0)
+
+
+class RateLimitedRequestTests(BaseOAuthApiClientTests):
+    """
+    Tests for requests sent with a rate limiter.
+    """
+    def setUp(self):
+        super().setUp()
+        self.url = f'{self.api_url}/terms'
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+    @responses.activate
+    def test_request_fails_fast_when_over_limit(self):
+        responses.add(responses.GET, self.url, json={})
+        client = OAuthApiClient(
+            **self.mock_constructor_args,
+            rate_limiter=InProcessRateLimiter({'terms': 1}, block=False),
+        )
+
+        client.get(self.url)
+        with self.assertRaises(RateLimitExceeded):
+            client.get(self.url)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    @mock.patch('getsmarter_api_clients.oauth.time.sleep')
+    def test_retries_take_capacity(self, _mock_sleep):
+        responses.add(responses.GET, self.url, status=503)
+        responses.add(responses.GET, self.url, json={})
+        limiter = mock.Mock()
+        client = OAuthApiClient(**self.mock_constructor_args, rate_limiter=limiter, retry_policy=RetryPolicy())
+
+        client.get(f'{self.url}?page=1')
+
+        self.assertEqual(limiter.acquire.call_args_list, [mock.call('terms'), mock.call('terms')])
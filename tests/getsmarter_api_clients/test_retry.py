@@ -0,0 +1,215 @@
+"""
+Tests for the retry policy and retrying requests.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import TestCase, mock
+
+import ddt
+import pytz
+import requests
+import responses
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.oauth import OAuthApiClient
+from getsmarter_api_clients.retry import RetryPolicy, parse_retry_after
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+@ddt.ddt
+class RetryPolicyTests(TestCase):
+    """
+    Tests for RetryPolicy.
+    """
+    @ddt.data(
+        ('GET', None, True),
+        ('get', None, True),
+        ('POST', None, False),
+        ('POST', 'GS-12304', True),
+    )
+    @ddt.unpack
+    def test_allows_retries(self, method, idempotency_key, expected):
+        self.assertEqual(RetryPolicy().allows_retries(method, idempotency_key), expected)
+
+    @ddt.data(1, 2, 3, 10)
+    def test_backoff_bounds(self, attempt):
+        policy = RetryPolicy(backoff_base=0.5, backoff_max=2)
+        for _ in range(50):
+            self.assertLessEqual(policy.backoff(attempt), min(2, 0.5 * 2 ** (attempt - 1)))
+
+    def test_get_delay_honours_retry_after(self):
+        response = mock.Mock(headers={'Retry-After': '7'})
+        self.assertEqual(RetryPolicy().get_delay(1, response), 7)
+        self.assertLessEqual(RetryPolicy(respect_retry_after=False).get_delay(1, response), 0.5)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+        self.assertAlmostEqual(parse_retry_after(format_datetime(retry_at, usegmt=True)), 30, delta=2)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+
+
+@ddt.ddt
+class RetryingRequestTests(BaseOAuthApiClientTests):
+    """
+    Tests for requests sent with a retry policy.
+    """
+    def setUp(self):
+        super().setUp()
+        self.url = f'{self.api_url}/terms'
+
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+        sleep_patcher = mock.patch('getsmarter_api_clients.oauth.time.sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def make_client(self, client_class=OAuthApiClient, **policy_kwargs):
+        return client_class(**self.mock_constructor_args, retry_policy=RetryPolicy(**policy_kwargs))
+
+    @responses.activate
+    def test_retries_transient_statuses(self):
+        responses.add(responses.GET, self.url, status=503)
+        responses.add(responses.GET, self.url, status=429, headers={'Retry-After': '2'})
+        responses.add(responses.GET, self.url, status=200)
+        client = self.make_client()
+
+        response = client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.attempts, 3)
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(self.mock_sleep.call_args_list[1], mock.call(2.0))
+
+    @responses.activate
+    def test_gives_up_after_max_attempts(self):
+        for _ in range(3):
+            responses.add(responses.GET, self.url, status=502)
+        client = self.make_client(max_attempts=3)
+
+        response = client.get(self.url)
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(len(responses.calls), 3)
+
+    @responses.activate
+    def test_gives_up_after_max_total_time(self):
+        responses.add(responses.GET, self.url, status=503, headers={'Retry-After': '60'})
+        client = self.make_client(max_total_time=30)
+
+        response = client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(responses.calls), 1)
+        self.mock_sleep.assert_not_called()
+
+    @responses.activate
+    def test_retries_connection_errors(self):
+        responses.add(responses.GET, self.url, body=requests.exceptions.ConnectionError('reset'))
+        responses.add(responses.GET, self.url, status=200)
+        client = self.make_client()
+
+        self.assertEqual(client.get(self.url).status_code, 200)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_raises_connection_error_after_max_attempts(self):
+        responses.add(responses.GET, self.url, body=requests.exceptions.ConnectionError('reset'))
+        client = self.make_client(max_attempts=2)
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.get(self.url)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_does_not_retry_client_errors(self):
+        responses.add(responses.GET, self.url, status=400)
+        client = self.make_client()
+
+        self.assertEqual(client.get(self.url).status_code, 400)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_post_without_idempotency_key_not_retried(self):
+        responses.add(responses.POST, self.url, body=requests.exceptions.ConnectionError('reset'))
+        client = self.make_client()
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.post(self.url, json={})
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_allocation_retried_with_same_body(self):
+        url = f'{self.api_url}/enterprise_allocations'
+        responses.add(responses.POST, url, status=503, headers={'Retry-After': '0'})
+        responses.add(responses.POST, url, status=201)
+        client = self.make_client(client_class=GetSmarterEnterpriseApiClient)
+
+        response = client.create_enterprise_allocation(
+            **test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(responses.calls[0].request.body, responses.calls[1].request.body)
+        self.assertEqual(json.loads(responses.calls[1].request.body)['paymentReference'], 'payment_reference')
+
+    @responses.activate
+    @ddt.data(
+        {'status': 502},
+        {'status': 503},
+        {'status': 504},
+        {'body': requests.exceptions.ReadTimeout('timed out')},
+        {'body': requests.exceptions.ChunkedEncodingError('truncated')},
+        {'body': requests.exceptions.ConnectionError('reset')},
+    )
+    def test_post_not_retried_once_it_may_have_been_processed(self, failure):
+        responses.add(responses.POST, self.url, **failure)
+        responses.add(responses.POST, self.url, status=201)
+        client = self.make_client()
+
+        try:
+            client.post(self.url, json={}, idempotency_key='GS-12304')
+        except requests.exceptions.RequestException:
+            pass
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    @ddt.data(
+        {'status': 429},
+        {'status': 503, 'headers': {'Retry-After': '0'}},
+        {'body': requests.exceptions.ConnectTimeout('timed out')},
+        {'body': requests.exceptions.ConnectionError(MaxRetryError(None, '/', NewConnectionError(None, 'refused')))},
+    )
+    def test_post_retried_when_not_processed(self, failure):
+        responses.add(responses.POST, self.url, **failure)
+        responses.add(responses.POST, self.url, status=201)
+        client = self.make_client()
+
+        self.assertEqual(client.post(self.url, json={}, idempotency_key='GS-12304').status_code, 201)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_no_retries_without_policy(self):
+        responses.add(responses.GET, self.url, status=503)
+        client = OAuthApiClient(**self.mock_constructor_args)
+
+        self.assertEqual(client.get(self.url).status_code, 503)
+        self.assertEqual(len(responses.calls), 1)
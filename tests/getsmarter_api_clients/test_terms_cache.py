@@ -0,0 +1,225 @@
+"""
+Tests for the terms and policies cache.
+
+They run against the local in-memory cache backend.
+"""
+
+import json
+from unittest import mock
+
+import responses
+from edx_django_utils.cache import TieredCache
+from requests.exceptions import HTTPError
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+TERMS = {
+    'privacyPolicy': 'abcd',
+    'websiteTermsOfUse': 'efgh',
+}
+
+
+class BaseTermsCacheTests(BaseOAuthApiClientTests):
+    """
+    Base class for terms cache tests, with an empty cache and a fake clock.
+    """
+    def setUp(self):
+        super().setUp()
+        TieredCache.dangerous_clear_all_tiers()
+        self.addCleanup(TieredCache.dangerous_clear_all_tiers)
+        self.terms_url = f'{self.api_url}/terms'
+
+        self.now = 1000000.0
+        time_patcher = mock.patch('getsmarter_api_clients.terms_cache.time.time', side_effect=lambda: self.now)
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+
+class TermsCacheTests(BaseTermsCacheTests):
+    """
+    Tests for get_terms_and_policies with a terms cache.
+    """
+    def setUp(self):
+        super().setUp()
+        self.client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, terms_cache_ttl=60)
+
+    def mock_terms(self, status=200, body=json.dumps(TERMS), headers=None):
+        responses.add(
+            responses.GET,
+            self.terms_url,
+            body=body,
+            status=status,
+            headers=headers,
+        )
+
+    def terms_calls(self):
+        return [call for call in responses.calls if call.request.url == self.terms_url]
+
+    def mock_access_token(self):
+        responses.add(
+            responses.POST,
+            f'{self.provider_url}/oauth2/token',
+            body=json.dumps({'access_token': 'abcd', 'expires_in': 3600}),
+        )
+
+    @responses.activate
+    def test_serves_fresh_terms_from_cache(self):
+        self.mock_access_token()
+        self.mock_terms(headers={'ETag': '"v1"'})
+
+        self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+        self.now += 59
+        self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+
+        self.assertEqual(len(self.terms_calls()), 1)
+        self.assertEqual(
+            self.client.terms_cache.stats.snapshot(),
+            {'hits': 1, 'misses': 1, 'revalidations': 0, 'not_modified': 0, 'stale_hits': 0, 'stale_on_error': 0}
+        )
+
+    @responses.activate
+    def test_cache_shared_between_clients(self):
+        self.mock_access_token()
+        self.mock_terms()
+
+        self.client.get_terms_and_policies()
+        other_client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, terms_cache_ttl=60)
+
+        self.assertEqual(other_client.get_terms_and_policies(), TERMS)
+        self.assertEqual(len(self.terms_calls()), 1)
+
+    @responses.activate
+    def test_revalidates_stale_terms(self):
+        self.mock_access_token()
+        self.mock_terms(headers={'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.mock_terms(status=304, body='')
+
+        self.client.get_terms_and_policies()
+        self.now += 60
+        self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+
+        conditional_request = self.terms_calls()[1].request
+        self.assertEqual(conditional_request.headers['If-None-Match'], '"v1"')
+        self.assertEqual(conditional_request.headers['If-Modified-Since'], 'Wed, 21 Oct 2015 07:28:00 GMT')
+        self.assertEqual(
+            self.client.terms_cache.stats.snapshot(),
+            {'hits': 0, 'misses': 1, 'revalidations': 1, 'not_modified': 1, 'stale_hits': 0, 'stale_on_error': 0}
+        )
+
+        # A 304 renews the entry's freshness.
+        self.now += 30
+        self.client.get_terms_and_policies()
+        self.assertEqual(len(self.terms_calls()), 2)
+
+    @responses.activate
+    def test_replaces_changed_terms(self):
+        self.mock_access_token()
+        changed_terms = dict(TERMS, privacyPolicy='ijkl')
+        self.mock_terms(headers={'ETag': '"v1"'})
+        self.mock_terms(body=json.dumps(changed_terms), headers={'ETag': '"v2"'})
+
+        self.client.get_terms_and_policies()
+        self.now += 60
+        self.assertEqual(self.client.get_terms_and_policies(), changed_terms)
+        self.assertEqual(TieredCache.get_cached_response(self.client.terms_cache.cache_key).value['etag'], '"v2"')
+
+    @responses.activate
+    def test_errors_are_not_cached(self):
+        self.mock_access_token()
+        self.mock_terms(status=500, body='{}')
+        self.mock_terms()
+
+        with self.assertRaises(HTTPError):
+            self.client.get_terms_and_policies()
+        self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+
+    @responses.activate
+    def test_cache_disabled_by_default(self):
+        self.mock_access_token()
+        self.mock_terms()
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+        client.get_terms_and_policies()
+        client.get_terms_and_policies()
+
+        self.assertIsNone(client.terms_cache)
+        self.assertEqual(len(self.terms_calls()), 2)
+
+
+class StaleTermsCacheTests(BaseTermsCacheTests):
+    """
+    Tests for serving stale terms while revalidating them or GEAG fails.
+    """
+    def setUp(self):
+        super().setUp()
+        # Hold background revalidations so the tests can run them when they
+        # choose.
+        thread_patcher = mock.patch('getsmarter_api_clients.terms_cache.threading.Thread')
+        self.mock_thread = thread_patcher.start()
+        self.addCleanup(thread_patcher.stop)
+
+        self.client = GetSmarterEnterpriseApiClient(
+            **self.mock_constructor_args,
+            terms_cache_ttl=60,
+            terms_stale_while_revalidate=30,
+            terms_stale_if_error=300,
+        )
+        responses.start()
+        self.addCleanup(responses.stop)
+        self.addCleanup(responses.reset)
+        responses.add(
+            responses.POST,
+            f'{self.provider_url}/oauth2/token',
+            body=json.dumps({'access_token': 'abcd', 'expires_in': 3600}),
+        )
+        responses.add(responses.GET, self.terms_url, body=json.dumps(TERMS), headers={'ETag': '"v1"'})
+        self.client.get_terms_and_policies()
+
+    def run_scheduled_revalidation(self):
+        _, kwargs = self.mock_thread.call_args
+        kwargs['target'](*kwargs['args'])
+
+    def test_serves_stale_terms_while_revalidating(self):
+        changed_terms = dict(TERMS, privacyPolicy='ijkl')
+        responses.add(responses.GET, self.terms_url, body=json.dumps(changed_terms), headers={'ETag': '"v2"'})
+        self.now += 75
+
+        self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+        self.assertEqual(len(responses.calls), 2)
+        self.mock_thread.return_value.start.assert_called_once_with()
+
+        self.run_scheduled_revalidation()
+        self.assertEqual(self.client.get_terms_and_policies(), changed_terms)
+        self.assertEqual(self.client.terms_cache.stats.stale_hits, 1)
+        self.assertEqual(self.client.terms_cache.stats.hits, 1)
+
+    def test_no_revalidation_scheduled_while_one_is_in_flight(self):
+        self.now += 75
+        with mock.patch('getsmarter_api_clients.terms_cache._terms_fetches.in_flight', return_value=True):
+            self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+        self.mock_thread.assert_not_called()
+
+    def test_background_revalidation_failure_is_logged(self):
+        responses.add(responses.GET, self.terms_url, status=503)
+        self.now += 75
+        self.client.get_terms_and_policies()
+
+        with self.assertLogs('getsmarter_api_clients.terms_cache', level='ERROR'):
+            self.run_scheduled_revalidation()
+
+    def test_serves_stale_terms_on_error(self):
+        responses.add(responses.GET, self.terms_url, status=503)
+        self.now += 120
+
+        with self.assertLogs('getsmarter_api_clients.terms_cache', level='WARNING'):
+            self.assertEqual(self.client.get_terms_and_policies(), TERMS)
+        self.assertEqual(self.client.terms_cache.stats.stale_on_error, 1)
+        self.mock_thread.assert_not_called()
+
+    def test_raises_once_stale_if_error_window_passes(self):
+        responses.add(responses.GET, self.terms_url, status=503)
+        self.now += 360
+
+        with self.assertRaises(HTTPError):
+            self.client.get_terms_and_policies()
@@ -0,0 +1,192 @@
+"""
+Tests for the token cache backends.
+"""
+
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, mock
+
+import ddt
+import responses
+from django.core.cache import cache as django_cache
+from edx_django_utils.cache import DEFAULT_REQUEST_CACHE, TieredCache
+
+from getsmarter_api_clients.oauth import OAuthApiClient
+from getsmarter_api_clients.token_cache import FileTokenCache, InMemoryTokenCache, TieredTokenCache
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+
+@ddt.ddt
+class TokenCacheTests(TestCase):
+    """
+    Tests shared by every token cache backend.
+    """
+    def setUp(self):
+        super().setUp()
+        TieredCache.dangerous_clear_all_tiers()
+        self.addCleanup(TieredCache.dangerous_clear_all_tiers)
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+
+    def make_cache(self, backend):
+        """
+        Return a cache of the named backend.
+        """
+        if backend == 'file':
+            return FileTokenCache(self.temp_dir)
+        if backend == 'memory':
+            return InMemoryTokenCache()
+        return TieredTokenCache()
+
+    @ddt.data('memory', 'file', 'tiered')
+    def test_set_get_delete(self, backend):
+        cache = self.make_cache(backend)
+        self.assertIsNone(cache.get('key'))
+
+        cache.set('key', {'access_token': 'abcd'}, 60)
+        self.assertEqual(cache.get('key'), {'access_token': 'abcd'})
+        self.assertEqual(cache.get_shared('key'), {'access_token': 'abcd'})
+
+        cache.delete('key')
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+
+    @ddt.data('memory', 'file', 'tiered')
+    def test_add(self, backend):
+        cache = self.make_cache(backend)
+
+        self.assertTrue(cache.add('lease', True, 60))
+        self.assertFalse(cache.add('lease', True, 60))
+        cache.delete('lease')
+        self.assertTrue(cache.add('lease', True, 60))
+
+    @ddt.data('memory', 'file')
+    def test_expiry(self, backend):
+        cache = self.make_cache(backend)
+        with mock.patch('getsmarter_api_clients.token_cache.time.monotonic', return_value=1000), \
+                mock.patch('getsmarter_api_clients.token_cache.time.time', return_value=1000):
+            cache.set('key', 'value', 60)
+            cache.add('lease', True, 60)
+            cache.set('forever', 'value', None)
+
+        with mock.patch('getsmarter_api_clients.token_cache.time.monotonic', return_value=1060), \
+                mock.patch('getsmarter_api_clients.token_cache.time.time', return_value=1060):
+            self.assertIsNone(cache.get('key'))
+            self.assertEqual(cache.get('forever'), 'value')
+            # An expired lease can be taken again.
+            self.assertTrue(cache.add('lease', True, 60))
+
+    def test_file_cache_is_private_and_shared(self):
+        cache = FileTokenCache(os.path.join(self.temp_dir, 'tokens'))
+        cache.set('key', {'access_token': 'abcd'}, 60)
+
+        self.assertEqual(FileTokenCache(cache.directory).get('key'), {'access_token': 'abcd'})
+        path = os.path.join(cache.directory, os.listdir(cache.directory)[0])
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(cache.directory).st_mode), 0o700)
+        self.assertEqual(len(os.listdir(cache.directory)), 1)
+
+    def test_file_cache_rejects_shared_directory(self):
+        directory = os.path.join(self.temp_dir, 'tokens')
+        os.mkdir(directory)
+        os.chmod(directory, 0o755)
+
+        with self.assertRaises(PermissionError):
+            FileTokenCache(directory)
+
+    def test_file_cache_rejects_symlinked_directory(self):
+        link = os.path.join(self.temp_dir, 'tokens')
+        os.symlink(self.temp_dir, link)
+
+        with self.assertRaises(PermissionError):
+            FileTokenCache(link)
+
+    def test_file_cache_rejects_directory_of_another_user(self):
+        with mock.patch('getsmarter_api_clients.token_cache.os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                FileTokenCache(self.temp_dir)
+
+    def test_file_cache_add_replaces_only_expired_values(self):
+        cache = FileTokenCache(self.temp_dir)
+        cache.set('lease', 'expired', -1)
+        self.assertTrue(cache.add('lease', 'first', 60))
+
+        # Another process read the expired lease before it was replaced.
+        read = cache._read  # pylint: disable=protected-access
+        reads = iter([('expired', True)])
+        with mock.patch.object(cache, '_read', side_effect=lambda path: next(reads, None) or read(path)):
+            self.assertFalse(cache.add('lease', 'second', 60))
+
+        self.assertEqual(cache.get('lease'), 'first')
+        self.assertEqual(len(os.listdir(self.temp_dir)), 1)
+
+    def test_file_cache_ignores_unreadable_files(self):
+        cache = FileTokenCache(self.temp_dir)
+        cache.set('key', 'value', 60)
+        path = os.path.join(self.temp_dir, os.listdir(self.temp_dir)[0])
+        with open(path, 'w', encoding='utf-8') as cache_file:
+            cache_file.write('{"val')
+
+        self.assertIsNone(cache.get('key'))
+
+    def test_tiered_get_shared_skips_request_cache(self):
+        cache = TieredTokenCache()
+        cache.set('key', 'old', 60)
+        django_cache.set('key', 'new', 60)
+
+        self.assertEqual(cache.get('key'), 'old')
+        self.assertEqual(cache.get_shared('key'), 'new')
+        self.assertEqual(DEFAULT_REQUEST_CACHE.get_cached_response('key').value, 'new')
+
+
+class ClientTokenCacheTests(BaseOAuthApiClientTests):
+    """
+    Tests for clients using a token cache backend other than TieredCache.
+    """
+    def add_token_response(self):
+        responses.add(
+            responses.POST,
+            f'{self.provider_url}/oauth2/token',
+            body=json.dumps({'access_token': 'abcd', 'expires_in': 300}),
+        )
+
+    @responses.activate
+    @mock.patch('edx_django_utils.cache.TieredCache')
+    def test_clients_share_in_memory_cache(self, mock_tiered_cache):
+        self.add_token_response()
+        responses.add(responses.GET, f'{self.api_url}/terms', json={})
+        token_cache = InMemoryTokenCache()
+
+        for _ in range(2):
+            client = OAuthApiClient(**self.mock_constructor_args, token_cache=token_cache)
+            client.get(f'{self.api_url}/terms')
+
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(responses.calls[2].request.headers['Authorization'], 'Bearer abcd')
+        self.assertEqual(token_cache.get(client.access_token_cache_key)['access_token'], 'abcd')
+        self.assertEqual(mock_tiered_cache.mock_calls, [])
+
+    @responses.activate
+    def test_lease_in_file_cache(self):
+        self.add_token_response()
+        with tempfile.TemporaryDirectory() as directory:
+            client = OAuthApiClient(
+                **self.mock_constructor_args, token_cache=FileTokenCache(directory), token_fetch_lease_timeout=10
+            )
+
+            self.assertEqual(client._get_access_token(), 'abcd')  # pylint: disable=protected-access
+            self.assertIsNone(client.token_cache.get(client.access_token_lease_cache_key))
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_import_does_not_load_django(self):
+        code = (
+            'import sys, getsmarter_api_clients.geag; '
+            'sys.exit(any(name.split(".")[0] in ("django", "edx_django_utils") for name in sys.modules))'
+        )
+        env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+        subprocess.run([sys.executable, '-c', code], check=True, env=env)
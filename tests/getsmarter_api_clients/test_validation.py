@@ -0,0 +1,137 @@
+"""
+Tests for client-side allocation validation.
+"""
+
+from datetime import datetime
+from unittest import TestCase, mock
+
+import ddt
+import pytz
+import responses
+
+from getsmarter_api_clients.geag import GetSmarterEnterpriseApiClient
+from getsmarter_api_clients.models import EnterpriseAllocationRequest
+from getsmarter_api_clients.validation import ENTERPRISE_ALLOCATION_VALIDATOR, AllocationValidationError, Violation
+from tests.getsmarter_api_clients import test_geag
+from tests.getsmarter_api_clients.test_oauth import BaseOAuthApiClientTests
+
+ENTERPRISE_ALLOCATION_PAYLOAD = test_geag.GetSmarterEnterpriseApiClientTests.ENTERPRISE_ALLOCATION_PAYLOAD
+
+
+@ddt.ddt
+class AllocationValidatorTests(TestCase):
+    """
+    Tests for AllocationValidator.
+    """
+    def validate(self, **overrides):
+        allocation_request = EnterpriseAllocationRequest(**dict(ENTERPRISE_ALLOCATION_PAYLOAD, **overrides))
+        return ENTERPRISE_ALLOCATION_VALIDATOR.validate(allocation_request)
+
+    def test_valid_allocation(self):
+        self.assertEqual(self.validate(), [])
+        self.assertEqual(self.validate(education_highest_level='Master’s degree', work_experience=None), [])
+
+    @ddt.data(
+        ({'currency': 'BTC'}, 'currency'),
+        ({'work_experience': '2 years'}, 'work_experience'),
+        ({'education_highest_level': 'PhD'}, 'education_highest_level'),
+        ({'email': ''}, 'email'),
+        ({'currency': None}, 'currency'),
+        ({'order_items': []}, 'order_items'),
+        ({'order_items': [{'productId': 'abc', 'quantity': 0}]}, 'order_items'),
+        ({'order_items': [{'quantity': 1}]}, 'order_items'),
+        ({'order_items': [{'productId': 'abc', 'quantity': 1, 'finalPrice': '0'}]}, 'order_items'),
+        ({'order_items': ['abc']}, 'order_items'),
+    )
+    @ddt.unpack
+    def test_invalid_field(self, overrides, field):
+        violations = self.validate(**overrides)
+        self.assertEqual([violation.field for violation in violations], [field])
+
+    def test_reports_every_violation(self):
+        violations = self.validate(currency='BTC', work_experience='2 years', last_name=None)
+
+        self.assertEqual(
+            [violation.field for violation in violations],
+            ['last_name', 'currency', 'work_experience'],
+        )
+        self.assertEqual(violations[0], Violation('last_name', 'is required'))
+
+    def test_check_raises(self):
+        allocation_request = EnterpriseAllocationRequest(**{**ENTERPRISE_ALLOCATION_PAYLOAD, 'currency': 'BTC'})
+
+        with self.assertRaises(AllocationValidationError) as context:
+            ENTERPRISE_ALLOCATION_VALIDATOR.check(allocation_request)
+
+        self.assertEqual(context.exception.payment_reference, 'payment_reference')
+        self.assertEqual(len(context.exception.violations), 1)
+        self.assertIn("currency: 'BTC' is not one of", str(context.exception))
+
+    def test_validate_batch(self):
+        errors = ENTERPRISE_ALLOCATION_VALIDATOR.validate_batch([
+            dict(ENTERPRISE_ALLOCATION_PAYLOAD, should_raise=False),
+            dict(ENTERPRISE_ALLOCATION_PAYLOAD, currency='BTC'),
+            {'payment_reference': 'missing-fields'},
+        ])
+
+        self.assertEqual(sorted(errors), [1, 2])
+        self.assertEqual(errors[1].violations[0].field, 'currency')
+        self.assertEqual(errors[2].violations[0].field, 'arguments')
+        self.assertEqual(errors[2].payment_reference, 'missing-fields')
+
+
+class ClientValidationTests(BaseOAuthApiClientTests):
+    """
+    Tests for validation in GetSmarterEnterpriseApiClient.
+    """
+    def setUp(self):
+        super().setUp()
+        self.enterprise_allocations_url = f'{self.api_url}/enterprise_allocations'
+        tiered_cache_patcher = mock.patch('edx_django_utils.cache.TieredCache')
+        mock_tiered_cache = tiered_cache_patcher.start()
+        mock_tiered_cache.get_cached_response.return_value = mock.MagicMock(
+            value={
+                'access_token': 'bcde',
+                'expires_in': 600,
+                'expires_at': datetime.now(pytz.utc).timestamp() + 600
+            },
+            is_found=True
+        )
+        self.addCleanup(tiered_cache_patcher.stop)
+
+    @responses.activate
+    def test_invalid_allocation_not_sent(self):
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, validate_allocations=True)
+
+        with self.assertRaises(AllocationValidationError):
+            client.create_enterprise_allocation(**{**ENTERPRISE_ALLOCATION_PAYLOAD, 'currency': 'BTC'})
+        self.assertEqual(len(responses.calls), 0)
+
+    @responses.activate
+    def test_bulk_batch_validated_before_sending(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args, validate_allocations=True)
+
+        with mock.patch.object(
+            ENTERPRISE_ALLOCATION_VALIDATOR, 'validate', wraps=ENTERPRISE_ALLOCATION_VALIDATOR.validate
+        ) as mock_validate:
+            results = client.create_enterprise_allocations([
+                dict(ENTERPRISE_ALLOCATION_PAYLOAD, payment_reference='GS-1'),
+                dict(ENTERPRISE_ALLOCATION_PAYLOAD, payment_reference='GS-2', work_experience='2 years'),
+                dict(ENTERPRISE_ALLOCATION_PAYLOAD, payment_reference='GS-3'),
+            ])
+
+        self.assertEqual(mock_validate.call_count, 3)
+        self.assertEqual([result.succeeded for result in results], [True, False, True])
+        self.assertEqual([result.item['payment_reference'] for result in results], ['GS-1', 'GS-2', 'GS-3'])
+        self.assertIsInstance(results[1].error, AllocationValidationError)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_validation_off_by_default(self):
+        responses.add(responses.POST, self.enterprise_allocations_url, status=201)
+        client = GetSmarterEnterpriseApiClient(**self.mock_constructor_args)
+
+        response = client.create_enterprise_allocation(**{**ENTERPRISE_ALLOCATION_PAYLOAD, 'currency': 'BTC'})
+
+        self.assertEqual(response.status_code, 201)